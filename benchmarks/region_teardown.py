@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Python Starbound Mapper (pystarboundmap)
+# Copyright (C) 2018 CJ Kucera
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the development team nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CJ KUCERA BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Times how long it takes to tear down a block of loaded regions, three
+# ways:
+#
+#  * "Per-tile" is what we did before regions were composited into
+#    per-layer pixmaps: every tile had its own hoverable item plus a
+#    separate item for each of its material, matmod and liquid layers,
+#    and each object and plant image was its own item too, all of which
+#    got removed from the scene one at a time.  That code is long gone,
+#    so we recreate the same set of items from the loaded regions'
+#    tiles and entities (with placeholder pixmaps of the same sizes),
+#    and time removing them item by item.
+#  * "Immediate" removes each region's per-layer containers right away.
+#  * "Deferred" goes through the usual `GUIRegion.unload`, which just
+#    hides the containers and leaves the actual removal to the scheduler.
+#
+# What we really care about is how long the GUI thread is blocked at any
+# one time, so for the deferred case we report the longest single
+# scheduler tick as well as the total.
+#
+# Needs a Starbound install to be configured already.  Can be run
+# headless with QT_QPA_PLATFORM=offscreen.
+
+import sys
+import time
+import argparse
+from PyQt5 import QtWidgets, QtGui
+from pystarboundmap.gui import Application, Constants
+
+def process_until(app, done, timeout=60):
+    """
+    Runs the Qt event loop until `done()` returns True
+    """
+    start = time.perf_counter()
+    while not done():
+        if time.perf_counter() - start > timeout:
+            raise Exception('Timed out waiting for the event loop')
+        app.processEvents()
+        time.sleep(0.001)
+
+def load_block(app, scene, min_rx, min_ry, size):
+    """
+    Loads a `size`x`size` block of regions, starting at (`min_rx`, `min_ry`),
+    and waits for them to be fully added to the scene.  Returns the
+    list of regions.
+    """
+    regions = []
+    for rx in range(min_rx, min_rx+size):
+        for ry in range(min_ry, min_ry+size):
+            region = scene.regions[(rx, ry)]
+            region.load()
+            scene.loaded_regions.add(region.key)
+            regions.append(region)
+    process_until(app, lambda: not scene.pending_regions and not scene.scheduler.loads)
+    return regions
+
+def build_per_tile(scene, regions):
+    """
+    Adds the items which `regions` would have had back when every tile
+    was its own item (see the comments up top), returning the list of
+    items.  The regions need to be loaded already, since we take their
+    tiles and entity images from them.
+    """
+    data = scene.data
+    world_height = scene.world.height*8
+    material = QtGui.QPixmap(8, 8)
+    material.fill(QtGui.QColor(128, 128, 128))
+    matmod = QtGui.QPixmap(16, 16)
+    matmod.fill(QtGui.QColor(128, 128, 128, 128))
+    items = []
+
+    def add(item, x, y, z):
+        item.setPos(x, y)
+        item.setZValue(z)
+        scene.addItem(item)
+        items.append(item)
+
+    for region in regions:
+        back = QtWidgets.QGraphicsRectItem(0, 0, 256, 256)
+        add(back, region.rx*256, world_height - (region.ry+1)*256, Constants.z_black)
+        for (y, row) in enumerate(region.tiles):
+            gui_y = world_height - (region.ry*32 + y + 1)*8
+            for (x, tile) in enumerate(row):
+                gui_x = (region.rx*32 + x)*8
+                rect = QtWidgets.QGraphicsRectItem(0, 0, 8, 8)
+                rect.setAcceptHoverEvents(True)
+                add(rect, gui_x, gui_y, Constants.z_overlay)
+                if tile.background_material in data.materials:
+                    add(QtWidgets.QGraphicsPixmapItem(material), gui_x, gui_y, Constants.z_background)
+                if tile.background_mod in data.matmods:
+                    add(QtWidgets.QGraphicsPixmapItem(matmod), gui_x-4, gui_y-4, Constants.z_background_mod)
+                if tile.foreground_material in data.materials:
+                    add(QtWidgets.QGraphicsPixmapItem(material), gui_x, gui_y, Constants.z_foreground)
+                if tile.foreground_mod in data.matmods:
+                    add(QtWidgets.QGraphicsPixmapItem(matmod), gui_x-4, gui_y-4, Constants.z_foreground_mod)
+                if tile.liquid in data.liquids:
+                    add(QtWidgets.QGraphicsRectItem(0, 0, 8, 8), gui_x, gui_y, Constants.z_liquids)
+        for (items_list, z) in ((region.objects, Constants.z_objects), (region.plants, Constants.z_plants)):
+            for item in items_list:
+                pos = item.scenePos()
+                add(QtWidgets.QGraphicsPixmapItem(item.pixmap()), pos.x(), pos.y(), z)
+    return items
+
+def teardown_per_tile(scene, items):
+    """
+    Removes all of `items` from the scene, one at a time
+    """
+    for item in items:
+        scene.removeItem(item)
+
+def teardown_immediate(scene, regions):
+    """
+    Removes all of `regions` items from the scene right away
+    """
+    for region in regions:
+        items = list(region.containers.values())
+        for item in (region.object_anchors, region.plant_anchors):
+            if item:
+                items.append(item)
+        for item in items:
+            scene.removeItem(item)
+        region.containers = {}
+        region.object_anchors = None
+        region.plant_anchors = None
+        region.unload()
+        scene.loaded_regions.discard(region.key)
+
+def teardown_deferred(app, scene, regions):
+    """
+    Unloads `regions` the usual way, and waits for the scheduler to catch
+    up.  Returns a tuple of the time spent in the `unload` calls themselves,
+    and the longest single scheduler tick.
+    """
+    scheduler = scene.scheduler
+    ticks = []
+    orig_run = scheduler.run
+    def timed_run():
+        start = time.perf_counter()
+        orig_run()
+        ticks.append(time.perf_counter() - start)
+    scheduler.timer.timeout.disconnect()
+    scheduler.timer.timeout.connect(timed_run)
+
+    start = time.perf_counter()
+    for region in regions:
+        region.unload()
+        scene.loaded_regions.discard(region.key)
+    unload_time = time.perf_counter() - start
+    process_until(app, lambda: not scheduler.removals)
+
+    scheduler.timer.timeout.disconnect()
+    scheduler.timer.timeout.connect(orig_run)
+    return (unload_time, max(ticks, default=0), sum(ticks))
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmark region teardown')
+    parser.add_argument('filename',
+            type=str,
+            help='World file to load')
+    parser.add_argument('-s', '--size',
+            type=int,
+            default=5,
+            help='Size of the (square) block of regions to load')
+    parser.add_argument('-r', '--rounds',
+            type=int,
+            default=5,
+            help='Number of rounds to run')
+    args = parser.parse_args()
+
+    app = Application(args.filename)
+    scene = app.app.scene
+    process_until(app, lambda: scene.world is not None)
+    process_until(app, lambda: not scene.pending_regions and not scene.scheduler.loads)
+
+    # Start out with a clean scene
+    for key in list(scene.loaded_regions):
+        scene.regions[key].unload()
+    scene.loaded_regions = set()
+    process_until(app, lambda: not scene.scheduler.removals)
+    scene.given_center = False
+
+    if scene.world.width//32 < args.size or scene.world.height//32 < args.size:
+        print('World is too small for a {}x{} block of regions'.format(args.size, args.size))
+        sys.exit(1)
+
+    num_regions = args.size*args.size
+    per_tile = []
+    immediate = []
+    deferred = []
+    for _ in range(args.rounds):
+        regions = load_block(app, scene, 0, 0, args.size)
+        items = build_per_tile(scene, regions)
+        teardown_immediate(scene, regions)
+        start = time.perf_counter()
+        teardown_per_tile(scene, items)
+        per_tile.append((time.perf_counter() - start, len(items)))
+
+        regions = load_block(app, scene, 0, 0, args.size)
+        start = time.perf_counter()
+        teardown_immediate(scene, regions)
+        immediate.append(time.perf_counter() - start)
+
+        regions = load_block(app, scene, 0, 0, args.size)
+        deferred.append(teardown_deferred(app, scene, regions))
+
+    print('Tearing down {} regions, best of {} rounds:'.format(num_regions, args.rounds))
+    print('  Per-tile removal:  {:7.2f}ms blocking ({} items)'.format(
+        min(p[0] for p in per_tile)*1000,
+        per_tile[0][1],
+        ))
+    print('  Immediate removal: {:7.2f}ms blocking'.format(min(immediate)*1000))
+    print('  Deferred removal:  {:7.2f}ms blocking in unload, {:.2f}ms longest tick, {:.2f}ms total'.format(
+        min(d[0] for d in deferred)*1000,
+        min(d[1] for d in deferred)*1000,
+        min(d[2] for d in deferred)*1000,
+        ))
+
+if __name__ == '__main__':
+    main()
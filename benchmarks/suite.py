@@ -0,0 +1,537 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Python Starbound Mapper (pystarboundmap)
+# Copyright (C) 2018 CJ Kucera
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the development team nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CJ KUCERA BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# A reproducible benchmark suite for the GUI.  By default this generates a
+# synthetic Starbound install (see `pystarboundmap.synthetic`) to run
+# against, so results from different machines and checkouts can be
+# compared like-for-like; `-d`/`-f` will run against a real install and
+# world instead.  We time:
+#
+#   * startup: constructing `StarboundData`, with a cold and warm cache
+#   * load_map: opening a world, and how long until the initial view has
+#     been fully drawn
+#   * regions: loading and unloading a block of regions, with and without
+#     the on-disk region cache
+#   * scroll: sweeping across the world from left to right, at a few zoom
+#     levels, as if the user were dragging the map around
+#   * toggles: flipping each of the layer toggles off and on again
+#
+# The results are written out as JSON (to stdout, or to `-o`).  Pass a
+# previous results file with `-c` to print a comparison with that run.
+#
+# Runs headless by default; pass `--show` to watch it go.
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import collections
+import numpy as np
+from PyQt5 import QtWidgets, QtCore
+import pystarboundmap
+from pystarboundmap.gui import GUI
+from pystarboundmap.config import Config
+from pystarboundmap.data import StarboundData
+from pystarboundmap.trace import tracer
+from pystarboundmap.synthetic import make_install, add_world_arguments, world_args_from_args
+
+RESULTS_FORMAT = 1
+
+def summarize(samples):
+    """
+    Returns summary statistics for a list of `samples`
+    """
+    samples = sorted(samples)
+    if not samples:
+        return {'count': 0}
+    return {
+            'count': len(samples),
+            'min': samples[0],
+            'median': statistics.median(samples),
+            'mean': statistics.mean(samples),
+            'p95': samples[min(len(samples)-1, int(len(samples)*0.95))],
+            'max': samples[-1],
+            }
+
+def settled(scene):
+    """
+    Returns whether `scene` has finished all its loading and unloading
+    """
+    return (not scene.pending_regions
+            and not scene.scheduler.loads
+            and not scene.scheduler.removals
+            and not scene.redraw_timer.isActive())
+
+def process_until(app, done, timeout=300):
+    """
+    Runs the Qt event loop until `done()` returns True.  Returns a list of
+    how long each pass through the event loop took (ie: how long the GUI
+    was blocked for, each time).
+    """
+    iterations = []
+    start = time.perf_counter()
+    while not done():
+        if time.perf_counter() - start > timeout:
+            raise Exception('Timed out waiting for the event loop')
+        iter_start = time.perf_counter()
+        app.processEvents()
+        iterations.append(time.perf_counter() - iter_start)
+        time.sleep(0.001)
+    return iterations
+
+def process_for(app, duration):
+    """
+    Runs the Qt event loop for `duration` seconds.  Returns the same list
+    as `process_until`.
+    """
+    end = time.perf_counter() + duration
+    return process_until(app, lambda: time.perf_counter() >= end)
+
+class MethodTimer(object):
+    """
+    Context manager which records how long each call to `obj.name` takes,
+    while active.  Only catches calls which look the method up on `obj`,
+    so won't see calls through already-connected signals.
+    """
+
+    def __init__(self, obj, name):
+        self.obj = obj
+        self.name = name
+        self.times = []
+
+    def __enter__(self):
+        orig = getattr(self.obj, self.name)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return orig(*args, **kwargs)
+            finally:
+                self.times.append(time.perf_counter() - start)
+        setattr(self.obj, self.name, timed)
+        return self
+
+    def __exit__(self, *exc):
+        delattr(self.obj, self.name)
+        return False
+
+class BenchmarkGUI(GUI):
+    """
+    Our main window, minus the dialogs it'd usually pop up at startup
+    """
+
+    def initial_dialogs(self):
+        pass
+
+def bench_startup(config, rounds):
+    """
+    Times loading our Starbound data.  The first round is with an empty
+    cache directory; the rest are warm.
+    """
+    times = []
+    for _ in range(rounds+1):
+        start = time.perf_counter()
+        data = StarboundData(config)
+        times.append(time.perf_counter() - start)
+        data.close()
+    return {'cold': times[0], 'warm': summarize(times[1:])}
+
+def bench_load_map(app, gui, filename, rounds):
+    """
+    Times loading the world at `filename`, both the `MapScene.load_map` call
+    itself and the time until the initial view is fully drawn.  The first
+    round has an empty minimap and region cache; we wait for the minimap
+    scan to finish before moving on, so it doesn't skew anything else.
+    """
+    scene = gui.scene
+    rounds_data = []
+    for _ in range(rounds+1):
+        with MethodTimer(scene, 'load_map') as scene_load:
+            start = time.perf_counter()
+            gui.load_map(filename)
+            load_time = time.perf_counter() - start
+            process_until(app, lambda: settled(scene))
+            first_view = time.perf_counter() - start
+        process_until(app, lambda: not gui.minimap.scanner.scanning)
+        rounds_data.append({
+            'load_map': load_time,
+            'scene_load_map': sum(scene_load.times),
+            'first_view': first_view,
+            'regions': len(scene.loaded_regions),
+            })
+    warm = rounds_data[1:]
+    return {
+            'cold': rounds_data[0],
+            'warm': {key: summarize([r[key] for r in warm]) for key in ('load_map', 'scene_load_map', 'first_view')},
+            }
+
+def clear_scene(app, scene):
+    """
+    Unloads everything in `scene`, and stops it from drawing anything more
+    on its own.
+    """
+    scene.given_center = False
+    for key in list(scene.loaded_regions):
+        scene.regions[key].unload()
+    scene.loaded_regions = set()
+    scene.pending_regions = set()
+    scene.unload_groups()
+    scene.lod_scale = None
+    process_until(app, lambda: settled(scene))
+
+def bench_regions(app, gui, size, rounds):
+    """
+    Times loading and unloading a `size`x`size` block of regions in the
+    middle of the world, with and without the on-disk region cache.
+    Unloading is timed in two parts: the time spent in the `unload` calls
+    themselves, and the time until the scheduler has actually removed
+    everything from the scene.
+    """
+    scene = gui.scene
+    clear_scene(app, scene)
+    keys = sorted(scene.regions.keys())
+    max_rx = max(k[0] for k in keys)
+    max_ry = max(k[1] for k in keys)
+    size = max(1, min(size, max_rx+1, max_ry+1))
+    min_rx = (max_rx+1-size)//2
+    min_ry = (max_ry+1-size)//2
+    block = [scene.regions[(rx, ry)]
+            for rx in range(min_rx, min_rx+size)
+            for ry in range(min_ry, min_ry+size)
+            if (rx, ry) in scene.regions]
+
+    def load():
+        start = time.perf_counter()
+        for region in block:
+            region.load()
+            scene.loaded_regions.add(region.key)
+        iterations = process_until(app, lambda: settled(scene))
+        return (time.perf_counter() - start, iterations)
+
+    def unload():
+        start = time.perf_counter()
+        for region in block:
+            region.unload()
+            scene.loaded_regions.discard(region.key)
+        blocking = time.perf_counter() - start
+        process_until(app, lambda: settled(scene))
+        return (blocking, time.perf_counter() - start)
+
+    compositor = scene.get_compositor()
+    cache = compositor.cache
+    results = {'regions': len(block)}
+    for mode in ('uncached', 'cached'):
+        if mode == 'uncached':
+            compositor.cache = None
+        elif cache is None:
+            continue
+        else:
+            compositor.cache = cache
+            # Make sure everything's in the cache to begin with
+            load()
+            unload()
+        load_times = []
+        iterations = []
+        unload_blocking = []
+        unload_total = []
+        for _ in range(rounds):
+            (load_time, load_iterations) = load()
+            load_times.append(load_time)
+            iterations.extend(load_iterations)
+            (blocking, total) = unload()
+            unload_blocking.append(blocking)
+            unload_total.append(total)
+        results[mode] = {
+                'load': summarize(load_times),
+                'load_regions_per_second': len(block)/min(load_times),
+                'load_event_loop': summarize(iterations),
+                'unload_blocking': summarize(unload_blocking),
+                'unload_total': summarize(unload_total),
+                }
+    compositor.cache = cache
+    return results
+
+def set_zoom(app, gui, scale):
+    """
+    Sets the zoom level to `scale`, and waits for everything to be drawn
+    """
+    for (idx, (zoom_scale, _, _)) in enumerate(gui.zoom_levels):
+        if zoom_scale == scale:
+            gui.zoom_widget.setValue(idx)
+            break
+    else:
+        raise Exception('Unknown zoom level: {}'.format(scale))
+    process_until(app, lambda: settled(gui.scene))
+
+def bench_scroll(app, gui, scale, step, fps):
+    """
+    Sweeps across the middle of the world from left to right at zoom
+    `scale`, `step` pixels at a time, running the event loop for one frame
+    (at `fps`) in between.  Reports how long the GUI was blocked for
+    (per pass through the event loop, per redraw and per paint), how many
+    regions were still waiting to be drawn at each frame, and how long it
+    took for everything to settle down once we stopped.
+    """
+    scene = gui.scene
+    hbar = scene.hbar
+    vbar = scene.vbar
+    scene.given_center = True
+    set_zoom(app, gui, scale)
+    vbar.setValue((vbar.minimum() + vbar.maximum())//2)
+    hbar.setValue(hbar.minimum())
+    scene.draw_visible_area()
+    process_until(app, lambda: settled(scene))
+
+    frame_times = scene.stats.frame_times
+    scene.stats.frame_times = collections.deque()
+    iterations = []
+    pending = []
+    steps = 0
+    with MethodTimer(scene, 'update_visible_area') as draws:
+        start = time.perf_counter()
+        for value in range(hbar.minimum(), hbar.maximum()+1, max(1, int(step*scale))):
+            hbar.setValue(value)
+            iterations.extend(process_for(app, 1/fps))
+            pending.append(len(scene.pending_regions))
+            steps += 1
+        duration = time.perf_counter() - start
+        iterations.extend(process_until(app, lambda: settled(scene)))
+        settle = time.perf_counter() - start - duration
+    paints = list(scene.stats.frame_times)
+    scene.stats.frame_times = frame_times
+
+    return {
+            'steps': steps,
+            'duration': duration,
+            'settle': settle,
+            'event_loop': summarize(iterations),
+            'redraw': summarize(draws.times),
+            'paint': summarize(paints),
+            'pending_regions': summarize(pending),
+            }
+
+def bench_toggles(app, gui, rounds):
+    """
+    Times flipping each layer toggle off and back on again, including the
+    time for any redrawing that causes
+    """
+    toggles = gui.layer_toggles
+    scene = gui.scene
+    results = {}
+    for name in ('fore_toggle', 'fore_mod_toggle', 'back_toggle', 'back_mod_toggle',
+            'back_mid_toggle', 'liquids_toggle', 'objects_toggle', 'plants_toggle'):
+        checkbox = getattr(toggles, name)
+        times = []
+        for _ in range(rounds):
+            for _ in range(2):
+                start = time.perf_counter()
+                checkbox.setChecked(not checkbox.isChecked())
+                process_until(app, lambda: settled(scene))
+                times.append(time.perf_counter() - start)
+        results[name[:-len('_toggle')]] = summarize(times)
+    return results
+
+def environment():
+    """
+    Returns a dict describing the environment we're being run in
+    """
+    return {
+            'pystarboundmap': pystarboundmap.__version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'numpy': np.__version__,
+            'qt': QtCore.QT_VERSION_STR,
+            'pyqt': QtCore.PYQT_VERSION_STR,
+            'qpa_platform': QtWidgets.QApplication.platformName(),
+            }
+
+def flatten(results, prefix=''):
+    """
+    Flattens the nested `results` dict into a dict of dotted keys to numbers
+    """
+    flat = {}
+    for (key, value) in results.items():
+        name = '{}{}'.format(prefix, key)
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+def compare(old, new):
+    """
+    Prints a comparison of two sets of results
+    """
+    if old.get('parameters') != new.get('parameters'):
+        print('Warning: benchmark parameters differ between runs', file=sys.stderr)
+    old_flat = flatten(old['results'])
+    new_flat = flatten(new['results'])
+    print('{:<60} {:>12} {:>12} {:>8}'.format('Metric', 'Old', 'New', 'Change'))
+    for key in sorted(new_flat.keys()):
+        if key not in old_flat or key.endswith('.count'):
+            continue
+        (old_value, new_value) = (old_flat[key], new_flat[key])
+        if old_value:
+            change = '{:+.1f}%'.format((new_value-old_value)/old_value*100)
+        else:
+            change = ''
+        print('{:<60} {:>12.4f} {:>12.4f} {:>8}'.format(key, old_value, new_value, change))
+
+def main():
+
+    parser = argparse.ArgumentParser(
+            description='Run the pystarboundmap benchmark suite',
+            epilog="""By default, runs against a freshly-generated synthetic world.  All times
+                are in seconds.""",
+            )
+    add_world_arguments(parser)
+    parser.add_argument('-d', '--data-dir',
+            type=str,
+            help='Use this Starbound install rather than a synthetic one (requires -f)')
+    parser.add_argument('-f', '--filename',
+            type=str,
+            help='World file to use from the install given by -d')
+    parser.add_argument('-r', '--rounds',
+            type=int,
+            default=3,
+            help='Number of rounds to run each benchmark for (default: %(default)s)')
+    parser.add_argument('-b', '--block',
+            type=int,
+            default=5,
+            help='Size of the (square) block of regions to load/unload (default: %(default)s)')
+    parser.add_argument('-z', '--zoom',
+            type=float,
+            nargs='+',
+            default=[1, 0.25],
+            help='Zoom levels to scroll at (default: %(default)s)')
+    parser.add_argument('--step',
+            type=int,
+            default=64,
+            help='Pixels to scroll per frame, at 1x zoom (default: %(default)s)')
+    parser.add_argument('--fps',
+            type=int,
+            default=60,
+            help='Frames per second to scroll at (default: %(default)s)')
+    parser.add_argument('-o', '--output',
+            type=str,
+            help='File to write results to (default: stdout)')
+    parser.add_argument('-c', '--compare',
+            type=str,
+            help='Previous results file to compare against')
+    parser.add_argument('--show',
+            action='store_true',
+            help='Show the GUI, rather than running headless')
+    parser.add_argument('--trace',
+            type=str,
+            metavar='TRACE_FILE',
+            help='Also record a Chrome/Perfetto trace of the whole run to TRACE_FILE')
+    args = parser.parse_args()
+
+    if (args.data_dir is None) != (args.filename is None):
+        parser.error('-d and -f must be used together')
+    if not args.show:
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+    work_dir = tempfile.mkdtemp(prefix='pystarboundmap-bench-')
+    try:
+        if args.data_dir:
+            data_dir = args.data_dir
+            filename = args.filename
+            parameters = {'world': os.path.basename(filename)}
+        else:
+            world_args = world_args_from_args(args)
+            data_dir = os.path.join(work_dir, 'starbound')
+            print('Generating synthetic world...', file=sys.stderr)
+            filename = make_install(data_dir, **world_args)[0]
+            parameters = {'synthetic': world_args}
+        parameters.update({
+            'rounds': args.rounds,
+            'block': args.block,
+            'zoom': args.zoom,
+            'step': args.step,
+            'fps': args.fps,
+            })
+
+        # Everything gets cached in our work directory, so that we're
+        # starting from scratch (and don't clobber the user's caches)
+        config = Config()
+        config.starbound_data_dir = data_dir
+        config.cache_dir = os.path.join(work_dir, 'cache')
+
+        if args.trace:
+            tracer.enable(args.trace)
+        app = QtWidgets.QApplication([])
+        gui = BenchmarkGUI(app, config, None)
+        process_for(app, 0.1)
+
+        results = {}
+        print('Benchmarking startup...', file=sys.stderr)
+        results['startup'] = bench_startup(config, args.rounds)
+        gui.load_data()
+        print('Benchmarking map loading...', file=sys.stderr)
+        results['load_map'] = bench_load_map(app, gui, filename, args.rounds)
+        print('Benchmarking region loading...', file=sys.stderr)
+        results['regions'] = bench_regions(app, gui, args.block, args.rounds)
+        results['scroll'] = {}
+        results['toggles'] = {}
+        for scale in args.zoom:
+            print('Benchmarking scrolling and toggles at {:g}x...'.format(scale), file=sys.stderr)
+            results['scroll']['{:g}x'.format(scale)] = bench_scroll(app, gui, scale, args.step, args.fps)
+            results['toggles']['{:g}x'.format(scale)] = bench_toggles(app, gui, args.rounds)
+
+        output = {
+                'format': RESULTS_FORMAT,
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'environment': environment(),
+                'parameters': parameters,
+                'results': results,
+                }
+        gui.close_world()
+        gui.data.close()
+        gui.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as df:
+            json.dump(output, df, indent=2)
+    else:
+        json.dump(output, sys.stdout, indent=2)
+        print('')
+
+    if args.compare:
+        with open(args.compare) as df:
+            compare(json.load(df), output)
+
+if __name__ == '__main__':
+    main()
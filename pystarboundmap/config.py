@@ -29,6 +29,7 @@
 import os
 import json
 import base64
+import threading
 import appdirs
 import platform
 import configparser
@@ -50,27 +51,24 @@ elif system == 'Linux':
 else:
     print('Warning: Platform not detected, cannot attempt game autodetection')
 
-class WorldNameCache(object):
+class MappingCache(object):
     """
-    Simple object to cache world name information from our world files, so that
-    we don't have to keep parsing the world file every time the open-by-name
-    dialog is open.
+    Base class for our simple JSON-backed caches, each of which maps a file
+    path to a tuple of information about the file found there.  Subclasses
+    should define `cache_ver` and `entry_type` (the namedtuple which will be
+    returned when looking up an entry).  Caches may be shared between the
+    GUI thread and our background workers (see `Player.get_worlds`), so
+    all access to the mapping goes through `lock`.
     """
 
-    cache_ver = 4
-    WorldName = namedtuple('WorldName', [
-        'mtime',
-        'sort_name',
-        'world_name',
-        'extra_desc',
-        'biomes',
-        'dungeons',
-        ])
+    cache_ver = None
+    entry_type = None
 
     def __init__(self, filename):
         self.filename = filename
         self.mapping = {}
         self.changed = False
+        self.lock = threading.RLock()
 
         if os.path.exists(filename):
             with open(filename, 'r') as df:
@@ -80,52 +78,11 @@ class WorldNameCache(object):
                         and 'mapping' in parsed_file):
                     self.mapping = parsed_file['mapping']
 
-    def register_planet(self, path, world_name, world_type, biome_types, sort_name, world_obj, mtime):
-        """
-        Registers the name of a planet at `path`, with world name `world_name`,
-        `world_type` and `biome_types`.  `sort_name` is the key the GUI will use
-        to sort, when sorting alphabetically.  Some extra information will be
-        pulled out of `world_obj`, which should be a `StarboundData.World`
-        object.
-        """
-        if biome_types:
-            extra_desc = '{}: {}'.format(world_type, biome_types)
-        else:
-            extra_desc = world_type
-
-        self.mapping[path] = (
-                mtime,
-                sort_name,
-                world_name,
-                extra_desc,
-                list(sorted(world_obj.info.biomes)),
-                list(sorted(world_obj.info.dungeons)),
-                )
-        self.changed = True
-
-    def register_other(self, path, world_name, extra_desc, sort_name, world_obj, mtime):
-        """
-        Registers the name of a non-planet world at `path`, with world name
-        `world_name` and `extra_desc`.  `sort_name` is the key the GUI will use
-        to sort, when sorting alphabetically.  Some extra information will be
-        pulled out of `world_obj`, which should be a `StarboundData.World`
-        object.
-        """
-        self.mapping[path] = (
-                mtime,
-                sort_name,
-                world_name,
-                extra_desc,
-                list(sorted(world_obj.info.biomes)),
-                list(sorted(world_obj.info.dungeons)),
-                )
-        self.changed = True
-
     def save(self):
         """
         Saves ourself to disk
         """
-        with open(self.filename, 'w') as df:
+        with self.lock, open(self.filename, 'w') as df:
             json.dump({
                     'version': self.cache_ver,
                     'mapping': self.mapping,
@@ -136,13 +93,118 @@ class WorldNameCache(object):
         """
         Allows us to act like a dict
         """
-        return WorldNameCache.WorldName(*self.mapping[path])
+        with self.lock:
+            return self.entry_type(*self.mapping[path])
 
     def __contains__(self, path):
         """
         A bit more allowing us to act like a dict
         """
-        return path in self.mapping
+        with self.lock:
+            return path in self.mapping
+
+class WorldNameCache(MappingCache):
+    """
+    Simple object to cache world name information from our world files, so that
+    we don't have to keep parsing the world file every time the open-by-name
+    dialog is open.
+    """
+
+    cache_ver = 4
+    WorldName = namedtuple('WorldName', [
+        'mtime',
+        'sort_name',
+        'world_name',
+        'extra_desc',
+        'biomes',
+        'dungeons',
+        ])
+    entry_type = WorldName
+
+    def register_planet(self, path, world_name, world_type, biome_types, sort_name, world_info, mtime):
+        """
+        Registers the name of a planet at `path`, with world name `world_name`,
+        `world_type` and `biome_types`.  `sort_name` is the key the GUI will use
+        to sort, when sorting alphabetically.  Some extra information will be
+        pulled out of `world_info`, which should be a
+        `StarboundData.WorldSummary` object.
+        """
+        if biome_types:
+            extra_desc = '{}: {}'.format(world_type, biome_types)
+        else:
+            extra_desc = world_type
+
+        with self.lock:
+            self.mapping[path] = (
+                    mtime,
+                    sort_name,
+                    world_name,
+                    extra_desc,
+                    list(sorted(world_info.biomes)),
+                    list(sorted(world_info.dungeons)),
+                    )
+            self.changed = True
+
+    def register_other(self, path, world_name, extra_desc, sort_name, world_info, mtime):
+        """
+        Registers the name of a non-planet world at `path`, with world name
+        `world_name` and `extra_desc`.  `sort_name` is the key the GUI will use
+        to sort, when sorting alphabetically.  Some extra information will be
+        pulled out of `world_info`, which should be a
+        `StarboundData.WorldSummary` object.
+        """
+        with self.lock:
+            self.mapping[path] = (
+                    mtime,
+                    sort_name,
+                    world_name,
+                    extra_desc,
+                    list(sorted(world_info.biomes)),
+                    list(sorted(world_info.dungeons)),
+                    )
+            self.changed = True
+
+class PlayerSummaryCache(MappingCache):
+    """
+    Simple object to cache summary information about our player files, so
+    that we don't have to fully parse every player file (and its client
+    context) whenever the open-by-name dialog is opened.  Entries are only
+    valid so long as both `mtime` (for the player file) and `context_mtime`
+    (for the client context file, or `None` if it doesn't exist) still match.
+    """
+
+    cache_ver = 1
+    PlayerSummary = namedtuple('PlayerSummary', [
+        'mtime',
+        'context_mtime',
+        'name',
+        'uuid',
+        'bookmarks',
+        'revive_warp',
+        'systems',
+        ])
+    entry_type = PlayerSummary
+
+    def register_player(self, path, mtime, context_mtime, name, uuid, bookmarks, revive_warp, systems):
+        """
+        Registers the player found at `path`.  `bookmarks` should be a list of
+        bookmark dicts (as found in the player's "teleportBookmarks"),
+        `revive_warp` should be a `(world_string, target)` tuple (or `None`),
+        and `systems` should be a list of `(coords, systemdict)` tuples.  All
+        of these need to be serializable to JSON.  Returns the new entry.
+        """
+        with self.lock:
+            self.mapping[path] = (
+                    mtime,
+                    context_mtime,
+                    name,
+                    uuid,
+                    bookmarks,
+                    revive_warp,
+                    systems,
+                    )
+            self.changed = True
+            return self[path]
 
 class Config(object):
     """
@@ -167,8 +229,10 @@ class Config(object):
     def __init__(self):
 
         self.config_dir = appdirs.user_config_dir('pystarboundmap', 'Apocalyptech')
+        self.cache_dir = appdirs.user_cache_dir('pystarboundmap', 'Apocalyptech')
         self.config_file = os.path.join(self.config_dir, 'pystarboundmap.conf')
         self.worldname_cache = WorldNameCache(os.path.join(self.config_dir, 'worldname_cache.json'))
+        self.player_cache = PlayerSummaryCache(os.path.join(self.config_dir, 'player_cache.json'))
 
         self.load()
 
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Python Starbound Mapper (pystarboundmap)
+# Copyright (C) 2018 CJ Kucera 
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the development team nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CJ KUCERA BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import json
+import concurrent.futures
+from collections import namedtuple
+from .scan import RegionScan
+
+# Bump this if the format of our index file changes
+CONTAINER_INDEX_VER = 1
+
+# A single stack of items found in a container
+ContainerItem = namedtuple('ContainerItem', [
+    'filename',
+    'object_name',
+    'x',
+    'y',
+    'count',
+    ])
+
+def entity_items(entity):
+    """
+    Returns a dict mapping item names to the total count of each, for the
+    contents of the container `entity` (a region entity, as returned by
+    `World.get_entities`).  Anything which isn't a container will just
+    return an empty dict.
+    """
+    counts = {}
+    if entity.name != 'ObjectEntity' or not entity.data.get('items'):
+        return counts
+    for item in entity.data['items']:
+        if item and 'content' in item:
+            content = item['content']
+            counts[content['name']] = counts.get(content['name'], 0) + content['count']
+    return counts
+
+def scan_world(filename):
+    """
+    Reads all the containers in the world at `filename`, returning a list
+    of `(object_name, x, y, counts)` tuples, where `counts` is a dict
+    mapping item names to how many of them are in the container.
+    """
+    containers = []
+    with RegionScan(filename) as scan:
+        for (rx, ry) in scan.regions():
+            for entity in scan.entities(rx, ry):
+                counts = entity_items(entity)
+                if counts:
+                    (x, y) = entity.data['tilePosition']
+                    containers.append((entity.data['name'], x, y, counts))
+    return containers
+
+def scan_worlds(filenames, callback=None, max_workers=None):
+    """
+    Reads all the containers in each of `filenames`, using a pool of
+    `max_workers` worker threads.  `callback` will be called as each world
+    is finished, with four arguments: the filename, the list of containers
+    (as returned by `scan_world`, or `None` if the world couldn't be read),
+    and the number of worlds processed so far and in total.  If the callback
+    returns `True`, the scan will be cancelled and we'll return `False`.
+    Otherwise returns `True`.
+    """
+    if not filenames:
+        return True
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for filename in filenames:
+            futures[executor.submit(scan_world, filename)] = filename
+        for idx, future in enumerate(concurrent.futures.as_completed(futures)):
+            filename = futures[future]
+            try:
+                containers = future.result()
+            except Exception as e:
+                print('Unable to read containers from {}: {}'.format(filename, e))
+                containers = None
+            if callback and callback(filename, containers, idx+1, len(filenames)):
+                for other in futures.keys():
+                    other.cancel()
+                return False
+    return True
+
+class ContainerIndex(object):
+    """
+    Inverted index of container contents across any number of worlds,
+    mapping each item name to a list of `[filename, object_name, x, y,
+    count]` entries, one for each container holding the item.  We keep
+    track of the mtime of each world as of when it was read, so only
+    worlds which have been saved since then need reading again.  Stored
+    on disk as JSON, like our other simple caches.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.worlds = {}
+        self.items = {}
+        self.changed = False
+
+        if os.path.exists(filename):
+            try:
+                with open(filename, 'r') as df:
+                    parsed_file = json.load(df)
+                if parsed_file.get('version') == CONTAINER_INDEX_VER:
+                    self.worlds = parsed_file['worlds']
+                    self.items = parsed_file['items']
+            except (OSError, ValueError, KeyError) as e:
+                print('Unable to read container index {}: {}'.format(filename, e))
+
+    def save(self):
+        """
+        Saves ourself to disk
+        """
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        with open(self.filename, 'w') as df:
+            json.dump({
+                    'version': CONTAINER_INDEX_VER,
+                    'worlds': self.worlds,
+                    'items': self.items,
+                    }, df)
+        self.changed = False
+
+    def stale(self, mtimes):
+        """
+        Given a dict mapping world filenames to their current mtimes, returns
+        a list of the worlds which need to be (re-)read
+        """
+        return [filename for (filename, mtime) in mtimes.items()
+                if self.worlds.get(filename) != mtime]
+
+    def remove_world(self, filename):
+        """
+        Removes everything we know about the world at `filename`
+        """
+        if filename not in self.worlds:
+            return
+        del self.worlds[filename]
+        for name in list(self.items.keys()):
+            entries = [e for e in self.items[name] if e[0] != filename]
+            if entries:
+                self.items[name] = entries
+            else:
+                del self.items[name]
+        self.changed = True
+
+    def update_world(self, filename, mtime, containers):
+        """
+        Replaces the contents we have for the world at `filename` with
+        `containers` (as returned by `scan_world`), read when the world
+        had the given `mtime`
+        """
+        self.remove_world(filename)
+        for (object_name, x, y, counts) in containers:
+            for (name, count) in counts.items():
+                self.items.setdefault(name, []).append([filename, object_name, x, y, count])
+        self.worlds[filename] = mtime
+        self.changed = True
+
+    def prune(self):
+        """
+        Removes any worlds which no longer exist on disk
+        """
+        for filename in list(self.worlds.keys()):
+            if not os.path.exists(filename):
+                self.remove_world(filename)
+
+    def search(self, text, filenames=None, descriptions=None):
+        """
+        Returns a dict mapping every item name containing `text` (case-
+        insensitively) to a list of `ContainerItem` tuples.  If `filenames`
+        is given, only containers in those worlds are returned.  If
+        `descriptions` (a dict mapping item names to their in-game names)
+        is given, we'll match on those as well.
+        """
+        text = text.lower()
+        results = {}
+        for (name, entries) in self.items.items():
+            if text not in name.lower():
+                if not descriptions or text not in descriptions.get(name, '').lower():
+                    continue
+            found = [ContainerItem(*e) for e in entries
+                    if filenames is None or e[0] in filenames]
+            if found:
+                results[name] = found
+        return results
+
+def index_filename(cache_dir):
+    """
+    Returns the filename we use to store our `ContainerIndex`
+    """
+    return os.path.join(cache_dir, 'containers.json')
@@ -32,9 +32,17 @@ import re
 import json
 import mmap
 import struct
+import sqlite3
 import starbound
+import threading
+import concurrent.futures
+from collections import namedtuple
+import numpy as np
 from PIL import Image
 from PyQt5 import QtGui
+from .rendertemplate import RenderTemplate, NUM_MASKS
+from .regioncache import RegionCache
+from .trace import span
 
 def read_config(config_data):
     """
@@ -129,65 +137,73 @@ def read_config(config_data):
 
 class Material(object):
     """
-    Holds info about a material.  Right now we're ignoring all the
-    fancy rendering options and pretending that everything is the
-    very first (top left) tile, and we're not drawing edges or the
-    like.
+    Holds info about a material.  If we were able to parse its render
+    template, we draw edges and the like using that (see `edge_sprites`).
+    Otherwise we just pretend that everything is the very first (top left)
+    tile.  We're ignoring variants and colors in either case.
     """
 
-    def __init__(self, info, path, full_path, pakdata, crop_parameters):
+    def __init__(self, info, path, full_path, pakdata, crop_parameters, template=None):
         self.info = info
         self.name = info['materialName']
         self.path = path
         self.full_path = full_path
         self.pakdata = pakdata
         self.crop_parameters = crop_parameters
+        self.template = template
 
-        self._image = None
-        self._bgimage = None
-        self._midimage = None
+        self._texture = None
+        self._rgba = None
+        self._edge_sprites = {}
 
     @property
-    def image(self):
+    def texture(self):
         """
-        Loads the image dynamically on-demand.
+        Loads our full texture dynamically on-demand, as a numpy RGBA array
         """
-        if not self._image:
-            df = io.BytesIO(self.pakdata.get(
-                    '{}/{}'.format(self.path, self.info['renderParameters']['texture'])
-                    ))
-            full_image = Image.open(df)
-            cropped = full_image.crop(self.crop_parameters)
-            df = io.BytesIO()
-            cropped.save(df, format='png')
-            self._image = QtGui.QPixmap()
-            if not self.image.loadFromData(df.getvalue()):
-                self._image = None
-                # TODO: handle these properly
-                raise Exception('Could not load material {}'.format(self.name))
-        return self._image
+        if self._texture is None:
+            texture_path = '{}/{}'.format(self.path, self.info['renderParameters']['texture'])
+            with span('sprite.decode', 'sprite', path=texture_path):
+                df = io.BytesIO(self.pakdata.get(texture_path))
+                self._texture = np.asarray(Image.open(df).convert('RGBA'))
+        return self._texture
 
     @property
-    def bgimage(self):
+    def rgba(self):
         """
-        Loads the background version dynamically on-demand.
+        Our representative 8x8 image, as a numpy RGBA array
         """
-        if not self._bgimage:
-            self._bgimage = StarboundData.highlight_pixmap(
-                    self.image.copy(), 0, 0, 0, 192,
-                    )
-        return self._bgimage
-
-    @property
-    def midimage(self):
-        """
-        Loads the midrange version dynamically on-demand.
-        """
-        if not self._midimage:
-            self._midimage = StarboundData.highlight_pixmap(
-                    self.image.copy(), 0, 0, 0, 96,
-                    )
-        return self._midimage
+        if self._rgba is None:
+            if self.template and self.template.representative:
+                rgba = self.template.representative.crop(self.texture)
+            else:
+                (x1, y1, x2, y2) = self.crop_parameters
+                rgba = self.texture[y1:y2, x1:x2]
+            self._rgba = np.zeros((8, 8, 4), dtype=np.uint8)
+            self._rgba[:rgba.shape[0], :rgba.shape[1]] = rgba[:8, :8]
+        return self._rgba
+
+    def edge_sprites(self, layer, margin):
+        """
+        Returns a tuple of `(table, sprites)` for drawing this material in
+        the given `layer` (`foreground` or `background`).  `table` maps
+        neighbor masks (see `rendertemplate.neighbor_masks`) to indexes in
+        `sprites`, which is an array of RGBA tile images with `margin`
+        extra pixels on each side.  Without a render template, there's only
+        the one sprite.
+        """
+        key = (layer, margin)
+        if key not in self._edge_sprites:
+            with span('sprite.edges', 'sprite', material=self.name, layer=layer):
+                if self.template:
+                    (table, cases) = self.template.compile(layer)
+                    sprites = np.array([RenderTemplate.draw_case(self.texture, case, margin) for case in cases])
+                else:
+                    table = np.zeros(NUM_MASKS, dtype=np.uint16)
+                    sprites = np.zeros((1, 8+margin*2, 8+margin*2, 4), dtype=np.uint8)
+                    sprites[0, margin:margin+8, margin:margin+8] = self.rgba
+                self._edge_sprites[key] = (table, sprites)
+        return self._edge_sprites[key]
 
 class Matmod(object):
     """
@@ -202,52 +218,21 @@ class Matmod(object):
         self.full_path = full_path
         self.pakdata = pakdata
 
-        self._image = None
-        self._bgimage = None
-        self._midimage = None
-
-    @property
-    def image(self):
-        """
-        Loads the image dynamically on-demand.
-        """
-        if not self._image:
-            df = io.BytesIO(self.pakdata.get(
-                    '/tiles/mods/{}'.format(self.info['renderParameters']['texture'])
-                    ))
-            full_image = Image.open(df)
-            cropped = full_image.crop((0, 8, 16, 24))
-            df = io.BytesIO()
-            cropped.save(df, format='png')
-            self._image = QtGui.QPixmap()
-            if not self._image.loadFromData(df.getvalue()):
-                self._image = None
-                # TODO: Handle this
-                raise Exception('Could not load material {}'.format(self.name))
-        return self._image
-
-    @property
-    def bgimage(self):
-        """
-        Loads the background version dynamically on-demand.
-        """
-
-        if not self._bgimage:
-            self._bgimage = StarboundData.highlight_pixmap(
-                    self.image.copy(), 0, 0, 0, 90,
-                    )
-        return self._bgimage
+        self._rgba = None
 
     @property
-    def midimage(self):
+    def rgba(self):
         """
-        Loads the midrange version dynamically on-demand.
+        Loads the image dynamically on-demand, as a 16x16 numpy RGBA array
+        (which is what our region compositing uses).
         """
-        if not self._midimage:
-            self._midimage = StarboundData.highlight_pixmap(
-                    self.image.copy(), 0, 0, 0, 45,
-                    )
-        return self._midimage
+        if self._rgba is None:
+            texture_path = '/tiles/mods/{}'.format(self.info['renderParameters']['texture'])
+            with span('sprite.decode', 'sprite', path=texture_path):
+                df = io.BytesIO(self.pakdata.get(texture_path))
+                full_image = Image.open(df).convert('RGBA')
+                self._rgba = np.asarray(full_image.crop((0, 8, 16, 24)))
+        return self._rgba
 
 class Plant(object):
     """
@@ -268,8 +253,9 @@ class Plant(object):
         Loads the image dynamically on-demand.
         """
         if not self._image:
-            self._image = QtGui.QPixmap()
-            self._image.loadFromData(self.pakdata.get(self.pathname))
+            with span('sprite.decode', 'sprite', path=self.pathname):
+                self._image = QtGui.QPixmap()
+                self._image.loadFromData(self.pakdata.get(self.pathname))
         return self._image
 
     @property
@@ -351,17 +337,18 @@ class SBObjectOrientation(object):
         Loads the image dynamically on-demand.
         """
         if not self._image:
-            df = io.BytesIO(self.pakdata.get(self.full_image_file))
-            full_image = Image.open(df)
-            if self.info_frames:
-                (width, height) = tuple(self.info_frames['frameGrid']['size'])
-            else:
-                (width, height) = full_image.size
-            cropped = full_image.crop((0, 0, width, height))
-            df = io.BytesIO()
-            cropped.save(df, format='png')
-            self._image = QtGui.QPixmap()
-            self._image.loadFromData(df.getvalue())
+            with span('sprite.decode', 'sprite', path=self.full_image_file):
+                df = io.BytesIO(self.pakdata.get(self.full_image_file))
+                full_image = Image.open(df)
+                if self.info_frames:
+                    (width, height) = tuple(self.info_frames['frameGrid']['size'])
+                else:
+                    (width, height) = full_image.size
+                cropped = full_image.crop((0, 0, width, height))
+                df = io.BytesIO()
+                cropped.save(df, format='png')
+                self._image = QtGui.QPixmap()
+                self._image.loadFromData(df.getvalue())
         return self._image
 
     @property
@@ -437,6 +424,124 @@ class Liquid(object):
         self.info = info
         self.name = info['name']
         self.overlay = QtGui.QColor(*info['color'])
+        self.rgba = tuple(self.overlay.getRgb())
+
+class ColorPalettes(object):
+    """
+    Representative colors for every material, matmod and liquid, for use
+    when drawing at scales where the real textures wouldn't be visible
+    anyway (zoomed-out maps, minimaps, etc).  Each palette is a uint8 RGBA
+    numpy array indexed by ID, so a whole region's worth of IDs can be
+    colorized with a single fancy-index, like so:
+
+        palettes.materials[ColorPalettes.index(tiles.foreground_material)]
+
+    Material and matmod IDs are signed 16-bit values in the world files, so
+    those palettes are indexed by the unsigned equivalent (see `index`).
+    Generating these requires decoding every material and matmod texture,
+    so they're cached on disk, keyed on the pakfile's path, mtime and size.
+    """
+
+    cache_ver = 2
+
+    def __init__(self, materials, matmods, liquids):
+        self.materials = materials
+        self.matmods = matmods
+        self.liquids = liquids
+
+    @staticmethod
+    def index(ids):
+        """
+        Converts an array of (signed) material or matmod `ids` to the
+        indexes used by our palettes
+        """
+        return ids.astype(np.int16).view(np.uint16)
+
+    @staticmethod
+    def average_color(rgba):
+        """
+        Returns the average color of the RGBA image array `rgba`, weighting
+        each pixel's color by its alpha.  The alpha of the result is the
+        average alpha of the image.
+        """
+        pixels = rgba.reshape(-1, 4).astype(np.float64)
+        alpha = pixels[:, 3]
+        if alpha.sum() == 0:
+            return (0, 0, 0, 0)
+        color = (pixels[:, :3]*alpha[:, None]).sum(axis=0)/alpha.sum()
+        return tuple(int(round(c)) for c in color) + (int(round(alpha.mean())),)
+
+    @staticmethod
+    def generate(materials, matmods, liquids):
+        """
+        Generates our palettes from the given dicts of `Material`, `Matmod`
+        and `Liquid` objects, keyed by ID.
+        """
+        palettes = []
+        for lookup in (materials, matmods):
+            palette = np.zeros((65536, 4), dtype=np.uint8)
+            for item_id, item in lookup.items():
+                try:
+                    palette[item_id & 0xFFFF] = ColorPalettes.average_color(item.rgba)
+                except Exception as e:
+                    print('Unable to compute color for {}: {}'.format(item.name, e))
+            palettes.append(palette)
+        palette = np.zeros((256, 4), dtype=np.uint8)
+        for liquid_id, liquid in liquids.items():
+            if 0 <= liquid_id < 256:
+                palette[liquid_id] = liquid.rgba
+        palettes.append(palette)
+        return ColorPalettes(*palettes)
+
+    @staticmethod
+    def load(filename, pak_path, pak_mtime, pak_size):
+        """
+        Loads palettes from the cache file `filename`, if it exists and
+        matches the given pakfile `pak_path`, `pak_mtime` and `pak_size`.
+        Otherwise returns `None`.
+        """
+        if not os.path.exists(filename):
+            return None
+        try:
+            with np.load(filename) as df:
+                if (int(df['version']) == ColorPalettes.cache_ver
+                        and str(df['pak_path']) == pak_path
+                        and float(df['pak_mtime']) == pak_mtime
+                        and int(df['pak_size']) == pak_size):
+                    return ColorPalettes(df['materials'], df['matmods'], df['liquids'])
+        except (OSError, KeyError, ValueError):
+            pass
+        return None
+
+    def save(self, filename, pak_path, pak_mtime, pak_size):
+        """
+        Saves our palettes to the cache file `filename`
+        """
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        np.savez_compressed(filename,
+                version=ColorPalettes.cache_ver,
+                pak_path=pak_path,
+                pak_mtime=pak_mtime,
+                pak_size=pak_size,
+                materials=self.materials,
+                matmods=self.matmods,
+                liquids=self.liquids,
+                )
+
+class ThreadSafeSBAsset6(starbound.SBAsset6):
+    """
+    py-starbound's pakfile reader seeks around inside a single filehandle,
+    so this just serializes reads, to allow assets to be loaded from worker
+    threads.
+    """
+
+    def __init__(self, stream):
+        super().__init__(stream)
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        with self.lock:
+            return super().get(path)
 
 class PakTree(object):
     """
@@ -541,41 +646,83 @@ class Bookmark(object):
 
 class Player(object):
     """
-    Wrapper class for the player save dict, to provide a helper function
-    or two.
+    Wrapper class for player information, to provide a helper function
+    or two.  Everything we need for browsing worlds comes from a
+    `config.PlayerSummaryCache.PlayerSummary` tuple.
     """
 
-    def __init__(self, playerdict, base_universe):
-        self.playerdict = playerdict
-        self.base_universe = base_universe
-        self.name = playerdict.data['identity']['name']
-        self.uuid = playerdict.data['uuid']
+    def __init__(self, summary, player_path):
+        self.player_path = player_path
+        self.name = summary.name
+        self.uuid = summary.uuid
+        self.systems = summary.systems
 
         # Figure out our current location
         self.cur_world_filename = None
         self.cur_world_loc = None
-        context_path = os.path.join(base_universe, '{}.clientcontext'.format(self.uuid))
-        if os.path.exists(context_path):
-            with open(context_path, 'rb') as df:
-                context = starbound.read_sbvj01(df)
-                if 'reviveWarp' in context.data:
-                    self.cur_world_filename = StarboundData.world_string_to_filename(
-                            context.data['reviveWarp']['world'])
-                    if self.cur_world_filename:
-                        self.cur_world_loc = tuple(context.data['reviveWarp']['target'])
+        if summary.revive_warp:
+            (world_string, target) = summary.revive_warp
+            self.cur_world_filename = StarboundData.world_string_to_filename(world_string)
+            if self.cur_world_filename:
+                self.cur_world_loc = tuple(target)
 
         # Load in bookmarks
         self.bookmarks = {}
+        for bookmark_data in summary.bookmarks:
+            bookmark = Bookmark(bookmark_data)
+            if bookmark.filename:
+                if bookmark.filename not in self.bookmarks:
+                    self.bookmarks[bookmark.filename] = []
+                self.bookmarks[bookmark.filename].append(bookmark)
+
+    @staticmethod
+    def summarize(playerdict, context):
+        """
+        Given a full player save dict `playerdict` and the player's client
+        context `context` (which may be `None`), returns a dict containing
+        the arguments needed for `config.PlayerSummaryCache.register_player`
+        (apart from the path and mtimes).  Only the bits of data we actually
+        use get pulled out.
+        """
+
+        # Current location
+        revive_warp = None
+        if context and 'reviveWarp' in context.data:
+            revive_warp = (
+                    context.data['reviveWarp']['world'],
+                    context.data['reviveWarp']['target'],
+                    )
 
         # TODO: Check that the universeMap dicts always has just one key
         # (a uuid or something)
-        for k, v in self.playerdict.data['universeMap'].items():
+        bookmarks = []
+        for k, v in playerdict.data['universeMap'].items():
             for bookmark_data in v['teleportBookmarks']:
-                bookmark = Bookmark(bookmark_data)
-                if bookmark.filename:
-                    if bookmark.filename not in self.bookmarks:
-                        self.bookmarks[bookmark.filename] = []
-                    self.bookmarks[bookmark.filename].append(bookmark)
+                bookmarks.append({
+                    'bookmarkName': bookmark_data['bookmarkName'],
+                    'target': bookmark_data['target'],
+                    })
+
+        # Systems; we only care about which planets and objects are mapped
+        systems = []
+        for k, v in playerdict.data['universeMap'].items():
+            # universeMap keys:
+            #   systems
+            #   teleportBookmarks
+            for (coords, systemdict) in v['systems']:
+                systems.append((coords, {
+                    'mappedPlanets': [{'planet': p['planet']} for p in systemdict['mappedPlanets']],
+                    'mappedObjects': {uuid: {} for uuid in systemdict['mappedObjects'].keys()},
+                    }))
+            break
+
+        return {
+                'name': playerdict.data['identity']['name'],
+                'uuid': playerdict.data['uuid'],
+                'bookmarks': bookmarks,
+                'revive_warp': revive_warp,
+                'systems': systems,
+                }
 
     def get_systems(self):
         """
@@ -584,20 +731,13 @@ class Player(object):
         Describing all systems known to this player.
         (I'm using x, y, z because I imagine that those are maybe
         supposed to be coordinates, but in reality I suspect they're
-        effectively random.)
+        effectively random.)  Note that `systemdict` only contains the
+        `mappedPlanets` and `mappedObjects` keys, and the values inside
+        `mappedObjects` are always empty.
         """
+        return self.systems
 
-        # TODO: Check that the universeMap dicts always has just one key
-        # (a uuid or something)
-        for k, v in self.playerdict.data['universeMap'].items():
-            # universeMap keys:
-            #   systems
-            #   teleportBookmarks
-
-            systemlist = v['systems']
-            return systemlist
-
-    def get_worlds(self, data, progress_callback=None):
+    def get_worlds(self, data, progress_callback=None, max_workers=None):
         """
         Given a StarboundData object `data`, returns a list of all worlds
         known to the user, as a list of tuples of the form:
@@ -607,114 +747,162 @@ class Player(object):
         on the first runthrough, but we *do* now cache the name information,
         so subsequent listings should be much faster.
 
+        This happens in two phases: first we put together the full list of
+        world files which the player knows about (along with their mtimes),
+        so that we know exactly how many files will need to be read from disk.
+        Then the metadata for any world files which aren't already in our
+        cache gets read in by a pool of `max_workers` worker threads.
+
         `progress_callback` can be used to specify a function to call to update
-        the value of a progress bar as we go through (note that we do NOT
-        currently support a "real" 0 -> 100% progress bar, since the logic here
-        is a bit weird and branches off depending on what we find, as we go.
-        Tearing it apart to be able to provide a total-number-of-files-to-load-
-        from-disk count before actually processing is more work than I care to
-        deal with at the moment).
+        the value of a progress bar as we go through.  It will be called with
+        two arguments: the number of world files processed so far, and the
+        total number of world files which need processing.  If the callback
+        returns `True`, the scan will be cancelled and this method will return
+        `None` (any world info read in up to that point will still be cached).
         """
 
-        worlds = []
         (world_dict, extra_uuid) = data.get_worlds()
 
         # Get our world name cache
         cache = data.config.worldname_cache
 
+        # Phase one: figure out which files we're interested in.  `systems`
+        # will be a list of tuples whose first element is the list of planet
+        # filenames for the system, and the second is a list of
+        # (filename, description) tuples for the non-planet worlds.
+        ship_path = os.path.join(data.base_player, '{}.shipworld'.format(self.uuid))
+        if not os.path.exists(ship_path):
+            ship_path = None
+        systems = []
+        for (coords, systemdict) in self.get_systems():
+            base_system_name = '{}_{}_{}'.format(*coords)
+            if base_system_name in world_dict:
+                planet_files = []
+                for planet in systemdict['mappedPlanets']:
+                    if planet['planet'] in world_dict[base_system_name]:
+                        planet_files.extend(world_dict[base_system_name][planet['planet']])
+                other_files = []
+                for uuid in systemdict['mappedObjects'].keys():
+                    if uuid in extra_uuid:
+                        other_files.append(extra_uuid[uuid])
+                systems.append((planet_files, other_files))
+
+        # Grab mtimes for everything, and figure out which files actually
+        # need to be loaded from disk.
+        mtimes = {}
+        to_load = []
+        if ship_path:
+            mtimes[ship_path] = os.path.getmtime(ship_path)
+        for (planet_files, other_files) in systems:
+            for filename in planet_files:
+                mtimes[filename] = os.path.getmtime(filename)
+            for (filename, _) in other_files:
+                mtimes[filename] = os.path.getmtime(filename)
+        for filename, mtime in mtimes.items():
+            if filename not in cache or cache[filename].mtime != mtime:
+                to_load.append(filename)
+
+        # Phase two: read in world metadata for anything that needs it.
+        cancelled = False
+        loaded = {}
+        if progress_callback:
+            cancelled = progress_callback(0, len(to_load))
+        if to_load and not cancelled:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {}
+                for filename in to_load:
+                    futures[executor.submit(StarboundData.read_world_summary, filename)] = filename
+                for idx, future in enumerate(concurrent.futures.as_completed(futures)):
+                    loaded[futures[future]] = future.result()
+                    if progress_callback and progress_callback(idx+1, len(to_load)):
+                        cancelled = True
+                        for other in futures.keys():
+                            other.cancel()
+                        break
+
+        # Phase three: register anything we loaded and put together our
+        # world list.  This has to happen in a specific order, since the
+        # non-planet world names are derived from their system's planets.
+        worlds = []
+
         # Add in our own spaceship, if we've got it
-        ship_path = os.path.join(data.base_player, '{}.shipworld'.format(self.playerdict.data['uuid']))
-        if os.path.exists(ship_path):
-            ship_mtime = os.path.getmtime(ship_path)
-            if ship_path not in cache or cache[ship_path].mtime != ship_mtime:
-                (world, worlddf) = StarboundData.open_world(ship_path)
+        if ship_path:
+            if ship_path in loaded:
                 cache.register_other(
                         ship_path,
                         'Starship',
                         'Your Starship',
                         'aaaaa',
-                        world,
-                        ship_mtime,
+                        loaded[ship_path],
+                        mtimes[ship_path],
                         )
-                worlddf.close()
-                if progress_callback:
-                    progress_callback()
-            worlds.append((
-                ship_mtime,
-                cache[ship_path],
-                ship_path,
-                ))
+            if ship_path in cache:
+                worlds.append((
+                    mtimes[ship_path],
+                    cache[ship_path],
+                    ship_path,
+                    ))
 
         # Loop through all systems we've explored
-        for (coords, systemdict) in self.get_systems():
-            base_system_name = '{}_{}_{}'.format(*coords)
-
-            if base_system_name in world_dict:
-                detected_system_name = None
-                for planet in systemdict['mappedPlanets']:
-                    if planet['planet'] in world_dict[base_system_name]:
-                        for filename in world_dict[base_system_name][planet['planet']]:
-                            world_mtime = os.path.getmtime(filename)
-                            if filename not in cache or cache[filename].mtime != world_mtime:
-                                (world, worlddf) = StarboundData.open_world(filename)
-                                cache.register_planet(filename,
-                                        world_name=StarboundData.strip_colors(world.info.name),
-                                        world_type=world.info.description,
-                                        biome_types=', '.join(world.info.world_biomes),
-                                        sort_name=StarboundData.world_name_to_sortable(world.info.name),
-                                        world_obj=world,
-                                        mtime=world_mtime,
-                                        )
-                                worlddf.close()
-                                if progress_callback:
-                                    progress_callback()
-
-                            # This is the only way I can find to try and associate a system
-                            # to its name (only really useful in the uuid checks below).  Alas!
-                            if not detected_system_name:
-                                detected_system_name = re.sub(
-                                        r'^(.*?) (I|II|III|IV|V|VI|VII|VIII|IX|X|XI|XII)( .*)?$',
-                                        r'\1',
-                                        cache[filename].world_name)
-
-                            worlds.append((
-                                world_mtime,
-                                cache[filename],
-                                filename,
-                                ))
-
-                # Now loop through any extra worlds we found via UUID
+        for (planet_files, other_files) in systems:
+
+            detected_system_name = None
+            for filename in planet_files:
+                if filename in loaded:
+                    summary = loaded[filename]
+                    cache.register_planet(filename,
+                            world_name=StarboundData.strip_colors(summary.name),
+                            world_type=summary.description,
+                            biome_types=', '.join(summary.world_biomes),
+                            sort_name=StarboundData.world_name_to_sortable(summary.name),
+                            world_info=summary,
+                            mtime=mtimes[filename],
+                            )
+                if filename not in cache:
+                    continue
+
+                # This is the only way I can find to try and associate a system
+                # to its name (only really useful in the uuid checks below).  Alas!
                 if not detected_system_name:
-                    detected_system_name = '(Unknown System)'
-                for uuid in systemdict['mappedObjects'].keys():
-                    if uuid in extra_uuid:
-                        (filename, description) = extra_uuid[uuid]
-                        other_mtime = os.path.getmtime(filename)
-                        if filename not in cache or cache[filename].mtime != other_mtime:
-                            if description.startswith('unique-'):
-                                description = description[7:]
-                            (world, worlddf) = StarboundData.open_world(filename)
-                            cache.register_other(filename,
-                                    world_name='{} - {}'.format(detected_system_name, description),
-                                    extra_desc='Non-Planet System Object',
-                                    sort_name='{} 99 - {}'.format(detected_system_name, description).lower(),
-                                    world_obj=world,
-                                    mtime=other_mtime,
-                                    )
-                            worlddf.close()
-                            if progress_callback:
-                                progress_callback()
-                        worlds.append((
-                            other_mtime,
-                            cache[filename],
-                            filename,
-                            ))
+                    detected_system_name = re.sub(
+                            r'^(.*?) (I|II|III|IV|V|VI|VII|VIII|IX|X|XI|XII)( .*)?$',
+                            r'\1',
+                            cache[filename].world_name)
+
+                worlds.append((
+                    mtimes[filename],
+                    cache[filename],
+                    filename,
+                    ))
+
+            # Now loop through any extra worlds we found via UUID
+            if not detected_system_name:
+                detected_system_name = '(Unknown System)'
+            for (filename, description) in other_files:
+                if filename in loaded:
+                    if description.startswith('unique-'):
+                        description = description[7:]
+                    cache.register_other(filename,
+                            world_name='{} - {}'.format(detected_system_name, description),
+                            extra_desc='Non-Planet System Object',
+                            sort_name='{} 99 - {}'.format(detected_system_name, description).lower(),
+                            world_info=loaded[filename],
+                            mtime=mtimes[filename],
+                            )
+                if filename in cache:
+                    worlds.append((
+                        mtimes[filename],
+                        cache[filename],
+                        filename,
+                        ))
 
         # Save our cache, if anything's changed
         if cache.changed:
             cache.save()
 
         # Return our list
+        if cancelled:
+            return None
         return worlds
 
 class StarboundData(object):
@@ -732,12 +920,44 @@ class StarboundData(object):
         """
         Simple little wrapper class because I want to keep track of the filename
         inside the World object, which py-starbound isn't going to care about.
+        We also serialize access to the underlying stream, since regions get
+        read in from worker threads.
         """
 
         def __init__(self, stream, filename):
             super().__init__(stream)
             self.filename = filename
             self.base_filename = os.path.basename(filename)
+            self.lock = threading.RLock()
+
+        def get(self, layer, x, y):
+            """
+            Reads the data at the given layer/x/y key, while holding our lock
+            """
+            with self.lock, span('world.read', 'io', layer=layer, rx=x, ry=y):
+                return super().get(layer, x, y)
+
+        def get_all_keys(self, start=None):
+            """
+            py-starbound does this as a generator which seeks around in the
+            stream inbetween yields, so we read in the whole list while we
+            hold the lock.
+            """
+            with self.lock:
+                return list(super().get_all_keys(start))
+
+    # Lightweight, immutable description of a world, as returned by
+    # `read_world_summary`
+    WorldSummary = namedtuple('WorldSummary', [
+        'filename',
+        'name',
+        'description',
+        'world_biomes',
+        'biomes',
+        'dungeons',
+        'coords',
+        'size',
+        ])
 
     world_name_sortable_conversions = [
             ('^green;I^white;', '01'),
@@ -770,10 +990,11 @@ class StarboundData(object):
         # Read in the data file
         pakdf = open(self.base_pak, 'rb')
         self.pakdf = pakdf
+        self.region_cache = None
         if pakdf:
 
             paktree = PakTree()
-            pakdata = starbound.SBAsset6(pakdf)
+            pakdata = ThreadSafeSBAsset6(pakdf)
 
             # py-starbound doesn't let you "browse" inside the pakfile's
             # internal "directory", so we're doing it by hand here
@@ -781,10 +1002,9 @@ class StarboundData(object):
             for path in pakdata.index.keys():
                 paktree.add_path(path)
 
-            # Cropping parameters for our various material templates.
-            # TODO: obviously if we want to render things *correctly*
-            # we'd have to actually parse/understand these.  Instead
-            # we're just grabbing the top-left image, basically.
+            # Cropping parameters for our various material templates, for
+            # use if we can't make sense of the templates themselves.
+            # Basically just the top-left image.
             crop_params = {
                     '/tiles/classicmaterialtemplate.config': (4, 12, 12, 20),
                     '/tiles/platformtemplate.config': (8, 0, 16, 8),
@@ -805,6 +1025,18 @@ class StarboundData(object):
                     '/tiles/railtemplate.config': (3, 5, 11, 13),
                 }
 
+            # Load in our material render templates
+            self.render_templates = {}
+            for template_name in paktree.get_all_matching_ext('/tiles', 'template.config'):
+                template_path = '/tiles/{}'.format(template_name)
+                try:
+                    template = RenderTemplate.load(read_config(pakdata.get(template_path)))
+                except ValueError as e:
+                    print('Unable to parse render template {}: {}'.format(template_path, e))
+                    template = None
+                if template:
+                    self.render_templates[template_path] = template
+
             # Load in our materials
             self.materials = {}
             obj_list = paktree.get_all_recurs_matching_ext('/tiles', 'material')
@@ -812,13 +1044,15 @@ class StarboundData(object):
                 matpath = '{}/{}'.format(obj_path, obj_name)
                 material = read_config(pakdata.get(matpath))
                 if 'renderTemplate' in material:
-                    if material['renderTemplate'] in crop_params:
+                    template = self.render_templates.get(material['renderTemplate'])
+                    if template or material['renderTemplate'] in crop_params:
                         self.materials[material['materialId']] = Material(
                                 material,
                                 obj_path,
                                 matpath,
                                 pakdata,
-                                crop_params[material['renderTemplate']],
+                                crop_params.get(material['renderTemplate'], (0, 0, 8, 8)),
+                                template,
                                 )
                     else:
                         print('Unhandled material render template: {}'.format(material['renderTemplate']))
@@ -879,6 +1113,45 @@ class StarboundData(object):
                 item = read_config(pakdata.get(item_full_path))
                 self.items[item['itemName']] = StarboundData.strip_colors(item['shortdescription'])
 
+            # Representative colors for all our tiles, for low-detail drawing
+            self.palettes = self.get_palettes()
+
+            # Our on-disk cache of rendered regions
+            self.region_cache = self.get_region_cache()
+
+    def get_palettes(self):
+        """
+        Returns our `ColorPalettes`, either from our asset cache (if the
+        pakfile hasn't changed since it was generated), or by generating
+        them fresh (and then saving them to the cache).
+        """
+        stat = os.stat(self.base_pak)
+        cache_file = os.path.join(self.config.cache_dir, 'asset_colors.npz')
+        palettes = ColorPalettes.load(cache_file, self.base_pak, stat.st_mtime, stat.st_size)
+        if palettes is None:
+            palettes = ColorPalettes.generate(self.materials, self.matmods, self.liquids)
+            palettes.save(cache_file, self.base_pak, stat.st_mtime, stat.st_size)
+        return palettes
+
+    def asset_signature(self):
+        """
+        Returns a tuple which identifies the game assets we've loaded, for
+        things which cache data derived from them
+        """
+        stat = os.stat(self.base_pak)
+        return (self.base_pak, stat.st_mtime, stat.st_size)
+
+    def get_region_cache(self):
+        """
+        Returns our `RegionCache`, or `None` if it couldn't be opened
+        """
+        cache_file = os.path.join(self.config.cache_dir, 'regions.sqlite3')
+        try:
+            return RegionCache(cache_file, self.asset_signature())
+        except (OSError, sqlite3.Error) as e:
+            print('Unable to open region cache {}: {}'.format(cache_file, e))
+            return None
+
     def get_all_players(self):
         """
         Returns a list of tuples describing all players.  Tuples will be of the form
@@ -891,18 +1164,64 @@ class StarboundData(object):
                 if entry.name.endswith('.player'):
                     player = self.get_player(entry.path)
                     entries.append((entry.stat().st_mtime, player))
+
+        # Save our cache, if anything's changed
+        if self.config.player_cache.changed:
+            self.config.player_cache.save()
+
         # TODO: sorting by mtime, because that's how Starbound does it.  Should
         # we at least provide the option for alphabetical?
-        return sorted(entries, reverse=True)
+        return sorted(entries, key=lambda e: e[0], reverse=True)
 
     def get_player(self, player_file):
         """
-        Returns player data, given the specified player file
+        Returns player data, given the specified player file.  Player
+        summaries are cached by file mtime, so the player file (and its
+        client context) only get parsed if they've changed since we last
+        saw them.  Note that this does not save the cache to disk.
+        """
+        cache = self.config.player_cache
+        player_path = os.path.join(self.base_player, player_file)
+        player_mtime = os.path.getmtime(player_path)
+
+        # Check the cache first
+        if player_path in cache:
+            summary = cache[player_path]
+            if (summary.mtime == player_mtime
+                    and summary.context_mtime == self.get_context_mtime(summary.uuid)):
+                return Player(summary, player_path)
+
+        # Otherwise, read in the full player (and client context)
+        with open(player_path, 'rb') as playerdf:
+            playerdict = starbound.read_sbvj01(playerdf)
+        uuid = playerdict.data['uuid']
+        context = None
+        context_mtime = self.get_context_mtime(uuid)
+        if context_mtime is not None:
+            with open(self.get_context_path(uuid), 'rb') as df:
+                context = starbound.read_sbvj01(df)
+        summary = cache.register_player(player_path,
+                mtime=player_mtime,
+                context_mtime=context_mtime,
+                **Player.summarize(playerdict, context),
+                )
+        return Player(summary, player_path)
+
+    def get_context_path(self, uuid):
         """
-        player = None
-        with open(os.path.join(self.base_player, player_file), 'rb') as playerdf:
-            player = Player(starbound.read_sbvj01(playerdf), self.base_universe)
-        return player
+        Returns the path to the client context file for the given player `uuid`
+        """
+        return os.path.join(self.base_universe, '{}.clientcontext'.format(uuid))
+
+    def get_context_mtime(self, uuid):
+        """
+        Returns the mtime of the client context file for the given player
+        `uuid`, or `None` if the file doesn't exist.
+        """
+        context_path = self.get_context_path(uuid)
+        if os.path.exists(context_path):
+            return os.path.getmtime(context_path)
+        return None
 
     def get_worlds(self):
         """
@@ -951,10 +1270,12 @@ class StarboundData(object):
 
     def close(self):
         """
-        Closes our open filehandle
+        Closes our open filehandle (and region cache)
         """
         if self.pakdf:
             self.pakdf.close()
+        if self.region_cache:
+            self.region_cache.close()
 
     @staticmethod
     def world_name_to_sortable(name):
@@ -982,6 +1303,31 @@ class StarboundData(object):
             world = StarboundData.World(worldmm, filename)
             return (world, worldmm)
 
+    @staticmethod
+    def read_world_summary(filename):
+        """
+        Given a `filename`, returns a `StarboundData.WorldSummary` tuple
+        describing the world.  Rather than mapping the whole file, this only
+        reads in the BTree header and the blocks needed to get at the world
+        metadata, so it's much cheaper than `open_world` when all we're
+        interested in is `world.info`.  This is safe to call from worker
+        threads.
+        """
+        with open(filename, 'rb') as worlddf:
+            world = starbound.World(worlddf)
+            world.read_metadata()
+            info = world.info
+            return StarboundData.WorldSummary(
+                    filename=filename,
+                    name=info.name,
+                    description=info.description,
+                    world_biomes=tuple(sorted(info.world_biomes)),
+                    biomes=frozenset(info.biomes),
+                    dungeons=frozenset(info.dungeons),
+                    coords=info.coords,
+                    size=info.size,
+                    )
+
     @staticmethod
     def strip_colors(input_string):
         """
@@ -1041,6 +1387,17 @@ class StarboundData(object):
             print('Unknown world type: {}'.format(world_type))
         return None
 
+    @staticmethod
+    def array_to_pixmap(array):
+        """
+        Given a numpy RGBA uint8 array `array`, returns a QPixmap with the
+        same contents.  Must be called from the GUI thread.
+        """
+        array = np.ascontiguousarray(array)
+        (height, width, _) = array.shape
+        image = QtGui.QImage(array.data, width, height, width*4, QtGui.QImage.Format_RGBA8888)
+        return QtGui.QPixmap.fromImage(image)
+
     @staticmethod
     def highlight_pixmap(pixmap, r, g, b, a):
         """
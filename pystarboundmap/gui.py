@@ -34,9 +34,19 @@ import struct
 import timeago
 import datetime
 import argparse
+import collections
+import concurrent.futures
 from PyQt5 import QtWidgets, QtGui, QtCore
 from .data import StarboundData
 from .config import Config
+from . import minimap
+from . import occurrences
+from . import containers
+from . import holes
+from . import lighting
+from .prefetch import PrefetchPlanner
+from .trace import tracer, span
+from .render import Layer, RegionCompositor, RegionPyramid, read_region_tiles, tile_from_record, REGION_PIXELS, MOD_MARGIN
 
 class Constants(object):
 
@@ -49,7 +59,9 @@ class Constants(object):
         z_foreground_mod,
         z_liquids,
         z_overlay,
-        ) = range(9)
+        z_analysis,
+        z_hover,
+        ) = range(11)
 
 class HTMLStyle(QtWidgets.QProxyStyle):
     """
@@ -171,24 +183,15 @@ class HTMLQPushButton(HTMLWidgetHelper, QtWidgets.QPushButton):
     works well for more than one widget type.
     """
 
-class GUITile(QtWidgets.QGraphicsRectItem):
+class TileInfo(object):
     """
-    Hoverable area which the user can click on for info, etc.
+    Information about a single tile, built on-demand by our MapScene
+    (from the region's tile array) when the tile is hovered over.  There
+    aren't any per-tile scene items; the scene just draws a single hover
+    overlay on top of whichever tile is current.
     """
 
-    (BRUSH_NONE,
-        BRUSH_NORMAL,
-        BRUSH_PLANT,
-        BRUSH_OBJECT,
-        BRUSH_HOVER) = range(5)
-
-    def __init__(self, parent, tile, x, y, region, gui_x, gui_y, layer_toggles):
-        super().__init__()
-        self.hovered = False
-        self.highlight_objects = layer_toggles.object_anchors_toggle.isChecked()
-        self.highlight_plants = layer_toggles.plant_anchors_toggle.isChecked()
-        self.plants = []
-        self.objects = []
+    def __init__(self, parent, tile, x, y, region, gui_x, gui_y, objects, plants):
         self.parent = parent
         self.tile = tile
         self.x = x
@@ -196,125 +199,18 @@ class GUITile(QtWidgets.QGraphicsRectItem):
         self.region = region
         self.gui_x = gui_x
         self.gui_y = gui_y
-        self.setAcceptHoverEvents(True)
-        self.last_brush = GUITile.BRUSH_NONE
-        self.set_default_brush()
-        self.setRect(0, 0, 8, 8)
-        self.setPos(gui_x, gui_y)
-        self.setZValue(Constants.z_overlay)
-
-        # Convenience vars
-        materials = self.parent.data.materials
-        matmods = self.parent.data.matmods
-        liquids = self.parent.data.liquids
-        world = self.parent.world
-
-        # Materials (background)
-        self.material_background = None
-        if tile.background_material in materials:
-            if layer_toggles.back_mid_toggle.isChecked():
-                image = materials[tile.background_material].midimage
-            else:
-                image = materials[tile.background_material].bgimage
-            self.material_background = QtWidgets.QGraphicsPixmapItem(image)
-            self.material_background.setPos(gui_x, gui_y)
-            self.material_background.setZValue(Constants.z_background)
-            if not layer_toggles.back_toggle.isChecked():
-                self.material_background.setVisible(False)
-            self.parent.addItem(self.material_background)
-
-        # Matmods (background)
-        self.mod_background = None
-        if tile.background_mod in matmods:
-            if layer_toggles.back_mid_toggle.isChecked():
-                image = matmods[tile.background_mod].midimage
-            else:
-                image = matmods[tile.background_mod].bgimage
-            self.mod_background = QtWidgets.QGraphicsPixmapItem(image)
-            self.mod_background.setPos(gui_x-4, gui_y-4)
-            self.mod_background.setZValue(Constants.z_background_mod)
-            if not layer_toggles.back_mod_toggle.isChecked():
-                self.mod_background.setVisible(False)
-            self.parent.addItem(self.mod_background)
-
-        # Materials (foreground)
-        self.material_foreground = None
-        if tile.foreground_material in materials:
-            self.material_foreground = QtWidgets.QGraphicsPixmapItem(materials[tile.foreground_material].image)
-            self.material_foreground.setPos(gui_x, gui_y)
-            self.material_foreground.setZValue(Constants.z_foreground)
-            if not layer_toggles.fore_toggle.isChecked():
-                self.material_foreground.setVisible(False)
-            self.parent.addItem(self.material_foreground)
-
-        # Matmods (foreground)
-        self.mod_foreground = None
-        if tile.foreground_mod in matmods:
-            self.mod_foreground = QtWidgets.QGraphicsPixmapItem(matmods[tile.foreground_mod].image)
-            self.mod_foreground.setPos(gui_x-4, gui_y-4)
-            self.mod_foreground.setZValue(Constants.z_foreground_mod)
-            if not layer_toggles.fore_mod_toggle.isChecked():
-                self.mod_foreground.setVisible(False)
-            self.parent.addItem(self.mod_foreground)
-
-        # Liquids
-        self.liquid = None
-        if tile.liquid in liquids:
-            self.liquid = QtWidgets.QGraphicsRectItem()
-            self.liquid.setRect(0, 0, 8, 8)
-            self.liquid.setPos(gui_x, gui_y)
-            self.liquid.setBrush(QtGui.QBrush(liquids[tile.liquid].overlay))
-            self.liquid.setPen(QtGui.QPen(QtGui.QColor(0, 0, 0, 0)))
-            self.liquid.setZValue(Constants.z_liquids)
-            if not layer_toggles.liquids_toggle.isChecked():
-                self.liquid.setVisible(False)
-            self.parent.addItem(self.liquid)
-
-    def unload(self):
-        """
-        Unloads ourself from the scene
-        """
-        if self.material_background:
-            self.parent.removeItem(self.material_background)
-            self.material_background = None
-        if self.mod_background:
-            self.parent.removeItem(self.mod_background)
-            self.mod_background = None
-        if self.material_foreground:
-            self.parent.removeItem(self.material_foreground)
-            self.material_foreground = None
-        if self.mod_foreground:
-            self.parent.removeItem(self.mod_foreground)
-            self.mod_foreground = None
-        if self.liquid:
-            self.parent.removeItem(self.liquid)
-            self.liquid = None
+        self.objects = objects
+        self.plants = plants
 
-    def add_plant(self, desc, obj_list):
+    def hover_enter(self):
         """
-        Adds an attached plant by its description name, and its associated Plant
-        objects
+        Updates our data table with info about this tile, and highlights any
+        objects or plants attached to it.
         """
-        self.plants.append((desc, obj_list))
-        if len(self.plants) == 1:
-            self.set_default_brush()
-
-    def add_object(self, obj_data, obj_name, obj_orientation, qpmi, entity):
-        """
-        Adds an attached object, with its object data, name, orientation,
-        and QGraphicsPixmapItem
-        """
-        self.objects.append((obj_data, obj_name, obj_orientation, qpmi, entity))
-        if len(self.objects) == 1:
-            self.set_default_brush()
-
-    def hoverEnterEvent(self, event=None):
         data_table = self.parent.mainwindow.data_table
         materials = self.parent.data.materials
         matmods = self.parent.data.matmods
         liquids = self.parent.data.liquids
-        self.parent.cur_hover = self
-        self.hovered = True
 
         data_table.set_region(self.region.rx, self.region.ry)
         data_table.set_tile(self.x, self.y)
@@ -376,15 +272,10 @@ class GUITile(QtWidgets.QGraphicsRectItem):
         # Update the datatable with our entity info
         data_table.set_entities(entities)
 
-        # TODO: Might want to pre-brighten our images and swap 'em out.  Or
-        # at least do so for objects, so we could highlight the whole thing.
-        self.last_brush = GUITile.BRUSH_HOVER
-        self.setBrush(QtGui.QBrush(QtGui.QColor(255, 255, 255, 128)))
-        self.setPen(QtGui.QPen(QtGui.QColor(0, 0, 0, 0)))
-
-    def hoverLeaveEvent(self, event=None):
-        self.hovered = False
-        self.set_default_brush()
+    def hover_leave(self):
+        """
+        Restores any object or plant images which we'd highlighted
+        """
 
         # Restore object images
         for (obj_data, obj_name, obj_orientation, qpmi, _) in self.objects:
@@ -395,119 +286,89 @@ class GUITile(QtWidgets.QGraphicsRectItem):
             for (plant_obj, qpmi) in part_list:
                 qpmi.setPixmap(plant_obj.image)
 
-    def toggle_foreground(self, checked):
-        if self.material_foreground:
-            self.material_foreground.setVisible(checked)
-
-    def toggle_fore_mod(self, checked):
-        if self.mod_foreground:
-            self.mod_foreground.setVisible(checked)
-
-    def toggle_background(self, checked):
-        if self.material_background:
-            self.material_background.setVisible(checked)
-
-    def toggle_back_mod(self, checked):
-        if self.mod_background:
-            self.mod_background.setVisible(checked)
-
-    def toggle_back_mid(self, checked):
-        """
-        Toggles whether we're using mid-brightness background images
-        """
-        if self.material_background:
-            if checked:
-                image = self.parent.data.materials[self.tile.background_material].midimage
-            else:
-                image = self.parent.data.materials[self.tile.background_material].bgimage
-            self.material_background.setPixmap(image)
-        if self.mod_background:
-            if checked:
-                image = self.parent.data.matmods[self.tile.background_mod].midimage
-            else:
-                image = self.parent.data.matmods[self.tile.background_mod].bgimage
-            self.mod_background.setPixmap(image)
-
-    def set_default_brush(self):
-        """
-        Sets our default (non-hovered) brush/pen state.  Changing this is
-        expensive, which is why we're keeping track of the brush state with
-        `last_brush` rather than blindly updating.
-        """
-        if not self.hovered:
-            if self.highlight_objects and len(self.objects) > 0:
-                if self.last_brush != GUITile.BRUSH_OBJECT:
-                    self.setBrush(QtGui.QBrush(QtGui.QColor(150, 150, 255, 200)))
-                    self.setPen(QtGui.QPen(QtGui.QColor(190, 190, 255, 255)))
-                    self.last_brush = GUITile.BRUSH_OBJECT
-            elif self.highlight_plants and len(self.plants) > 0:
-                if self.last_brush != GUITile.BRUSH_PLANT:
-                    self.setBrush(QtGui.QBrush(QtGui.QColor(150, 255, 150, 200)))
-                    self.setPen(QtGui.QPen(QtGui.QColor(190, 255, 190, 255)))
-                    self.last_brush = GUITile.BRUSH_PLANT
-            else:
-                if self.last_brush != GUITile.BRUSH_NORMAL:
-                    self.setBrush(QtGui.QBrush(QtGui.QColor(0, 0, 0, 0)))
-                    self.setPen(QtGui.QPen(QtGui.QColor(0, 0, 0, 0)))
-                    self.last_brush = GUITile.BRUSH_NORMAL
-
-    def toggle_liquids(self, checked):
-        if self.liquid:
-            self.liquid.setVisible(checked)
-
-    def toggle_object_anchors(self, checked):
-        self.highlight_objects = checked
-        self.set_default_brush()
-
-    def toggle_plant_anchors(self, checked):
-        self.highlight_plants = checked
-        self.set_default_brush()
-
 class GUIRegion(object):
     """
-    Class to hold info about a single region
+    Class to hold info about a single region.  Each tile layer of the region
+    is composited into a single image by a worker thread (see
+    `render.RegionCompositor`), so the scene only needs one item per layer
+    rather than one item per tile.
+
+    All of our items live inside a container item for each Z value (ie:
+    each toggleable layer), so toggling a layer only touches one item per
+    region.  The two background layers each have their regular and "mid"
+    variants inside the same container.
     """
 
+    # Z values for each of our composited layers
+    layer_z = {
+            Layer.BACKGROUND: Constants.z_background,
+            Layer.BACKGROUND_MID: Constants.z_background,
+            Layer.BACKGROUND_MOD: Constants.z_background_mod,
+            Layer.BACKGROUND_MOD_MID: Constants.z_background_mod,
+            Layer.FOREGROUND: Constants.z_foreground,
+            Layer.FOREGROUND_MOD: Constants.z_foreground_mod,
+            Layer.LIQUIDS: Constants.z_liquids,
+            }
+
     def __init__(self, scene, rx, ry, data, world):
         self.scene = scene
         self.layer_toggles = scene.mainwindow.layer_toggles
         self.rx = rx
         self.ry = ry
+        self.key = (rx, ry)
         self.data = data
         self.world = world
-        self.region_back = None
+        self.containers = {}
+        self.layers = {}
         self.objects = []
         self.plants = []
-        self.tiles = []
+        self.tiles = None
+        self.tile_objects = {}
+        self.tile_plants = {}
+        self.object_anchors = None
+        self.plant_anchors = None
         self.loaded = False
+        self.future = None
+        self.pixmap_bytes = 0
 
     def load(self):
         """
-        Loads ourself into memory
+        Loads ourself into memory.  The actual region data gets read and
+        composited in the background; `finish_load` will be called once
+        that's done.
         """
 
         if self.loaded:
             return
 
-        self.region_back = None
+        self.containers = {}
+        self.layers = {}
         self.objects = []
         self.plants = []
-        self.tiles = []
+        self.tiles = None
+        self.tile_objects = {}
+        self.tile_plants = {}
+        self.object_anchors = None
+        self.plant_anchors = None
+        self.loaded = True
+        self.scene.stats.regions_loaded += 1
+
+        with span('region.load', 'gui', rx=self.rx, ry=self.ry):
+            self.future = self.scene.submit_render(self,
+                    self.scene.get_compositor().render_region,
+                    self.world, self.rx, self.ry)
+
+    def finish_load(self, render):
+        """
+        Adds our region to the scene, given the `render.RegionRender` which
+        was generated in the background.
+        """
 
         # Some convenience vars
-        materials = self.data.materials
-        matmods = self.data.matmods
         objects = self.data.objects
         plants = self.data.plants
         world = self.world
-        self.loaded = True
-
-        # Get tiles
-        try:
-            data_tiles = world.get_tiles(self.rx, self.ry)
-        except KeyError:
-            print('WARNING: Region ({}, {}) was not found in world'.format(self.rx, self.ry))
-            return
+        self.future = None
 
         # "real" coordinates
         base_x = self.rx*32
@@ -516,180 +377,374 @@ class GUIRegion(object):
         gui_y = (world.height*8)-(base_y*8)
 
         # Background for our drawn area (black)
-        self.region_back = self.scene.addRect(gui_x, gui_y-255, 255, 255,
-                QtGui.QPen(QtGui.QColor(0, 0, 0)),
-                QtGui.QBrush(QtGui.QColor(0, 0, 0)),
-                )
-        self.region_back.setZValue(Constants.z_black)
-
-        # Tiles!
-        cur_row = 0
-        cur_col = 0
-        for data_tile in data_tiles:
-            self.tiles.append(GUITile(self.scene, data_tile,
-                base_x+cur_col, base_y+cur_row,
-                self,
-                gui_x+cur_col*8, gui_y-(cur_row+1)*8,
-                self.layer_toggles))
-            self.scene.addItem(self.tiles[-1])
-            cur_col += 1
-            if cur_col == 32:
-                cur_col = 0
-                cur_row += 1
+        region_back = QtWidgets.QGraphicsRectItem(gui_x, gui_y-255, 255, 255)
+        region_back.setPen(QtGui.QPen(QtGui.QColor(0, 0, 0)))
+        region_back.setBrush(QtGui.QBrush(QtGui.QColor(0, 0, 0)))
+        region_back.setParentItem(self.container(Constants.z_black))
+
+        # Tile layers
+        with span('region.items', 'gui', rx=self.rx, ry=self.ry, layers=len(render.layers)):
+            for layer, image in render.layers.items():
+                pixmap = StarboundData.array_to_pixmap(image)
+                self.pixmap_bytes += self.scene.stats.add_pixmap(pixmap)
+                qpmi = QtWidgets.QGraphicsPixmapItem(pixmap)
+                if layer in Layer.with_margin:
+                    qpmi.setPos(gui_x-MOD_MARGIN, gui_y-REGION_PIXELS-MOD_MARGIN)
+                else:
+                    qpmi.setPos(gui_x, gui_y-REGION_PIXELS)
+                qpmi.setVisible(self.variant_visible(layer))
+                qpmi.setParentItem(self.container(GUIRegion.layer_z[layer]))
+                self.layers[layer] = qpmi
+
+        # Tiles!  We just keep the raw array around; TileInfo objects get
+        # created on-demand by our scene when the user hovers.
+        self.tiles = render.tiles
 
         # Entities!
-        entities = []
-        try:
-            entities = world.get_entities(self.rx, self.ry)
-        except KeyError:
-            pass
-
-        for e in entities:
-            if e.name == 'ObjectEntity':
-                obj_name = e.data['name']
-                obj_orientation = e.data['orientationIndex']
-                (obj_x, obj_y) = tuple(e.data['tilePosition'])
-                if obj_name in objects:
-                    obj = objects[obj_name]
-                    (image, offset_x, offset_y) = obj.get_image(obj_orientation)
-                    qpmi = QtWidgets.QGraphicsPixmapItem(image)
-                    qpmi.setPos(
-                            (obj_x*8) + offset_x,
-                            (world.height*8)-(obj_y*8) - offset_y - image.height(),
-                            )
-                    qpmi.setZValue(Constants.z_objects)
-                    if not self.layer_toggles.objects_toggle.isChecked():
-                        qpmi.setVisible(False)
-                    self.scene.addItem(qpmi)
-                    self.objects.append(qpmi)
+        with span('region.entities', 'gui', rx=self.rx, ry=self.ry, entities=len(render.entities)):
+            for e in render.entities:
+                if e.name == 'ObjectEntity':
+                    obj_name = e.data['name']
+                    obj_orientation = e.data['orientationIndex']
+                    (obj_x, obj_y) = tuple(e.data['tilePosition'])
+                    if obj_name in objects:
+                        obj = objects[obj_name]
+                        (image, offset_x, offset_y) = obj.get_image(obj_orientation)
+                        qpmi = QtWidgets.QGraphicsPixmapItem(image)
+                        qpmi.setPos(
+                                (obj_x*8) + offset_x,
+                                (world.height*8)-(obj_y*8) - offset_y - image.height(),
+                                )
+                        qpmi.setParentItem(self.container(Constants.z_objects))
+                        self.objects.append(qpmi)
+                        rel_x = obj_x - base_x
+                        rel_y = obj_y - base_y
+                        tile_idx = rel_y*32 + rel_x
+                        self.tile_objects.setdefault(tile_idx, []).append(
+                                (obj, obj_name, obj_orientation, qpmi, e.data))
+                elif e.name == 'PlantEntity':
+                    desc = e.data['descriptions']['description']
+                    images = []
+                    (obj_x, obj_y) = tuple(e.data['tilePosition'])
+                    for piece in e.data['pieces']:
+                        piece_img = piece['image'].split('?')[0]
+                        if piece_img in plants:
+                            img = plants[piece_img].image
+                            qpmi = QtWidgets.QGraphicsPixmapItem(img)
+                            qpmi.setPos(
+                                    (obj_x*8) + (piece['offset'][0]*8),
+                                    (world.height*8)-(obj_y*8) - (piece['offset'][1]*8) - img.height(),
+                                    )
+                            qpmi.setParentItem(self.container(Constants.z_plants))
+                            images.append((plants[piece_img], qpmi))
+                            self.plants.append(qpmi)
+                        else:
+                            print('not found: {}'.format(piece_img))
                     rel_x = obj_x - base_x
                     rel_y = obj_y - base_y
                     tile_idx = rel_y*32 + rel_x
-                    self.tiles[tile_idx].add_object(obj, obj_name, obj_orientation, qpmi, e.data)
-            elif e.name == 'PlantEntity':
-                desc = e.data['descriptions']['description']
-                images = []
-                (obj_x, obj_y) = tuple(e.data['tilePosition'])
-                for piece in e.data['pieces']:
-                    piece_img = piece['image'].split('?')[0]
-                    if piece_img in plants:
-                        img = plants[piece_img].image
-                        qpmi = QtWidgets.QGraphicsPixmapItem(img)
-                        qpmi.setPos(
-                                (obj_x*8) + (piece['offset'][0]*8),
-                                (world.height*8)-(obj_y*8) - (piece['offset'][1]*8) - img.height(),
-                                )
-                        qpmi.setZValue(Constants.z_plants)
-                        if not self.layer_toggles.plants_toggle.isChecked():
-                            qpmi.setVisible(False)
-                        images.append((plants[piece_img], qpmi))
-                        self.scene.addItem(qpmi)
-                        self.plants.append(qpmi)
-                    else:
-                        print('not found: {}'.format(piece_img))
-                rel_x = obj_x - base_x
-                rel_y = obj_y - base_y
-                tile_idx = rel_y*32 + rel_x
-                self.tiles[tile_idx].add_plant(desc, images)
-            elif (e.name == 'MonsterEntity'
-                    or e.name == 'NpcEntity'
-                    or e.name == 'StagehandEntity'
-                    or e.name == 'ItemDropEntity'
-                    or e.name == 'VehicleEntity'
-                    ):
-                # TODO: Ignoring for now
-                pass
-            else:
-                print('Unknown entity type: {}'.format(e.name))
+                    self.tile_plants.setdefault(tile_idx, []).append((desc, images))
+                elif (e.name == 'MonsterEntity'
+                        or e.name == 'NpcEntity'
+                        or e.name == 'StagehandEntity'
+                        or e.name == 'ItemDropEntity'
+                        or e.name == 'VehicleEntity'
+                        ):
+                    # TODO: Ignoring for now
+                    pass
+                else:
+                    print('Unknown entity type: {}'.format(e.name))
+
+        # Anchor highlights, for tiles with plants or objects attached.
+        # Objects are added last so that they take precedence.
+        self.plant_anchors = self.add_anchors(self.tile_plants,
+                QtGui.QColor(150, 255, 150, 200),
+                QtGui.QColor(190, 255, 190, 255),
+                self.layer_toggles.plant_anchors_toggle.isChecked())
+        self.object_anchors = self.add_anchors(self.tile_objects,
+                QtGui.QColor(150, 150, 255, 200),
+                QtGui.QColor(190, 190, 255, 255),
+                self.layer_toggles.object_anchors_toggle.isChecked())
+
+    def container(self, z):
+        """
+        Returns our container item for the given Z value, creating it if
+        need be
+        """
+        if z not in self.containers:
+            container = QtWidgets.QGraphicsItemGroup()
+            container.setZValue(z)
+            container.setVisible(self.container_visible(z))
+            self.scene.addItem(container)
+            self.containers[z] = container
+        return self.containers[z]
+
+    def container_visible(self, z):
+        """
+        Returns whether our container for the given Z value should currently
+        be visible, according to our layer toggles
+        """
+        toggles = self.layer_toggles
+        if z == Constants.z_background:
+            return toggles.back_toggle.isChecked()
+        elif z == Constants.z_background_mod:
+            return toggles.back_mod_toggle.isChecked()
+        elif z == Constants.z_foreground:
+            return toggles.fore_toggle.isChecked()
+        elif z == Constants.z_foreground_mod:
+            return toggles.fore_mod_toggle.isChecked()
+        elif z == Constants.z_liquids:
+            return toggles.liquids_toggle.isChecked()
+        elif z == Constants.z_objects:
+            return toggles.objects_toggle.isChecked()
+        elif z == Constants.z_plants:
+            return toggles.plants_toggle.isChecked()
+        return True
+
+    def variant_visible(self, layer):
+        """
+        Returns whether the given tile `layer` should be visible inside its
+        container (ie: whether it's the currently-selected background
+        brightness, for the background layers)
+        """
+        back_mid = self.layer_toggles.back_mid_toggle.isChecked()
+        if layer in (Layer.BACKGROUND, Layer.BACKGROUND_MOD):
+            return not back_mid
+        elif layer in (Layer.BACKGROUND_MID, Layer.BACKGROUND_MOD_MID):
+            return back_mid
+        return True
+
+    def add_anchors(self, tile_idxs, brush_color, pen_color, visible):
+        """
+        Adds a single item to the scene which highlights all the tiles in
+        `tile_idxs` (as used in `tile_objects` and `tile_plants`), and
+        returns it.
+        """
+        path = QtGui.QPainterPath()
+        for tile_idx in tile_idxs:
+            (gui_x, gui_y) = self.tile_scene_pos(tile_idx % 32, tile_idx // 32)
+            path.addRect(gui_x, gui_y, 8, 8)
+        item = self.scene.addPath(path,
+                QtGui.QPen(pen_color),
+                QtGui.QBrush(brush_color),
+                )
+        item.setZValue(Constants.z_overlay)
+        item.setVisible(visible)
+        return item
+
+    def tile_scene_pos(self, rel_x, rel_y):
+        """
+        Returns the scene coordinates of the top-left corner of the tile at
+        (`rel_x`, `rel_y`) inside this region
+        """
+        return (
+                (self.rx*32 + rel_x)*8,
+                (self.world.height*8) - (self.ry*32 + rel_y + 1)*8,
+                )
+
+    def get_tile_info(self, rel_x, rel_y):
+        """
+        Returns a `TileInfo` object for the tile at (`rel_x`, `rel_y`)
+        inside this region, or `None` if we haven't finished loading yet.
+        """
+        if self.tiles is None:
+            return None
+        tile_idx = rel_y*32 + rel_x
+        (gui_x, gui_y) = self.tile_scene_pos(rel_x, rel_y)
+        return TileInfo(self.scene,
+                tile_from_record(self.tiles[rel_y, rel_x]),
+                self.rx*32 + rel_x, self.ry*32 + rel_y,
+                self,
+                gui_x, gui_y,
+                self.tile_objects.get(tile_idx, []),
+                self.tile_plants.get(tile_idx, []),
+                )
 
     def unload(self):
         """
         Unload from the graphics scene
         """
-        for obj in self.objects:
-            self.scene.removeItem(obj)
-        for plant in self.plants:
-            self.scene.removeItem(plant)
-        for tile in self.tiles:
-            tile.unload()
-            self.scene.removeItem(tile)
-        if self.region_back:
-            self.scene.removeItem(self.region_back)
-        self.tiles = []
+        if self.scene.cur_hover and self.scene.cur_hover.region is self:
+            self.scene.clear_hover()
+        if self.future:
+            self.future.cancel()
+            self.future = None
+        self.scene.scheduler.discard(self)
+        items = list(self.containers.values())
+        for item in (self.object_anchors, self.plant_anchors):
+            if item:
+                items.append(item)
+        self.scene.scheduler.remove_items(items)
+        self.scene.stats.pixmap_bytes -= self.pixmap_bytes
+        self.scene.stats.regions_unloaded += 1
+        self.pixmap_bytes = 0
+        self.containers = {}
+        self.tiles = None
+        self.tile_objects = {}
+        self.tile_plants = {}
+        self.object_anchors = None
+        self.plant_anchors = None
+        self.layers = {}
         self.objects = []
         self.plants = []
-        self.region_back = None
         self.loaded = False
 
+    def distance_to(self, x, y):
+        """
+        Returns the (squared) distance from the center of this region to the
+        scene coordinates (`x`, `y`)
+        """
+        ctr_x = (self.rx+0.5)*REGION_PIXELS
+        ctr_y = (self.world.height*8) - (self.ry+0.5)*REGION_PIXELS
+        return (ctr_x-x)**2 + (ctr_y-y)**2
+
+    def update_containers(self, *zs):
+        """
+        Updates the visibility of our containers for the given Z values to
+        match our layer toggles
+        """
+        for z in zs:
+            if z in self.containers:
+                self.containers[z].setVisible(self.container_visible(z))
+
     def toggle_foreground(self, checked):
         """
         Toggle the foreground
         """
-        for tile in self.tiles:
-            tile.toggle_foreground(checked)
+        self.update_containers(Constants.z_foreground)
 
     def toggle_fore_mod(self, checked):
         """
         Toggle the foreground mod
         """
-        for tile in self.tiles:
-            tile.toggle_fore_mod(checked)
+        self.update_containers(Constants.z_foreground_mod)
 
     def toggle_background(self, checked):
         """
         Toggle the background
         """
-        for tile in self.tiles:
-            tile.toggle_background(checked)
+        self.update_containers(Constants.z_background)
 
     def toggle_back_mod(self, checked):
         """
         Toggle the background mod
         """
-        for tile in self.tiles:
-            tile.toggle_back_mod(checked)
+        self.update_containers(Constants.z_background_mod)
 
     def toggle_back_mid(self, checked):
         """
         Toggle midrange background highlighting
         """
-        for tile in self.tiles:
-            tile.toggle_back_mid(checked)
+        for layer in (Layer.BACKGROUND, Layer.BACKGROUND_MID,
+                Layer.BACKGROUND_MOD, Layer.BACKGROUND_MOD_MID):
+            if layer in self.layers:
+                self.layers[layer].setVisible(self.variant_visible(layer))
 
     def toggle_liquids(self, checked):
         """
         Toggle liquids
         """
-        for tile in self.tiles:
-            tile.toggle_liquids(checked)
+        self.update_containers(Constants.z_liquids)
 
     def toggle_objects(self, checked):
         """
         Toggle objects
         """
-        for obj in self.objects:
-            obj.setVisible(checked)
+        self.update_containers(Constants.z_objects)
 
     def toggle_object_anchors(self, checked):
         """
         Toggle object anchors
         """
-        for tile in self.tiles:
-            tile.toggle_object_anchors(checked)
+        if self.object_anchors:
+            self.object_anchors.setVisible(checked)
 
     def toggle_plants(self, checked):
         """
         Toggle plants
         """
-        for plant in self.plants:
-            plant.setVisible(checked)
+        self.update_containers(Constants.z_plants)
 
     def toggle_plant_anchors(self, checked):
         """
         Toggle plant anchors
         """
-        for tile in self.tiles:
-            tile.toggle_plant_anchors(checked)
+        if self.plant_anchors:
+            self.plant_anchors.setVisible(checked)
+
+class GUIRegionGroup(object):
+    """
+    A square group of regions, drawn as a single downsampled image for our
+    zoomed-out levels of detail (see `render.RegionPyramid`).
+    """
+
+    def __init__(self, scene, scale, gx, gy, regions):
+        self.scene = scene
+        self.scale = scale
+        self.gx = gx
+        self.gy = gy
+        self.key = ('group', scale, gx, gy)
+        self.regions = regions
+        self.item = None
+        self.loaded = False
+        self.future = None
+        self.pixmap_bytes = 0
+
+    def load(self, visible):
+        """
+        Starts rendering our group image in the background, using the tile
+        layers in `visible`.  `finish_load` will be called once that's done.
+        """
+        if self.loaded:
+            return
+        self.loaded = True
+        self.future = self.scene.submit_render(self,
+                self.scene.pyramid.render_group,
+                self.scene.world, self.scale, self.gx, self.gy,
+                self.regions, visible)
+
+    def finish_load(self, image):
+        """
+        Adds our group image to the scene
+        """
+        self.future = None
+        group = RegionPyramid.group_size(self.scale)
+        group_pixels = group*REGION_PIXELS
+        pixmap = StarboundData.array_to_pixmap(image)
+        self.pixmap_bytes = self.scene.stats.add_pixmap(pixmap)
+        self.item = QtWidgets.QGraphicsPixmapItem(pixmap)
+        self.item.setPos(
+                self.gx*group_pixels,
+                (self.scene.world.height*8) - (self.gy+1)*group_pixels,
+                )
+        self.item.setScale(group_pixels/image.shape[1])
+        self.item.setZValue(Constants.z_background)
+        self.scene.addItem(self.item)
+
+    def unload(self):
+        """
+        Unload from the graphics scene
+        """
+        if self.future:
+            self.future.cancel()
+            self.future = None
+        self.scene.scheduler.discard(self)
+        if self.item:
+            self.scene.scheduler.remove_items([self.item])
+            self.item = None
+        self.scene.stats.pixmap_bytes -= self.pixmap_bytes
+        self.pixmap_bytes = 0
+        self.loaded = False
+
+    def distance_to(self, x, y):
+        """
+        Returns the (squared) distance from the center of this group to the
+        scene coordinates (`x`, `y`)
+        """
+        group_pixels = RegionPyramid.group_size(self.scale)*REGION_PIXELS
+        ctr_x = (self.gx+0.5)*group_pixels
+        ctr_y = (self.scene.world.height*8) - (self.gy+0.5)*group_pixels
+        return (ctr_x-x)**2 + (ctr_y-y)**2
 
 class InfoDialog(QtWidgets.QDialog):
     """
@@ -840,13 +895,13 @@ class TileInfoDialog(InfoDialog):
     Popup dialog for detailed tile info
     """
 
-    def __init__(self, parent, guitile, config):
+    def __init__(self, parent, tileinfo, config):
         self.config = config
-        self.guitile = guitile
+        self.tileinfo = tileinfo
         super().__init__(parent,
                 Config.tileinfo_w, Config.tileinfo_h,
                 config.tileinfo_w, config.tileinfo_h,
-                'Tile Information for ({:d}, {:d})'.format(guitile.x, guitile.y),
+                'Tile Information for ({:d}, {:d})'.format(tileinfo.x, tileinfo.y),
                 )
 
     def populate_contents(self):
@@ -854,9 +909,9 @@ class TileInfoDialog(InfoDialog):
         Populate the contents of the dialog
         """
 
-        guitile = self.guitile
-        tile = guitile.tile
-        scene = guitile.parent
+        tileinfo = self.tileinfo
+        tile = tileinfo.tile
+        scene = tileinfo.parent
         world = scene.world
         data = scene.data
         data_table = scene.mainwindow.data_table
@@ -865,8 +920,8 @@ class TileInfoDialog(InfoDialog):
         # from the DataTable, which is a bit unseemly.  Should push that
         # stuff into a proper data class.
 
-        self.add_text_row('Region', '({:d}, {:d})'.format(guitile.region.rx, guitile.region.ry))
-        self.add_text_row('Coordinates', '({:d}, {:d})'.format(guitile.x, guitile.y))
+        self.add_text_row('Region', '({:d}, {:d})'.format(tileinfo.region.rx, tileinfo.region.ry))
+        self.add_text_row('Coordinates', '({:d}, {:d})'.format(tileinfo.x, tileinfo.y))
         self.add_lookup_text_row('Foreground Material', tile.foreground_material, data.materials)
         self.add_lookup_text_row('Foreground Material Mod', tile.foreground_mod, data.matmods)
         self.add_lookup_text_row('Background Material', tile.background_material, data.materials)
@@ -881,11 +936,11 @@ class TileInfoDialog(InfoDialog):
                 extra=extra_liquid, nothing=0)
 
         # Plants
-        if len(guitile.plants) > 1:
+        if len(tileinfo.plants) > 1:
             show_index = ' {}'.format(idx+1)
         else:
             show_index = ''
-        for idx, (plant_desc, parts) in enumerate(guitile.plants):
+        for idx, (plant_desc, parts) in enumerate(tileinfo.plants):
             partlist = set()
             for (part, _) in parts:
                 partlist.add(part.pathname)
@@ -902,11 +957,11 @@ class TileInfoDialog(InfoDialog):
                 self.cur_row += 1
 
         # Objects
-        if len(guitile.objects) > 1:
+        if len(tileinfo.objects) > 1:
             show_index = ' {}'.format(idx+1)
         else:
             show_index = ''
-        for idx, (obj_data, obj_name, obj_orientation, _, entity) in enumerate(guitile.objects):
+        for idx, (obj_data, obj_name, obj_orientation, _, entity) in enumerate(tileinfo.objects):
             object_label = 'Object{}'.format(show_index)
             self.add_text_row(
                     object_label,
@@ -1002,11 +1057,145 @@ class WorldInfoDialog(InfoDialog):
         self.config.worldinfo_h = self.height()
         super().close()
 
+class RegionScheduler(QtCore.QObject):
+    """
+    Spreads the GUI-thread side of region loading and unloading (adding
+    finished region images and entities to the scene, and removing items
+    from it again) across event loop iterations.  Each iteration spends at
+    most `budget` seconds before handing control back to Qt, so the map
+    keeps repainting and responding to input while a large batch of regions
+    streams in.  Regions closest to the center of the view are added first.
+    """
+
+    budget = 0.008
+
+    # Removals mostly wait until there's nothing left to load, but each
+    # iteration gets through at least `min_removals` of them regardless,
+    # plus however many are queued beyond `max_removals`, so they can't
+    # pile up while regions keep streaming in.
+    min_removals = 16
+    max_removals = 512
+
+    def __init__(self, scene):
+        super().__init__(scene)
+        self.scene = scene
+        self.loads = {}
+        self.removals = collections.deque()
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.run)
+
+    def add_load(self, target, result):
+        """
+        Queues up `target` (a GUIRegion or GUIRegionGroup) to have its
+        background-rendered `result` added to the scene
+        """
+        self.loads[target] = result
+        self.schedule()
+
+    def discard(self, target):
+        """
+        Removes `target` from our load queue, if it's there
+        """
+        self.loads.pop(target, None)
+
+    def remove_items(self, items):
+        """
+        Queues up the given scene `items` for removal.  They're hidden
+        immediately, which is much cheaper than removing them from the
+        scene's index; the actual removal happens once we're idle.
+        """
+        for item in items:
+            item.hide()
+        self.removals.extend(items)
+        self.schedule()
+
+    def schedule(self):
+        """
+        Makes sure we'll run on the next event loop iteration
+        """
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def clear(self):
+        """
+        Drops everything we have queued (for use when the whole scene is
+        about to be cleared anyway)
+        """
+        self.loads = {}
+        self.removals.clear()
+
+    def run(self):
+        """
+        Processes as much of our queue as we can within our budget.  Loads
+        always come first (and we always process at least one).  Past our
+        `min_removals`, removals are deferred until there's nothing left to
+        load, since the items are already hidden and there's no hurry to
+        actually get rid of them.
+        """
+        deadline = time.perf_counter() + self.budget
+
+        if self.loads:
+            (ctr_x, ctr_y) = self.scene.view_center()
+            order = sorted(self.loads, key=lambda target: target.distance_to(ctr_x, ctr_y))
+            for idx, target in enumerate(order):
+                if idx > 0 and time.perf_counter() >= deadline:
+                    break
+                self.scene.apply_load(target, self.loads.pop(target))
+
+        # Removing a container removes (and, once we drop our reference,
+        # frees) all of its children along with it.
+        if self.removals:
+            with span('scene.remove_items', 'gui', queued=len(self.removals)):
+                count = max(self.min_removals, len(self.removals) - self.max_removals)
+                while self.removals and (count > 0 or
+                        (not self.loads and time.perf_counter() < deadline)):
+                    self.scene.removeItem(self.removals.popleft())
+                    count -= 1
+
+        if self.loads or self.removals:
+            self.timer.start()
+
+class SceneStats(object):
+    """
+    Lightweight performance counters for our `MapScene`, for display in
+    the `PerfHUD`.  `pixmap_bytes` only counts the composited region and
+    group images, since object and plant images are shared (and cached
+    by our `StarboundData`).
+    """
+
+    # How many frame times to keep around
+    max_frames = 120
+
+    def __init__(self):
+        self.draw_time = 0
+        self.regions_loaded = 0
+        self.regions_unloaded = 0
+        self.pixmap_bytes = 0
+        self.frame_times = collections.deque(maxlen=self.max_frames)
+
+    def add_pixmap(self, pixmap):
+        """
+        Records a newly-created `pixmap`, returning its size in bytes
+        """
+        size = pixmap.width()*pixmap.height()*pixmap.depth()//8
+        self.pixmap_bytes += size
+        return size
+
 class MapScene(QtWidgets.QGraphicsScene):
     """
     Our main scene which renders the map.
     """
 
+    # Emitted (from a worker thread) when a region has finished compositing.
+    # Arguments are the GUIRegion, the scene generation the request was made
+    # in, and the finished Future.
+    region_rendered = QtCore.pyqtSignal(object, int, object)
+
+    # How many threads to use while compositing regions
+    render_workers = min(4, os.cpu_count() or 1)
+
     def __init__(self, parent, mainwindow):
 
         super().__init__(parent)
@@ -1016,14 +1205,51 @@ class MapScene(QtWidgets.QGraphicsScene):
         self.world = None
         self.regions = {}
         self.loaded_regions = set()
+
+        # Region compositing happens in the background.  `generation` gets
+        # bumped whenever our scene is cleared, so that any stragglers from
+        # a previous world (or data set) get ignored.
+        self.compositor = None
+        self.pyramid = None
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.render_workers)
+        self.generation = 0
+        self.pending_regions = set()
+        self.pending_total = 0
+        self.scheduler = RegionScheduler(self)
+        self.stats = SceneStats()
+
+        # Zoomed-out levels of detail use region groups rather than regions.
+        # `lod_scale` is the scale we're currently showing groups for (or
+        # `None` if we're showing full-detail regions).
+        self.groups = {}
+        self.lod_scale = None
+        self.lod_visible = None
+        self.region_rendered.connect(self.region_finished, QtCore.Qt.QueuedConnection)
         self.hbar = self.parent.horizontalScrollBar()
         self.hbar.sliderReleased.connect(self.draw_visible_area)
+        self.hbar.valueChanged.connect(self.scrolled)
         self.vbar = self.parent.verticalScrollBar()
         self.vbar.sliderReleased.connect(self.draw_visible_area)
+        self.vbar.valueChanged.connect(self.scrolled)
+
+        # Keep track of scrolling so that we can load regions ahead of
+        # time.  While scrolling, we redraw at most every `redraw_interval`
+        # milliseconds.
+        self.prefetch = PrefetchPlanner()
+        self.redraw_interval = 50
+        self.redraw_timer = QtCore.QTimer(self)
+        self.redraw_timer.setSingleShot(True)
+        self.redraw_timer.setInterval(self.redraw_interval)
+        self.redraw_timer.timeout.connect(self.draw_visible_area)
 
         self.dragging = False
         self.moved = False
         self.cur_hover = None
+        self.hover_item = None
+
+        # Analysis overlays drawn over the whole map (see `set_overlay`),
+        # keyed by name
+        self.overlays = {}
 
         # This is used so that our first couple of GUI-setup steps doesn't
         # trigger a map-loading event (until we're actually ready for it)
@@ -1078,7 +1304,52 @@ class MapScene(QtWidgets.QGraphicsScene):
                     sb.setValue(new_y)
                 self.moved = True
         else:
-            super().mouseMoveEvent(event)
+            pos = event.scenePos()
+            self.hover_at(pos.x(), pos.y())
+
+    def hover_at(self, scene_x, scene_y):
+        """
+        Updates our hover state for the given scene coordinates.  Rather than
+        having an item for every tile, we figure out which tile we're over
+        arithmetically and look it up in the region's tile array.
+        """
+        if not self.world:
+            return
+        tile_x = int(scene_x//8)
+        tile_y = int(((self.world.height*8) - scene_y)//8)
+        if (self.cur_hover
+                and self.cur_hover.x == tile_x
+                and self.cur_hover.y == tile_y):
+            return
+
+        self.clear_hover()
+        region = self.regions.get((tile_x//32, tile_y//32))
+        if not region or not region.loaded:
+            return
+        tileinfo = region.get_tile_info(tile_x % 32, tile_y % 32)
+        if not tileinfo:
+            return
+
+        self.cur_hover = tileinfo
+        tileinfo.hover_enter()
+        if not self.hover_item:
+            self.hover_item = self.addRect(0, 0, 8, 8,
+                    QtGui.QPen(QtGui.QColor(0, 0, 0, 0)),
+                    QtGui.QBrush(QtGui.QColor(255, 255, 255, 128)),
+                    )
+            self.hover_item.setZValue(Constants.z_hover)
+        self.hover_item.setPos(tileinfo.gui_x, tileinfo.gui_y)
+        self.hover_item.show()
+
+    def clear_hover(self):
+        """
+        Clears out our currently-hovered tile, if we have one
+        """
+        if self.cur_hover:
+            self.cur_hover.hover_leave()
+            self.cur_hover = None
+        if self.hover_item:
+            self.hover_item.hide()
 
     def load_map(self, world):
 
@@ -1086,6 +1357,7 @@ class MapScene(QtWidgets.QGraphicsScene):
         self.world = world
         self.regions = {}
         self.cur_hover = None
+        self.prefetch.reset()
 
         # Get a list of all regions so we know the count and can draw a
         # QProgressDialog usefully
@@ -1155,6 +1427,18 @@ class MapScene(QtWidgets.QGraphicsScene):
         coord_y = int(self.vbar.value() + self.vbar.pageStep()/2)
         return self.scene_to_ingame(coord_x, coord_y)
 
+    def visible_tiles(self):
+        """
+        Returns the in-game coordinates of the area we're currently showing,
+        as a `(min_x, min_y, max_x, max_y)` tuple
+        """
+        (min_x, max_y) = self.scene_to_ingame(self.hbar.value(), self.vbar.value())
+        (max_x, min_y) = self.scene_to_ingame(
+                self.hbar.value() + self.hbar.pageStep(),
+                self.vbar.value() + self.vbar.pageStep(),
+                )
+        return (int(min_x), int(min_y), int(max_x), int(max_y))
+
     def center_on_spawn(self):
         """
         Centers ourself on the spawn point
@@ -1176,7 +1460,29 @@ class MapScene(QtWidgets.QGraphicsScene):
         # Draw what needs drawing
         self.draw_visible_area()
 
+    def scrolled(self, value=None):
+        """
+        Called whenever either scrollbar moves (including while dragging the
+        map around).  Keeps our prefetch planner up to date and schedules a
+        redraw.
+        """
+        if not self.given_center or not self.world:
+            return
+        self.prefetch.record(*self.centered_tile())
+        if not self.redraw_timer.isActive():
+            self.redraw_timer.start()
+
     def draw_visible_area(self):
+        """
+        Draws the visible area of the scrollbar (see `update_visible_area`),
+        keeping track of how long that took
+        """
+        start = time.perf_counter()
+        with span('draw_visible_area', 'gui'):
+            self.update_visible_area()
+        self.stats.draw_time = time.perf_counter() - start
+
+    def update_visible_area(self):
         """
         Draws the visible area of the scrollbar, and a bit of padding to
         help scrolling hopefully keep up a bit.  Will also purge regions
@@ -1201,66 +1507,277 @@ class MapScene(QtWidgets.QGraphicsScene):
         min_ry = game_min_y//32 - 1
         max_ry = game_max_y//32 + 1
 
-        # First find out how many regions we're going to have to load (so that
-        # we can initialize a progressbar)
-        valid_regions = set()
+        # Zoomed out far enough, we draw region groups instead
+        scale = self.mainwindow.get_zoom_scale()
+        if scale < 1:
+            self.draw_visible_groups(scale, min_rx, max_rx, min_ry, max_ry)
+            return
+        elif self.lod_scale is not None:
+            self.unload_groups()
+            self.lod_scale = None
+
+        # First find out which regions we're going to have to load
+        visible_regions = set()
         regions_to_load = []
         for rx in range(min_rx, max_rx+1):
             for ry in range(min_ry, max_ry+1):
                 region = (rx, ry)
-                valid_regions.add(region)
+                visible_regions.add(region)
                 if region in self.regions:
                     if not self.regions[region].loaded:
                         regions_to_load.append(region)
+        self.prefetch.observe_visible(visible_regions)
+
+        # Then add in any regions which we expect to be scrolling into
+        # view soon
+        valid_regions = set(visible_regions)
+        regions_to_prefetch = []
+        for region in self.prefetch.plan(min_rx, max_rx, min_ry, max_ry):
+            if region in self.regions:
+                valid_regions.add(region)
+                if not self.regions[region].loaded:
+                    regions_to_prefetch.append(region)
 
-        # Initialize progressbar
-        region_loading = self.mainwindow.region_loading
-        region_loading.start(len(regions_to_load))
-
-        # Now actually do the loading
-        for idx, region in enumerate(regions_to_load):
+        # Unload regions which are too far out
+        for region in list(self.loaded_regions):
+            if region not in valid_regions:
+                #print('Unloading region {}'.format(region))
+                self.regions[region].unload()
+                self.loaded_regions.remove(region)
+                self.pending_regions.discard(region)
+                self.prefetch.observe_unloaded(region)
+
+        # Now kick off the loading, closest to the center first.  The
+        # regions will be composited in the background and added to the
+        # scene by our scheduler.
+        if not self.pending_regions:
+            self.pending_total = 0
+        (ctr_x, ctr_y) = self.view_center()
+        regions_to_load.sort(key=lambda region: self.regions[region].distance_to(ctr_x, ctr_y))
+        for region in regions_to_load:
             #print('Loading region {}'.format(region))
             self.regions[region].load()
             self.loaded_regions.add(region)
-            region_loading.update(idx)
+        for region in regions_to_prefetch:
+            self.regions[region].load()
+            self.loaded_regions.add(region)
+            self.prefetch.issue(region)
+        self.update_region_progress()
+
+    def draw_visible_groups(self, scale, min_rx, max_rx, min_ry, max_ry):
+        """
+        Draws the region groups covering the given region range, for one of
+        our zoomed-out levels of detail, and purges groups which are out of
+        view.
+        """
+
+        # Switching into (or between) levels of detail means getting rid of
+        # whatever we were showing before.
+        if self.lod_scale != scale:
+            for region in self.loaded_regions:
+                self.regions[region].unload()
+                self.pending_regions.discard(region)
+            self.loaded_regions = set()
+            self.unload_groups()
+            self.lod_scale = scale
+        if self.pyramid is None:
+            self.pyramid = RegionPyramid(self.get_compositor())
+        visible = self.mainwindow.layer_toggles.visible_layers()
+        if visible != self.lod_visible:
+            self.unload_groups()
+            self.lod_visible = visible
+
+        group = RegionPyramid.group_size(scale)
+        valid_groups = set()
+        for gx in range(min_rx//group, max_rx//group+1):
+            for gy in range(min_ry//group, max_ry//group+1):
+                valid_groups.add((gx, gy))
+
+        # Unload groups which are too far out
+        for key in list(self.groups.keys()):
+            if key not in valid_groups:
+                self.groups[key].unload()
+                self.pending_regions.discard(self.groups[key].key)
+                del self.groups[key]
+
+        # Load in new ones, closest to the center first
+        if not self.pending_regions:
+            self.pending_total = 0
+        new_groups = []
+        for (gx, gy) in valid_groups:
+            if (gx, gy) in self.groups:
+                continue
+            regions = []
+            for rx in range(gx*group, (gx+1)*group):
+                for ry in range(gy*group, (gy+1)*group):
+                    if (rx, ry) in self.regions:
+                        regions.append((rx, ry))
+            if regions:
+                self.groups[(gx, gy)] = GUIRegionGroup(self, scale, gx, gy, regions)
+                new_groups.append(self.groups[(gx, gy)])
+        (ctr_x, ctr_y) = self.view_center()
+        new_groups.sort(key=lambda new_group: new_group.distance_to(ctr_x, ctr_y))
+        for new_group in new_groups:
+            new_group.load(visible)
+        self.update_region_progress()
+
+    def unload_groups(self):
+        """
+        Unloads all of our region groups
+        """
+        for group in self.groups.values():
+            group.unload()
+            self.pending_regions.discard(group.key)
+        self.groups = {}
+
+    def get_compositor(self):
+        """
+        Returns our RegionCompositor, creating a new one if our data has
+        changed
+        """
+        if self.compositor is None or self.compositor.data is not self.data:
+            self.compositor = RegionCompositor(self.data)
+            self.pyramid = None
+        return self.compositor
+
+    def submit_render(self, target, func, *args):
+        """
+        Submits `func(*args)` to be run in the background, on behalf of
+        `target` (a GUIRegion or GUIRegionGroup), whose `finish_load` will
+        be called with the results.  Returns the associated Future.
+        """
+        generation = self.generation
+        future = self.executor.submit(func, *args)
+        self.pending_regions.add(target.key)
+        self.pending_total += 1
+        future.add_done_callback(
+                lambda f: self.region_rendered.emit(target, generation, f))
+        return future
+
+    def region_finished(self, target, generation, future):
+        """
+        Called on the GUI thread once a region (or region group) has finished
+        rendering
+        """
+        if generation != self.generation or future.cancelled() or target.future is not future:
+            return
+        target.future = None
+        try:
+            result = future.result()
+        except Exception as e:
+            print('Unable to render {}: {}'.format(target.key, e))
+            self.pending_regions.discard(target.key)
+            self.update_region_progress()
+        else:
+            self.scheduler.add_load(target, result)
 
-        # Unload regions which are too far out
-        regions_to_unload = []
-        for region in list(self.loaded_regions):
-            if region not in valid_regions:
-                regions_to_unload.append(region)
+    def apply_load(self, target, result):
+        """
+        Called by our scheduler to actually add a rendered region (or region
+        group) to the scene
+        """
+        with span('region.finish_load', 'gui', key=str(target.key)):
+            target.finish_load(result)
+        self.pending_regions.discard(target.key)
+        self.update_region_progress()
 
-        region_loading.start(len(regions_to_unload), label='Unloading Regions')
-        for idx, region in enumerate(regions_to_unload):
-            #print('Unloading region {}'.format(region))
-            self.regions[region].unload()
-            self.loaded_regions.remove(region)
-            region_loading.update(idx)
+    def view_center(self):
+        """
+        Returns the scene coordinates of the center of the view
+        """
+        viewport = self.parent.viewport().rect()
+        center = self.parent.mapToScene(viewport.center())
+        return (center.x(), center.y())
+
+    def update_region_progress(self):
+        """
+        Updates our region-loading progress bar to match our pending
+        regions.
+        """
+        region_loading = self.mainwindow.region_loading
+        if self.pending_regions:
+            region_loading.start(self.pending_total)
+            region_loading.update(self.pending_total - len(self.pending_regions))
+        else:
+            self.pending_total = 0
+            region_loading.finish()
 
-        # Finish our progress bar
-        region_loading.finish()
+    def cancel_pending(self):
+        """
+        Cancels any regions which are currently waiting to be composited,
+        and ignores any which are already in progress.
+        """
+        self.generation += 1
+        for region in self.loaded_regions:
+            self.regions[region].unload()
+        self.unload_groups()
+        self.scheduler.clear()
+        self.pending_regions = set()
+        self.pending_total = 0
+        self.mainwindow.region_loading.finish()
 
     def clear(self):
         """
         Clears out our scene
         """
+        self.cancel_pending()
         super().clear()
+        self.hover_item = None
+        self.overlays = {}
         self.world = None
         self.regions = {}
         self.loaded_regions = set()
+        self.pyramid = None
+        self.lod_visible = None
         self.given_center = False
 
+    def set_overlay(self, name, image, x, y, tiles_per_pixel=1, smooth=False):
+        """
+        Shows the RGBA numpy array `image` over the map as a single item,
+        replacing any previous overlay called `name`.  `image` should be in
+        image orientation (so the first row is the *top*), and each pixel
+        covers a square of `tiles_per_pixel` tiles, with the bottom-left
+        pixel covering in-game coordinates (`x`, `y`).  The array must be
+        contiguous.  If `smooth` is `True`, the image will be smoothed as
+        it's scaled up.
+        """
+        self.remove_overlay(name)
+        if not self.world or not image.size:
+            return
+        qimage = QtGui.QImage(image.data,
+                image.shape[1], image.shape[0],
+                image.shape[1]*4,
+                QtGui.QImage.Format_RGBA8888)
+        item = self.addPixmap(QtGui.QPixmap.fromImage(qimage))
+        if smooth:
+            item.setTransformationMode(QtCore.Qt.SmoothTransformation)
+        item.setScale(tiles_per_pixel*8)
+        item.setPos(x*8, (self.world.height - y - image.shape[0]*tiles_per_pixel)*8)
+        item.setZValue(Constants.z_analysis)
+        self.overlays[name] = item
+
+    def remove_overlay(self, name):
+        """
+        Removes the overlay called `name`, if we have it
+        """
+        item = self.overlays.pop(name, None)
+        if item:
+            self.removeItem(item)
+
     def refresh(self, data):
         """
         Refreshes our scene - currently just used when we change data
         dirs, because it's possible that our graphics may have changed,
         etc.
         """
-        for region in self.loaded_regions:
-            self.regions[region].unload()
+        self.cancel_pending()
         super().clear()
+        self.hover_item = None
+        self.overlays = {}
         self.data = data
         self.loaded_regions = set()
+        self.pyramid = None
+        self.lod_visible = None
         self.draw_visible_area()
 
     def toggle_foreground(self, checked):
@@ -1269,6 +1786,8 @@ class MapScene(QtWidgets.QGraphicsScene):
         """
         for region in self.loaded_regions:
             self.regions[region].toggle_foreground(checked)
+        if self.lod_scale is not None:
+            self.draw_visible_area()
 
     def toggle_fore_mod(self, checked):
         """
@@ -1276,6 +1795,8 @@ class MapScene(QtWidgets.QGraphicsScene):
         """
         for region in self.loaded_regions:
             self.regions[region].toggle_fore_mod(checked)
+        if self.lod_scale is not None:
+            self.draw_visible_area()
 
     def toggle_background(self, checked):
         """
@@ -1283,6 +1804,8 @@ class MapScene(QtWidgets.QGraphicsScene):
         """
         for region in self.loaded_regions:
             self.regions[region].toggle_background(checked)
+        if self.lod_scale is not None:
+            self.draw_visible_area()
 
     def toggle_back_mod(self, checked):
         """
@@ -1290,6 +1813,8 @@ class MapScene(QtWidgets.QGraphicsScene):
         """
         for region in self.loaded_regions:
             self.regions[region].toggle_back_mod(checked)
+        if self.lod_scale is not None:
+            self.draw_visible_area()
 
     def toggle_back_mid(self, checked):
         """
@@ -1297,6 +1822,8 @@ class MapScene(QtWidgets.QGraphicsScene):
         """
         for region in self.loaded_regions:
             self.regions[region].toggle_back_mid(checked)
+        if self.lod_scale is not None:
+            self.draw_visible_area()
 
     def toggle_liquids(self, checked):
         """
@@ -1304,6 +1831,8 @@ class MapScene(QtWidgets.QGraphicsScene):
         """
         for region in self.loaded_regions:
             self.regions[region].toggle_liquids(checked)
+        if self.lod_scale is not None:
+            self.draw_visible_area()
 
     def toggle_objects(self, checked):
         """
@@ -1355,6 +1884,16 @@ class MapArea(QtWidgets.QGraphicsView):
         super().wheelEvent(event)
         self.scene.draw_visible_area()
 
+    def leaveEvent(self, event):
+        super().leaveEvent(event)
+        self.scene.clear_hover()
+
+    def paintEvent(self, event):
+        start = time.perf_counter()
+        with span('paint', 'gui'):
+            super().paintEvent(event)
+        self.scene.stats.frame_times.append(time.perf_counter() - start)
+
 class DataTable(QtWidgets.QWidget):
     """
     Widget to show information about the currently-hovered tile
@@ -1496,6 +2035,31 @@ class LayerToggles(QtWidgets.QWidget):
                 indent=True,
                 default=False,
                 )
+        self.lighting_toggle = self.add_row('Explored Areas (Lights)',
+                self.maingui.light_mapper.set_visible,
+                default=False,
+                )
+        self.maingui.light_mapper.changed.connect(self.update_lighting_status)
+
+    def layer_visible(self, layer):
+        """
+        Returns whether the given tile `layer` should currently be visible
+        """
+        return layer in self.visible_layers()
+
+    def visible_layers(self):
+        """
+        Returns a tuple of all the tile layers which should currently be
+        visible
+        """
+        return Layer.select(
+                foreground=self.fore_toggle.isChecked(),
+                foreground_mod=self.fore_mod_toggle.isChecked(),
+                background=self.back_toggle.isChecked(),
+                background_mod=self.back_mod_toggle.isChecked(),
+                liquids=self.liquids_toggle.isChecked(),
+                back_mid=self.back_mid_toggle.isChecked(),
+                )
 
     def add_row(self, label_text, callback, indent=False, default=True):
         """
@@ -1520,6 +2084,16 @@ class LayerToggles(QtWidgets.QWidget):
         self.cur_row += 1
         return checkbox
 
+    def update_lighting_status(self):
+        """
+        Shows the status of our light map alongside its toggle
+        """
+        status = self.maingui.light_mapper.status
+        if status:
+            self.lighting_toggle.setText('Explored Areas ({})'.format(status))
+        else:
+            self.lighting_toggle.setText('Explored Areas (Lights)')
+
     def toggle_foreground(self, checked):
         """
         Toggles the foreground material
@@ -1623,37 +2197,725 @@ class RegionLoadingNotifier(QtWidgets.QWidget):
         self.text_label.hide()
         self.bar.hide()
 
-class OpenByDialog(QtWidgets.QDialog):
+class BackgroundScanner(QtCore.QObject):
     """
-    Base dialog for both of our open-by-name dialogs
+    Runs scans of a world (such as `occurrences.scan_world`) in our own
+    worker thread, reporting progress back to the GUI thread with signals.
+    Each scan belongs to a generation; clearing out (or starting a new
+    scan) moves on to the next one, which cancels any scan in progress
+    at its next progress report, and makes sure we ignore anything still
+    on its way from the old scan.
+
+    Subclasses can set `progress_format` and `error_status` for their
+    status text, and override `scan_update` and `scan_result` to do more
+    with progress reports and results.
     """
 
-    def __init__(self, parent, main_label, height=350, extra_widget=None):
-        super().__init__(parent)
-        self.setModal(True)
-        self.setSizeGripEnabled(True)
-        self.setAttribute(QtCore.Qt.WA_DeleteOnClose)
-        self.setMinimumSize(400, height)
-        self.setWindowTitle('Load Starbound World')
+    # Emitted from our worker thread with scan progress.  Arguments are
+    # the scan generation, and a tuple of the arguments which the scan
+    # passed to its progress callback.
+    scan_updated = QtCore.pyqtSignal(int, object)
 
-        self.sort_mtime_idx = 0
-        self.sort_alpha_idx = 1
+    # Emitted from our worker thread when a scan is done.  Arguments are
+    # the scan generation and its result (or `None`, on errors).
+    scan_finished = QtCore.pyqtSignal(int, object)
 
-        # Layout info
-        layout = QtWidgets.QVBoxLayout()
-        self.setLayout(layout)
+    # Emitted whenever our result or status changes
+    changed = QtCore.pyqtSignal()
 
-        # Title
-        title_label = QtWidgets.QLabel(main_label, self)
-        title_label.setStyleSheet('font-weight: bold; font-size: 12pt;')
-        layout.addWidget(title_label, 0, QtCore.Qt.AlignCenter)
+    # Status for scans in progress, formatted with the number of regions
+    # done and total
+    progress_format = 'Scanning: {}/{}'
 
-        # Box to hold sorting buttons
-        w = QtWidgets.QWidget()
-        hbox = QtWidgets.QHBoxLayout()
-        w.setLayout(hbox)
-        self.button_mtime = QtWidgets.QPushButton('Sort: new -> old', self)
-        self.button_mtime.setCheckable(True)
+    # Status for scans which went wrong
+    error_status = 'Unable to scan'
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.mainwindow = parent
+        self.result = None
+        self.status = ''
+        self.scanning = False
+        self.generation = 0
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.scan_updated.connect(self.scan_progress)
+        self.scan_finished.connect(self.scan_done)
+
+    def start(self, status, func, *args, save=None):
+        """
+        Starts a scan in our worker thread, showing `status` until we hear
+        about its progress.  `func` is called with `args` plus a progress
+        callback, and should return `None` if the callback tells it to stop.
+        If `save` is passed in, it will be called from the worker thread
+        with the result of a successful scan, to cache it on disk.
+        """
+        generation = self.generation
+        self.scanning = True
+        self.status = status
+        future = self.executor.submit(func, *args,
+                lambda *progress: self.scan_callback(generation, *progress))
+        future.add_done_callback(lambda f: self.scan_complete(generation, save, f))
+        self.changed.emit()
+
+    def scan_callback(self, generation, *progress):
+        """
+        Progress callback from our worker thread.  Returns `True` if the
+        scan should be cancelled.
+        """
+        if generation != self.generation:
+            return True
+        self.scan_updated.emit(generation, progress)
+        return False
+
+    def scan_complete(self, generation, save, future):
+        """
+        Called from our worker thread when a scan is done; saves the result
+        and hands it over to the GUI thread.
+        """
+        if generation != self.generation or future.cancelled():
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            print('{}: {}'.format(self.error_status, e))
+            result = None
+        if result is not None and save is not None:
+            save(result)
+        self.scan_finished.emit(generation, result)
+
+    def scan_progress(self, generation, progress):
+        """
+        Handles a progress report from our current scan
+        """
+        if generation != self.generation:
+            return
+        self.scan_update(*progress)
+        self.changed.emit()
+
+    def scan_update(self, done, total):
+        """
+        Updates our status with scan progress
+        """
+        self.status = self.progress_format.format(done, total)
+
+    def scan_done(self, generation, result):
+        """
+        Stores the result of a finished scan
+        """
+        if generation != self.generation:
+            return
+        self.scanning = False
+        self.result = result
+        if result is None:
+            self.status = self.error_status
+        else:
+            self.status = ''
+        self.scan_result(result)
+        self.changed.emit()
+
+    def scan_result(self, result):
+        """
+        Called once a scan has finished, with its result
+        """
+        pass
+
+    def clear(self):
+        """
+        Clears out our result, cancelling any scan in progress
+        """
+        self.generation += 1
+        self.result = None
+        self.scanning = False
+        self.status = ''
+        self.changed.emit()
+
+    def shutdown(self):
+        """
+        Cancels any scan in progress and shuts down our worker thread,
+        without waiting for it.  Used when the app is closing.
+        """
+        self.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+class MinimapScanner(BackgroundScanner):
+    """
+    Scans the world for our `Minimap`.  Progress reports come with the
+    in-progress image, which we keep as our result so that the minimap
+    can be drawn as the scan goes.
+    """
+
+    error_status = 'Unable to generate minimap'
+
+    def scan_callback(self, generation, image, done, total):
+        """
+        Progress callback from our worker thread.  The image is still being
+        drawn into, so the GUI thread gets a copy.
+        """
+        return super().scan_callback(generation, image.copy(), done, total)
+
+    def scan_update(self, image, done, total):
+        """
+        Updates our image and status with scan progress
+        """
+        self.result = image
+        super().scan_update(done, total)
+
+class Minimap(QtWidgets.QWidget):
+    """
+    Widget to show a small overview of the whole world, with the currently
+    visible area marked.  The image is generated by scanning every region
+    in the background (see the `minimap` module), and cached on disk.
+    Clicking (or dragging) on the minimap will navigate there.
+    """
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.mainwindow = parent
+        self.setMinimumSize(200, 150)
+        self.setMouseTracking(False)
+        self.image = None
+        self.qimage = None
+        self.filename = None
+        self.mtime = None
+        self.scanner = MinimapScanner(self)
+        self.scanner.changed.connect(self.scan_changed)
+
+    def load_world(self, filename, data):
+        """
+        Loads the minimap for the world at `filename`, either from our cache
+        or by scanning the world in the background.
+        """
+        self.clear()
+        self.filename = filename
+        self.mtime = mtime = os.path.getmtime(filename)
+        cache_dir = self.mainwindow.config.cache_dir
+        image = minimap.load_cached(cache_dir, filename, mtime)
+        if image is not None:
+            self.set_image(image)
+        else:
+            self.scanner.start('Scanning world...', minimap.scan_world, filename, data,
+                    save=lambda image: minimap.save_cached(cache_dir, filename, mtime, image))
+        self.update()
+
+    def scan_changed(self):
+        """
+        Updates our display with the (possibly in-progress) scan image
+        """
+        if self.scanner.result is not None:
+            self.set_image(self.scanner.result)
+        self.update()
+
+    def set_image(self, image):
+        """
+        Sets our current minimap image
+        """
+        self.image = image
+        self.qimage = QtGui.QImage(image.data,
+                image.shape[1], image.shape[0],
+                image.shape[1]*4,
+                QtGui.QImage.Format_RGBA8888)
+
+    def clear(self):
+        """
+        Clears out our minimap, cancelling any scan in progress
+        """
+        self.scanner.clear()
+        self.image = None
+        self.qimage = None
+        self.filename = None
+        self.mtime = None
+        self.update()
+
+    def image_rect(self):
+        """
+        Returns the QRectF inside our widget which the minimap image is
+        drawn into (keeping its aspect ratio)
+        """
+        (img_h, img_w) = self.image.shape[:2]
+        scale = min(self.width()/img_w, self.height()/img_h)
+        w = img_w*scale
+        h = img_h*scale
+        return QtCore.QRectF((self.width()-w)/2, (self.height()-h)/2, w, h)
+
+    def paintEvent(self, event):
+        """
+        Draws the minimap, and a rectangle showing what's currently
+        visible in the main map
+        """
+        painter = QtGui.QPainter(self)
+        painter.fillRect(self.rect(), QtGui.QColor(40, 40, 40))
+        if self.qimage is not None:
+            target = self.image_rect()
+            painter.drawImage(target, self.qimage)
+
+            # Now the viewport.  Scene coordinates map to minimap pixels
+            # by way of in-game tiles.
+            scene = self.mainwindow.scene
+            if scene.world:
+                maparea = self.mainwindow.maparea
+                visible = maparea.mapToScene(maparea.viewport().rect()).boundingRect()
+                scale = target.width()/self.image.shape[1]/minimap.TILES_PER_PIXEL/8
+                top = self.image.shape[0]*minimap.TILES_PER_PIXEL*8 - scene.world.height*8
+                painter.setPen(QtGui.QPen(QtGui.QColor(255, 255, 0)))
+                painter.setBrush(QtCore.Qt.NoBrush)
+                painter.drawRect(QtCore.QRectF(
+                    target.x() + visible.x()*scale,
+                    target.y() + (visible.y()+top)*scale,
+                    visible.width()*scale,
+                    visible.height()*scale,
+                    ))
+
+        if self.scanner.status:
+            painter.setPen(QtGui.QPen(QtGui.QColor(255, 255, 255)))
+            painter.drawText(self.rect().adjusted(4, 4, -4, -4),
+                    QtCore.Qt.AlignLeft | QtCore.Qt.AlignBottom,
+                    self.scanner.status)
+        painter.end()
+
+    def navigate_to(self, pos):
+        """
+        Centers the main map on the in-game location corresponding to the
+        widget coordinates `pos`
+        """
+        if self.image is None or not self.mainwindow.scene.world:
+            return
+        target = self.image_rect()
+        if not target.contains(pos):
+            return
+        widget_pixels_per_pixel = target.width()/self.image.shape[1]
+        x = (pos.x() - target.x())/widget_pixels_per_pixel*minimap.TILES_PER_PIXEL
+        y = (target.bottom() - pos.y())/widget_pixels_per_pixel*minimap.TILES_PER_PIXEL
+        self.mainwindow.scene.center_on(x, y)
+
+    def mousePressEvent(self, event):
+        if event.button() == QtCore.Qt.LeftButton:
+            self.navigate_to(event.localPos())
+
+    def mouseMoveEvent(self, event):
+        if event.buttons() & QtCore.Qt.LeftButton:
+            self.navigate_to(event.localPos())
+
+class TileIndexer(BackgroundScanner):
+    """
+    Keeps an `occurrences.OccurrenceIndex` of the current world, for our
+    `FindTilesDialog`.  Like the minimap, the index is built by scanning
+    every region in the background the first time a world is opened, and
+    cached on disk until the world is next saved.
+    """
+
+    progress_format = 'Indexing world: {}/{} regions'
+    error_status = 'Unable to index world'
+
+    @property
+    def index(self):
+        """
+        Our current index (or `None`, if we don't have one yet)
+        """
+        return self.result
+
+    def load_world(self, filename):
+        """
+        Loads the index for the world at `filename`, either from our cache
+        or by scanning the world in the background.
+        """
+        self.clear()
+        mtime = os.path.getmtime(filename)
+        cache_dir = self.mainwindow.config.cache_dir
+        index = occurrences.load_cached(cache_dir, filename, mtime)
+        if index is not None:
+            self.result = index
+            self.changed.emit()
+        else:
+            self.start('Indexing world...', occurrences.scan_world, filename,
+                    save=lambda index: occurrences.save_cached(cache_dir, filename, mtime, index))
+
+class ContainerIndexer(BackgroundScanner):
+    """
+    Keeps our `containers.ContainerIndex` of container contents across all
+    of a player's worlds up to date, for our `FindItemsDialog`.  Worlds are
+    read in the background by a pool of worker threads, and only worlds
+    which have been saved since we last read them need reading again.
+    Finding out which worlds the player knows about can involve reading in
+    world metadata too, so that also happens in the background, before
+    we read any containers.
+    """
+
+    progress_format = 'Caching world info: {}/{} worlds'
+    error_status = 'Unable to read containers'
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self._index = None
+        self.player = None
+        self.world_names = {}
+        self.mtimes = None
+
+    @property
+    def index(self):
+        """
+        Loads our index from disk on-demand
+        """
+        if self._index is None:
+            self._index = containers.ContainerIndex(
+                    containers.index_filename(self.mainwindow.config.cache_dir))
+        return self._index
+
+    def load_player(self, player):
+        """
+        Switches over to the worlds known to `player`, reading in any which
+        have changed since we last saw them.  This starts off by getting the
+        player's list of worlds; `scan_result` takes it from there.
+        """
+        self.clear()
+        self.player = player
+        self.start('Caching world info...', player.get_worlds, self.mainwindow.data)
+
+    def scan_update(self, *progress):
+        """
+        Updates our status while getting the player's list of worlds, and
+        adds each world to our index as it's read
+        """
+        if self.mtimes is None:
+            super().scan_update(*progress)
+        else:
+            (filename, found, done, total) = progress
+            if found is not None:
+                self.index.update_world(filename, self.mtimes[filename], found)
+            self.status = 'Reading containers: {}/{} worlds'.format(done, total)
+
+    def scan_result(self, result):
+        """
+        Once we have the player's list of worlds, starts reading in any which
+        have changed.  Once those have been read, saves our index.
+        """
+        if self.mtimes is None and result is not None:
+            self.world_names = {filename: cache_entry.world_name for (_, cache_entry, filename) in result}
+            self.mtimes = {filename: mtime for (mtime, _, filename) in result}
+            self.index.prune()
+            to_scan = self.index.stale(self.mtimes)
+            if to_scan:
+                self.start('Reading containers: 0/{} worlds'.format(len(to_scan)),
+                        containers.scan_worlds, to_scan)
+                return
+        if self._index is not None and self._index.changed:
+            self._index.save()
+
+    def clear(self):
+        """
+        Forgets our current player, cancelling any scan in progress.  Whatever
+        was read in so far is kept.
+        """
+        if self.scanning and self._index is not None and self._index.changed:
+            self._index.save()
+        self.player = None
+        self.world_names = {}
+        self.mtimes = None
+        super().clear()
+
+class HoleDetector(BackgroundScanner):
+    """
+    Looks for holes in the background tiles of the current world (see the
+    `holes` module), for our `FindHolesDialog`.  Scans happen in the
+    background, and the holes found are shown on the map as a single
+    overlay.
+    """
+
+    progress_format = 'Scanning for holes: {}/{} regions'
+    error_status = 'Unable to scan for holes'
+
+    # Name of our map overlay
+    overlay_name = 'holes'
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.show_overlay = True
+
+    def scan(self, area=None, max_size=holes.DEFAULT_MAX_SIZE):
+        """
+        Starts scanning the open world for holes.  If `area` is given, as
+        a tuple of in-game `(min_x, min_y, max_x, max_y)` coordinates, only
+        that area is scanned.  Otherwise we scan the whole world.
+        """
+        self.clear()
+        filename = self.mainwindow.loaded_filename
+        if not self.mainwindow.world or not filename:
+            return
+        self.start('Scanning for holes...', holes.scan_world, filename, area, max_size)
+
+    def scan_result(self, result):
+        """
+        Shows the holes we found on the map
+        """
+        self.update_overlay()
+
+    def set_show_overlay(self, show):
+        """
+        Shows or hides our holes on the map
+        """
+        self.show_overlay = show
+        self.update_overlay()
+
+    def update_overlay(self):
+        """
+        Brings our map overlay in line with our current results
+        """
+        scene = self.mainwindow.scene
+        if self.show_overlay and self.result is not None and self.result.holes:
+            scene.set_overlay(self.overlay_name,
+                    holes.overlay_image(self.result.mask),
+                    self.result.x, self.result.y)
+        else:
+            scene.remove_overlay(self.overlay_name)
+
+    def clear(self):
+        """
+        Clears out our results (and map overlay), cancelling any scan in
+        progress
+        """
+        self.mainwindow.scene.remove_overlay(self.overlay_name)
+        super().clear()
+
+class LightMapper(BackgroundScanner):
+    """
+    Keeps a `lighting.LightMap` of the current world, showing which areas
+    have been lit up by light sources (and so, presumably, explored).  The
+    light map is only generated once it's actually been asked for, by
+    scanning every region in the background, and is cached on disk until
+    the world is next saved.  It's shown on the map as a single overlay.
+    """
+
+    # Name of our map overlay
+    overlay_name = 'lighting'
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.filename = None
+        self.visible = False
+        self.sources = None
+        self.sources_data = None
+
+    @property
+    def light_map(self):
+        """
+        Our current light map (or `None`, if we don't have one yet)
+        """
+        return self.result
+
+    def load_world(self, filename):
+        """
+        Switches over to the world at `filename`, generating its light map
+        if we're being shown
+        """
+        self.clear()
+        self.filename = filename
+        if self.visible:
+            self.load()
+
+    def set_visible(self, visible):
+        """
+        Shows or hides our overlay, generating the light map if we don't
+        have it yet
+        """
+        self.visible = visible
+        if visible and self.light_map is None:
+            self.load()
+        self.update_overlay()
+
+    def load(self):
+        """
+        Loads the light map for our world, either from our cache or by
+        scanning the world in the background
+        """
+        if not self.filename or self.scanning:
+            return
+        data = self.mainwindow.data
+        if self.sources_data is not data:
+            self.sources = lighting.LightSources(data)
+            self.sources_data = data
+        filename = self.filename
+        mtime = os.path.getmtime(filename)
+        cache_dir = self.mainwindow.config.cache_dir
+        light_map = lighting.load_cached(cache_dir, filename, mtime)
+        if light_map is not None:
+            self.result = light_map
+            self.update_overlay()
+            self.changed.emit()
+        else:
+            self.start('Scanning...', lighting.scan_world, filename, self.sources,
+                    save=lambda light_map: lighting.save_cached(cache_dir, filename, mtime, light_map))
+
+    def scan_result(self, light_map):
+        """
+        Shows our new light map on the map
+        """
+        self.update_overlay()
+
+    def update_overlay(self):
+        """
+        Brings our map overlay in line with our current light map
+        """
+        scene = self.mainwindow.scene
+        if self.visible and self.light_map is not None:
+            scene.set_overlay(self.overlay_name,
+                    self.light_map.overlay_image(),
+                    0, 0,
+                    tiles_per_pixel=lighting.CELL_TILES,
+                    smooth=True)
+        else:
+            scene.remove_overlay(self.overlay_name)
+
+    def clear(self):
+        """
+        Clears out our light map (and map overlay), cancelling any scan in
+        progress
+        """
+        self.filename = None
+        self.mainwindow.scene.remove_overlay(self.overlay_name)
+        super().clear()
+
+class FrameTimeGraph(QtWidgets.QWidget):
+    """
+    Rolling bar graph of our most recent map paint times
+    """
+
+    # The graph always goes at least this high (in seconds); a 60fps frame
+    target = 1/60
+
+    def __init__(self, parent, stats):
+        super().__init__(parent)
+        self.stats = stats
+        self.setMinimumSize(SceneStats.max_frames, 60)
+
+    def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        painter.fillRect(self.rect(), QtGui.QColor(40, 40, 40))
+        times = list(self.stats.frame_times)
+        top = max([self.target*2] + times)
+        height = self.height()
+        bar_w = self.width()/SceneStats.max_frames
+        for idx, frame_time in enumerate(times):
+            if frame_time > self.target:
+                color = QtGui.QColor(220, 80, 80)
+            else:
+                color = QtGui.QColor(80, 200, 80)
+            bar_h = frame_time/top*height
+            painter.fillRect(QtCore.QRectF(idx*bar_w, height-bar_h, bar_w, bar_h), color)
+        target_y = height - self.target/top*height
+        painter.setPen(QtGui.QPen(QtGui.QColor(255, 255, 0)))
+        painter.drawLine(QtCore.QPointF(0, target_y), QtCore.QPointF(self.width(), target_y))
+        painter.end()
+
+class PerfHUD(QtWidgets.QWidget):
+    """
+    Live performance counters for the map, refreshed a few times a second
+    while we're visible
+    """
+
+    refresh_interval = 250
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.mainwindow = parent
+        self.scene = parent.scene
+        layout = QtWidgets.QVBoxLayout(self)
+        form = QtWidgets.QFormLayout()
+        self.labels = {}
+        for key, label in [
+                ('regions', 'Loaded Regions'),
+                ('pending', 'Pending Regions'),
+                ('churn', 'Loads / Unloads'),
+                ('items', 'Scene Items'),
+                ('draw', 'Last Visible-Area Update'),
+                ('frame', 'Last Paint'),
+                ('pixmaps', 'Region Pixmaps'),
+                ('pyramid', 'LOD Cache'),
+                ('disk', 'Disk Cache'),
+                ('prefetch', 'Prefetch'),
+                ]:
+            self.labels[key] = QtWidgets.QLabel(self)
+            form.addRow(label, self.labels[key])
+        layout.addLayout(form)
+        self.graph = FrameTimeGraph(self, self.scene.stats)
+        layout.addWidget(self.graph)
+        layout.addStretch(1)
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(self.refresh_interval)
+        self.timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+        self.timer.start()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.timer.stop()
+
+    def refresh(self):
+        """
+        Updates all our counters from the scene
+        """
+        scene = self.scene
+        stats = scene.stats
+        frame_time = stats.frame_times[-1] if stats.frame_times else 0
+        if scene.lod_scale is None:
+            regions = '{}'.format(len(scene.loaded_regions))
+        else:
+            regions = '{} groups at {}x'.format(len(scene.groups), scene.lod_scale)
+        self.labels['regions'].setText(regions)
+        self.labels['pending'].setText('{}'.format(len(scene.pending_regions)))
+        self.labels['churn'].setText('{} / {}'.format(stats.regions_loaded, stats.regions_unloaded))
+        self.labels['items'].setText('{}'.format(len(scene.items())))
+        self.labels['draw'].setText('{:.2f}ms'.format(stats.draw_time*1000))
+        self.labels['frame'].setText('{:.2f}ms'.format(frame_time*1000))
+        self.labels['pixmaps'].setText('{:.1f}MB'.format(stats.pixmap_bytes/1024/1024))
+        if scene.pyramid:
+            self.labels['pyramid'].setText('{} regions'.format(len(scene.pyramid.cache)))
+        else:
+            self.labels['pyramid'].setText('-')
+        cache = scene.data.region_cache if scene.data else None
+        if cache:
+            self.labels['disk'].setText('{} hits, {} misses, {:.1f}MB'.format(
+                cache.hits, cache.misses, cache.total_bytes/1024/1024))
+        else:
+            self.labels['disk'].setText('-')
+        prefetch = scene.prefetch.stats()
+        self.labels['prefetch'].setText('{} issued, {} hits, {} wasted'.format(
+            prefetch['issued'], prefetch['hits'], prefetch['wasted']))
+        self.graph.update()
+
+class OpenByDialog(QtWidgets.QDialog):
+    """
+    Base dialog for both of our open-by-name dialogs
+    """
+
+    def __init__(self, parent, main_label, height=350, extra_widget=None):
+        super().__init__(parent)
+        self.setModal(True)
+        self.setSizeGripEnabled(True)
+        self.setAttribute(QtCore.Qt.WA_DeleteOnClose)
+        self.setMinimumSize(400, height)
+        self.setWindowTitle('Load Starbound World')
+
+        self.sort_mtime_idx = 0
+        self.sort_alpha_idx = 1
+
+        # Layout info
+        layout = QtWidgets.QVBoxLayout()
+        self.setLayout(layout)
+
+        # Title
+        title_label = QtWidgets.QLabel(main_label, self)
+        title_label.setStyleSheet('font-weight: bold; font-size: 12pt;')
+        layout.addWidget(title_label, 0, QtCore.Qt.AlignCenter)
+
+        # Box to hold sorting buttons
+        w = QtWidgets.QWidget()
+        hbox = QtWidgets.QHBoxLayout()
+        w.setLayout(hbox)
+        self.button_mtime = QtWidgets.QPushButton('Sort: new -> old', self)
+        self.button_mtime.setCheckable(True)
         self.button_mtime.setChecked(True)
         hbox.addWidget(self.button_mtime)
         self.button_alpha = QtWidgets.QPushButton('Sort: A -> Z', self)
@@ -1848,6 +3110,7 @@ class OpenByPlanetName(OpenByDialog):
         self.mainwindow = parent.mainwindow
         self.chosen_filename = None
         self.get_world_progress = None
+        self.cancelled = False
         details_checkbox = QtWidgets.QCheckBox('Show biome/dungeon details')
         details_checkbox.setContentsMargins(0, 0, 0, 0)
         super().__init__(parent,
@@ -1872,29 +3135,35 @@ class OpenByPlanetName(OpenByDialog):
         self.get_world_progress.setModal(True)
         self.get_world_progress.setMinimumSize(300, 100)
         self.get_world_progress.show()
-        # TODO: This is lame - handle cancel events properly instead.
-        self.get_world_progress.setCancelButton(None)
         self.mainwindow.app.processEvents()
 
         # Actually do the loading
         buttons = []
-        for (mtime, cache_entry, filename) in self.player.get_worlds(self.parent_dialog.mainwindow.data,
-                progress_callback=self.update_get_world_progress):
-            button = OpenByPlanetName.PlanetNameButton(self, filename, mtime, cache_entry)
-            buttons.append((mtime, cache_entry.sort_name, button))
+        worlds = self.player.get_worlds(self.parent_dialog.mainwindow.data,
+                progress_callback=self.update_get_world_progress)
+        if worlds is None:
+            self.cancelled = True
+        else:
+            for (mtime, cache_entry, filename) in worlds:
+                button = OpenByPlanetName.PlanetNameButton(self, filename, mtime, cache_entry)
+                buttons.append((mtime, cache_entry.sort_name, button))
 
         # Clean up and exit
         self.get_world_progress.close()
         self.get_world_progress = None
         return buttons
 
-    def update_get_world_progress(self):
+    def update_get_world_progress(self, value, total):
         """
         Updates the progress bar we use while loading user world info.
+        Returns `True` if the user has cancelled the process.
         """
         if self.get_world_progress:
-            self.get_world_progress.setValue(0)
+            self.get_world_progress.setMaximum(total)
+            self.get_world_progress.setValue(value)
             self.mainwindow.app.processEvents()
+            return self.get_world_progress.wasCanceled()
+        return False
 
     def planet_clicked(self, filename):
         """
@@ -1974,7 +3243,10 @@ class OpenByPlayerName(OpenByDialog):
         for (_, _, button) in self.buttons:
             button.setEnabled(False)
         dialog = OpenByPlanetName(self, player)
-        dialog.exec()
+        if dialog.cancelled:
+            dialog.close()
+        else:
+            dialog.exec()
         self.setEnabled(True)
         for (_, _, button) in self.buttons:
             button.setEnabled(True)
@@ -2164,6 +3436,466 @@ class GoToDialog(QtWidgets.QDialog):
         self.maingui.scene.center_on(self.spin_x.value(), self.spin_y.value())
         self.close()
 
+class FindTilesDialog(QtWidgets.QDialog):
+    """
+    Dialog which lists how much of every material, matmod and liquid there
+    is in the current world (using our `TileIndexer`), and can take us to
+    the nearest region containing any of them.  This isn't modal, so it
+    can be left open while stepping through the results.
+    """
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.maingui = parent
+        self.indexer = parent.tile_indexer
+        self.targets = []
+        self.target_idx = 0
+        self.target_type = None
+
+        self.setSizeGripEnabled(True)
+        self.setWindowTitle('Find Tiles')
+        self.setMinimumSize(400, 450)
+        self.setAttribute(QtCore.Qt.WA_DeleteOnClose)
+
+        layout = QtWidgets.QVBoxLayout()
+        self.setLayout(layout)
+
+        # Title
+        label = QtWidgets.QLabel('<b>Find Tiles</b>')
+        layout.addWidget(label, 0, QtCore.Qt.AlignCenter)
+
+        self.status_label = QtWidgets.QLabel('')
+        layout.addWidget(self.status_label)
+
+        # Filter
+        self.filter_edit = QtWidgets.QLineEdit(self)
+        self.filter_edit.setPlaceholderText('Filter')
+        self.filter_edit.textChanged.connect(self.apply_filter)
+        layout.addWidget(self.filter_edit)
+
+        # List of everything in the world
+        self.tree = QtWidgets.QTreeWidget(self)
+        self.tree.setHeaderLabels(['Name', 'Tiles', 'Regions'])
+        self.tree.setRootIsDecorated(True)
+        self.tree.itemDoubleClicked.connect(self.action_nearest)
+        self.tree.currentItemChanged.connect(self.selection_changed)
+        layout.addWidget(self.tree, 1)
+
+        self.result_label = QtWidgets.QLabel('')
+        layout.addWidget(self.result_label)
+
+        # Buttons
+        buttonbox = QtWidgets.QDialogButtonBox(self)
+        self.nearest_button = buttonbox.addButton('Go to &Nearest', QtWidgets.QDialogButtonBox.ActionRole)
+        self.nearest_button.clicked.connect(self.action_nearest)
+        self.next_button = buttonbox.addButton('N&ext', QtWidgets.QDialogButtonBox.ActionRole)
+        self.next_button.clicked.connect(self.action_next)
+        buttonbox.addButton(QtWidgets.QDialogButtonBox.Close)
+        buttonbox.rejected.connect(self.close)
+        layout.addWidget(buttonbox, 0, QtCore.Qt.AlignRight)
+
+        self.indexer.changed.connect(self.populate)
+        self.populate()
+
+    def item_name(self, kind, item_id):
+        """
+        Returns the name to show for `item_id` of `kind`
+        """
+        data = self.maingui.data
+        if kind == 'liquid':
+            lookup = data.liquids
+        elif kind.endswith('_mod'):
+            lookup = data.matmods
+        else:
+            lookup = data.materials
+        if item_id in lookup:
+            return lookup[item_id].name
+        return 'Unknown ({})'.format(item_id)
+
+    def populate(self):
+        """
+        Fills in our list from the indexer's current index
+        """
+        self.tree.clear()
+        self.targets = []
+        self.target_type = None
+        self.result_label.setText('')
+        index = self.indexer.index
+        if index is None:
+            self.status_label.setText(self.indexer.status or 'No world loaded')
+            self.selection_changed()
+            return
+        self.status_label.setText('{} regions indexed'.format(len(index.regions)))
+        for (kind, _, label) in occurrences.KINDS:
+            totals = index.totals(kind)
+            if not totals:
+                continue
+            parent = QtWidgets.QTreeWidgetItem([label])
+            parent.setFlags(QtCore.Qt.ItemIsEnabled)
+            self.tree.addTopLevelItem(parent)
+            for (item_id, (count, regions)) in sorted(totals.items(),
+                    key=lambda total: self.item_name(kind, total[0]).lower()):
+                child = QtWidgets.QTreeWidgetItem([self.item_name(kind, item_id)])
+                child.setData(1, QtCore.Qt.DisplayRole, count)
+                child.setData(2, QtCore.Qt.DisplayRole, regions)
+                child.setData(0, QtCore.Qt.UserRole, (kind, item_id))
+                parent.addChild(child)
+            parent.setExpanded(True)
+        self.tree.resizeColumnToContents(0)
+        self.apply_filter()
+        self.selection_changed()
+
+    def apply_filter(self, text=None):
+        """
+        Hides anything in our list which doesn't match our filter text
+        """
+        text = self.filter_edit.text().strip().lower()
+        for idx in range(self.tree.topLevelItemCount()):
+            parent = self.tree.topLevelItem(idx)
+            for child_idx in range(parent.childCount()):
+                child = parent.child(child_idx)
+                child.setHidden(text not in child.text(0).lower())
+
+    def selection_changed(self, current=None, previous=None):
+        """
+        Enables or disables our buttons to match the current selection
+        """
+        selected = self.selected_type()
+        self.nearest_button.setEnabled(selected is not None)
+        self.next_button.setEnabled(selected is not None and selected == self.target_type
+                and len(self.targets) > 1)
+
+    def selected_type(self):
+        """
+        Returns the `(kind, id)` tuple of the selected item, or `None`
+        """
+        item = self.tree.currentItem()
+        if item is None:
+            return None
+        return item.data(0, QtCore.Qt.UserRole)
+
+    def action_nearest(self, *args):
+        """
+        Jumps to the nearest region containing the selected item
+        """
+        selected = self.selected_type()
+        index = self.indexer.index
+        scene = self.maingui.scene
+        if selected is None or index is None or not scene.world:
+            return
+        (kind, item_id) = selected
+        (x, y) = scene.centered_tile()
+        self.targets = index.by_distance(kind, item_id, x, y, wrap_width=scene.world.info.size[0])
+        self.target_type = selected
+        self.target_idx = 0
+        self.jump()
+
+    def action_next(self):
+        """
+        Jumps to the next-nearest region containing the selected item (in
+        order of distance from where we started)
+        """
+        if not self.targets or self.selected_type() != self.target_type:
+            return
+        self.target_idx = (self.target_idx + 1) % len(self.targets)
+        self.jump()
+
+    def jump(self):
+        """
+        Centers the map on our current target region.  We only know which
+        regions contain what, so we read the region in to find the closest
+        matching tile.
+        """
+        self.selection_changed()
+        if not self.targets:
+            return
+        scene = self.maingui.scene
+        (kind, item_id) = self.target_type
+        (rx, ry) = self.targets[self.target_idx]
+        (x, y) = ((rx+0.5)*32, (ry+0.5)*32)
+        try:
+            positions = occurrences.matching_tiles(read_region_tiles(scene.world, rx, ry), kind, item_id)
+        except KeyError:
+            positions = []
+        if len(positions):
+            (ctr_x, ctr_y) = scene.centered_tile()
+            positions = positions + (rx*32, ry*32)
+            distances = ((positions - (ctr_x, ctr_y))**2).sum(axis=1)
+            (x, y) = positions[distances.argmin()].tolist()
+        scene.center_on(x, y)
+        self.result_label.setText('Region {} of {}: ({}, {})'.format(
+            self.target_idx+1, len(self.targets), rx, ry))
+
+class FindItemsDialog(QtWidgets.QDialog):
+    """
+    Dialog to search the contents of every container in all of a player's
+    worlds (using our `ContainerIndexer`).  Choosing a result will open
+    the world it's in, centered on the container.  This isn't modal, so
+    it can be left open while visiting the results.
+    """
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.maingui = parent
+        self.indexer = parent.container_indexer
+        self.players = []
+
+        self.setSizeGripEnabled(True)
+        self.setWindowTitle('Find Items in Containers')
+        self.setMinimumSize(550, 450)
+        self.setAttribute(QtCore.Qt.WA_DeleteOnClose)
+
+        layout = QtWidgets.QVBoxLayout()
+        self.setLayout(layout)
+
+        # Title
+        label = QtWidgets.QLabel('<b>Find Items in Containers</b>')
+        layout.addWidget(label, 0, QtCore.Qt.AlignCenter)
+
+        # Player selection
+        w = QtWidgets.QWidget()
+        hbox = QtWidgets.QHBoxLayout()
+        hbox.setContentsMargins(0, 0, 0, 0)
+        w.setLayout(hbox)
+        hbox.addWidget(QtWidgets.QLabel('Player:'))
+        self.player_combo = QtWidgets.QComboBox(self)
+        hbox.addWidget(self.player_combo, 1)
+        layout.addWidget(w)
+
+        self.status_label = QtWidgets.QLabel('')
+        layout.addWidget(self.status_label)
+
+        # Search
+        self.search_edit = QtWidgets.QLineEdit(self)
+        self.search_edit.setPlaceholderText('Search')
+        self.search_edit.textChanged.connect(self.populate)
+        layout.addWidget(self.search_edit)
+
+        # Results
+        self.tree = QtWidgets.QTreeWidget(self)
+        self.tree.setHeaderLabels(['Item', 'Count', 'World', 'Coordinates'])
+        self.tree.setRootIsDecorated(True)
+        self.tree.itemDoubleClicked.connect(self.action_go)
+        self.tree.currentItemChanged.connect(self.selection_changed)
+        layout.addWidget(self.tree, 1)
+
+        # Buttons
+        buttonbox = QtWidgets.QDialogButtonBox(self)
+        self.go_button = buttonbox.addButton('&Go To', QtWidgets.QDialogButtonBox.ActionRole)
+        self.go_button.clicked.connect(self.action_go)
+        buttonbox.addButton(QtWidgets.QDialogButtonBox.Close)
+        buttonbox.rejected.connect(self.close)
+        layout.addWidget(buttonbox, 0, QtCore.Qt.AlignRight)
+
+        # Fill in our players, defaulting to whoever's currently being
+        # indexed, or else the most recently-played
+        current = 0
+        for idx, (_, player) in enumerate(self.maingui.data.get_all_players()):
+            self.players.append(player)
+            self.player_combo.addItem(player.name)
+            if self.indexer.player and self.indexer.player.player_path == player.player_path:
+                current = idx
+        self.player_combo.setCurrentIndex(current)
+        self.player_combo.currentIndexChanged.connect(self.player_changed)
+
+        self.indexer.changed.connect(self.populate)
+        if self.players and self.indexer.player is None:
+            self.player_changed(current)
+        else:
+            self.populate()
+
+    def player_changed(self, idx):
+        """
+        A new player was chosen; index their worlds
+        """
+        if 0 <= idx < len(self.players):
+            self.indexer.load_player(self.players[idx])
+
+    def item_name(self, name):
+        """
+        Returns the name to show for item `name`
+        """
+        if name in self.maingui.data.items:
+            return '{} ({})'.format(name, self.maingui.data.items[name])
+        return name
+
+    def populate(self):
+        """
+        Fills in our results list from the indexer's current index
+        """
+        self.tree.clear()
+        if self.indexer.player is None:
+            self.status_label.setText('No player chosen')
+            self.selection_changed()
+            return
+        world_names = self.indexer.world_names
+        results = self.indexer.index.search(self.search_edit.text().strip(),
+                filenames=world_names, descriptions=self.maingui.data.items)
+        if self.indexer.status:
+            self.status_label.setText(self.indexer.status)
+        else:
+            self.status_label.setText('{} item types found in {} worlds'.format(
+                len(results), len(world_names)))
+        for name in sorted(results.keys(), key=lambda n: self.item_name(n).lower()):
+            found = results[name]
+            parent = QtWidgets.QTreeWidgetItem([self.item_name(name)])
+            parent.setData(1, QtCore.Qt.DisplayRole, sum(f.count for f in found))
+            self.tree.addTopLevelItem(parent)
+            for found_item in sorted(found, key=lambda f: (world_names[f.filename].lower(), f.x, f.y)):
+                object_name = found_item.object_name
+                if object_name in self.maingui.data.items:
+                    object_name = self.maingui.data.items[object_name]
+                child = QtWidgets.QTreeWidgetItem([object_name])
+                child.setData(1, QtCore.Qt.DisplayRole, found_item.count)
+                child.setText(2, world_names[found_item.filename])
+                child.setText(3, '({}, {})'.format(found_item.x, found_item.y))
+                child.setData(0, QtCore.Qt.UserRole, found_item)
+                parent.addChild(child)
+        self.tree.resizeColumnToContents(0)
+        self.tree.resizeColumnToContents(2)
+        self.selection_changed()
+
+    def selection_changed(self, current=None, previous=None):
+        """
+        Enables or disables our Go To button to match the current selection
+        """
+        self.go_button.setEnabled(self.selected_item() is not None)
+
+    def selected_item(self):
+        """
+        Returns the `containers.ContainerItem` which is currently selected,
+        or `None`
+        """
+        item = self.tree.currentItem()
+        if item is None:
+            return None
+        return item.data(0, QtCore.Qt.UserRole)
+
+    def action_go(self, *args):
+        """
+        Opens the world containing the selected container (if it's not
+        already open), and centers the map on it
+        """
+        found_item = self.selected_item()
+        if found_item is None:
+            return
+        if self.maingui.loaded_filename != found_item.filename or not self.maingui.world:
+            self.maingui.load_map(found_item.filename, self.indexer.player)
+        self.maingui.scene.center_on(found_item.x, found_item.y)
+
+class FindHolesDialog(QtWidgets.QDialog):
+    """
+    Dialog to look for holes in the background tiles, either in the area
+    we're currently looking at or the whole world (using our
+    `HoleDetector`).  Holes are highlighted on the map, and clicking on
+    one in our list will take us there.  This isn't modal, so it can be
+    left open while looking around; closing it clears the highlights.
+    """
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.maingui = parent
+        self.detector = parent.hole_detector
+
+        self.setSizeGripEnabled(True)
+        self.setWindowTitle('Find Background Holes')
+        self.setMinimumSize(350, 450)
+        self.setAttribute(QtCore.Qt.WA_DeleteOnClose)
+
+        layout = QtWidgets.QVBoxLayout()
+        self.setLayout(layout)
+
+        # Title
+        label = QtWidgets.QLabel('<b>Find Background Holes</b>')
+        layout.addWidget(label, 0, QtCore.Qt.AlignCenter)
+
+        # Scan options
+        w = QtWidgets.QWidget()
+        grid = QtWidgets.QGridLayout()
+        grid.setContentsMargins(0, 0, 0, 0)
+        w.setLayout(grid)
+        self.visible_radio = QtWidgets.QRadioButton('Visible area', self)
+        self.visible_radio.setChecked(True)
+        grid.addWidget(self.visible_radio, 0, 0)
+        self.world_radio = QtWidgets.QRadioButton('Whole world', self)
+        grid.addWidget(self.world_radio, 0, 1)
+        grid.addWidget(QtWidgets.QLabel('Largest hole:'), 1, 0)
+        self.size_spin = QtWidgets.QSpinBox(self)
+        self.size_spin.setRange(1, 1000000)
+        self.size_spin.setValue(holes.DEFAULT_MAX_SIZE)
+        self.size_spin.setSuffix(' tiles')
+        grid.addWidget(self.size_spin, 1, 1)
+        self.scan_button = QtWidgets.QPushButton('&Scan', self)
+        self.scan_button.clicked.connect(self.action_scan)
+        grid.addWidget(self.scan_button, 0, 2, 2, 1)
+        layout.addWidget(w)
+
+        self.overlay_checkbox = QtWidgets.QCheckBox('Highlight holes on the map', self)
+        self.overlay_checkbox.setChecked(self.detector.show_overlay)
+        self.overlay_checkbox.toggled.connect(self.detector.set_show_overlay)
+        layout.addWidget(self.overlay_checkbox)
+
+        self.status_label = QtWidgets.QLabel('')
+        layout.addWidget(self.status_label)
+
+        # List of holes
+        self.tree = QtWidgets.QTreeWidget(self)
+        self.tree.setHeaderLabels(['Coordinates', 'Size', 'Width', 'Height'])
+        self.tree.setRootIsDecorated(False)
+        self.tree.currentItemChanged.connect(self.hole_selected)
+        layout.addWidget(self.tree, 1)
+
+        # Buttons
+        buttonbox = QtWidgets.QDialogButtonBox(self)
+        buttonbox.addButton(QtWidgets.QDialogButtonBox.Close)
+        buttonbox.rejected.connect(self.close)
+        layout.addWidget(buttonbox, 0, QtCore.Qt.AlignRight)
+
+        self.finished.connect(self.detector.clear)
+        self.detector.changed.connect(self.populate)
+        self.populate()
+
+    def action_scan(self):
+        """
+        Starts a scan with our current options
+        """
+        if self.visible_radio.isChecked():
+            area = self.maingui.scene.visible_tiles()
+        else:
+            area = None
+        self.detector.scan(area, self.size_spin.value())
+
+    def populate(self):
+        """
+        Fills in our list from the detector's current results
+        """
+        self.tree.clear()
+        result = self.detector.result
+        if result is None:
+            self.status_label.setText(self.detector.status)
+            return
+        if len(result.holes) == 1:
+            self.status_label.setText('1 hole found')
+        else:
+            self.status_label.setText('{} holes found'.format(len(result.holes)))
+        for hole in result.holes:
+            item = QtWidgets.QTreeWidgetItem(['({}, {})'.format(hole.x, hole.y)])
+            item.setData(1, QtCore.Qt.DisplayRole, hole.size)
+            item.setData(2, QtCore.Qt.DisplayRole, hole.max_x - hole.min_x + 1)
+            item.setData(3, QtCore.Qt.DisplayRole, hole.max_y - hole.min_y + 1)
+            item.setData(0, QtCore.Qt.UserRole, hole)
+            self.tree.addTopLevelItem(item)
+        self.tree.resizeColumnToContents(0)
+
+    def hole_selected(self, current, previous=None):
+        """
+        Centers the map on the selected hole
+        """
+        if current is None or not self.maingui.world:
+            return
+        hole = current.data(0, QtCore.Qt.UserRole)
+        self.maingui.scene.center_on(hole.x, hole.y)
+
 class GUI(QtWidgets.QMainWindow):
     """
     Main application window
@@ -2183,15 +3915,20 @@ class GUI(QtWidgets.QMainWindow):
         self.loaded_filename = None
         self.navigation_actions = []
         self.zoom_levels = []
-        # 0.5 scaling just doesn't perform well enough right now
-        #for scale in [0.5, 1, 2, 3, 4]:
-        for scale in [1, 2, 3, 4]:
+        # Levels below 1x are drawn using downsampled region groups
+        for scale in [0.125, 0.25, 0.5, 1, 2, 3, 4]:
             t = QtGui.QTransform()
             if scale != 1:
                 t.scale(scale, scale)
             (inverted, _) = t.inverted()
             self.zoom_levels.append((scale, t, inverted))
-        self.cur_zoom = 0
+            if scale == 1:
+                self.cur_zoom = len(self.zoom_levels) - 1
+        self.tile_indexer = TileIndexer(self)
+        self.find_tiles_dialog = None
+        self.container_indexer = ContainerIndexer(self)
+        self.find_items_dialog = None
+        self.find_holes_dialog = None
         self.initUI()
 
         # Show ourselves
@@ -2242,6 +3979,8 @@ class GUI(QtWidgets.QMainWindow):
         self.openname_menu = filemenu.addAction('&Open by Name', self.action_open_name, 'Ctrl+O')
         self.openfile_menu = filemenu.addAction('Open &File', self.action_open_file, 'Ctrl+Shift+O')
         filemenu.addSeparator()
+        self.find_items_menu = filemenu.addAction('Find &Items in Containers...', self.action_find_items, 'Ctrl+Shift+F')
+        filemenu.addSeparator()
         filemenu.addAction('&Quit', self.action_quit, 'Ctrl+Q')
 
         # Edit Menu
@@ -2254,10 +3993,13 @@ class GUI(QtWidgets.QMainWindow):
         viewmenu.addSeparator()
         viewmenu.addAction('Zoom &In', self.action_zoom_in, '+')
         viewmenu.addAction('Zoom &Out', self.action_zoom_out, '-')
+        viewmenu.addSeparator()
 
         # Nagivate Menu
         self.navmenu = menubar.addMenu('&Navigate')
         self.goto_menu = self.navmenu.addAction('&Go To...', self.action_goto, 'Ctrl+G')
+        self.find_tiles_menu = self.navmenu.addAction('&Find Tiles...', self.action_find_tiles, 'Ctrl+F')
+        self.find_holes_menu = self.navmenu.addAction('Find Background &Holes...', self.action_find_holes, 'Ctrl+H')
         self.navmenu.addSeparator()
         self.to_spawn_menu = self.navmenu.addAction('Go to Spawn Point', self.action_to_spawn)
 
@@ -2268,6 +4010,8 @@ class GUI(QtWidgets.QMainWindow):
         # scene object exists for callbacks)
         self.maparea = MapArea(self)
         self.scene = self.maparea.scene
+        self.hole_detector = HoleDetector(self)
+        self.light_mapper = LightMapper(self)
 
         # Lefthand side vbox
         lh = QtWidgets.QWidget()
@@ -2343,6 +4087,25 @@ class GUI(QtWidgets.QMainWindow):
         # Central Widget
         self.setCentralWidget(self.splitter)
 
+        # Minimap dock
+        self.minimap = Minimap(self)
+        self.minimap_dock = QtWidgets.QDockWidget('Minimap', self)
+        self.minimap_dock.setObjectName('minimap')
+        self.minimap_dock.setWidget(self.minimap)
+        self.addDockWidget(QtCore.Qt.RightDockWidgetArea, self.minimap_dock)
+        viewmenu.addAction(self.minimap_dock.toggleViewAction())
+
+        # Performance HUD, hidden by default
+        self.perf_hud = PerfHUD(self)
+        self.perf_dock = QtWidgets.QDockWidget('Performance', self)
+        self.perf_dock.setObjectName('performance')
+        self.perf_dock.setWidget(self.perf_hud)
+        self.addDockWidget(QtCore.Qt.RightDockWidgetArea, self.perf_dock)
+        self.perf_dock.hide()
+        viewmenu.addAction(self.perf_dock.toggleViewAction())
+        self.scene.hbar.valueChanged.connect(self.minimap.update)
+        self.scene.vbar.valueChanged.connect(self.minimap.update)
+
         # Main window
         self.setMinimumSize(Config.app_w, Config.app_h)
         self.resize(self.config.app_w, self.config.app_h)
@@ -2391,6 +4154,12 @@ class GUI(QtWidgets.QMainWindow):
         self.maparea.setTransform(self.zoom_levels[self.cur_zoom][1])
         self.scene.draw_visible_area()
 
+    def get_zoom_scale(self):
+        """
+        Returns our current zoom scale
+        """
+        return self.zoom_levels[self.cur_zoom][0]
+
     def get_zoom_transform(self):
         """
         Returns our current zoom transformation
@@ -2430,6 +4199,24 @@ class GUI(QtWidgets.QMainWindow):
         self.save_config()
         self.close()
 
+    def closeEvent(self, event):
+        """
+        Cancels all our background work when we're closed.  Our worker
+        threads aren't daemon threads, so otherwise we'd have to wait for
+        any scans in progress to finish before the app could exit.
+        """
+        for scanner in [
+                self.minimap.scanner,
+                self.tile_indexer,
+                self.container_indexer,
+                self.hole_detector,
+                self.light_mapper,
+                ]:
+            scanner.shutdown()
+        self.scene.generation += 1
+        self.scene.executor.shutdown(wait=False, cancel_futures=True)
+        super().closeEvent(event)
+
     def action_open_file(self):
         """
         Opens by filename
@@ -2474,6 +4261,8 @@ class GUI(QtWidgets.QMainWindow):
             if cur_datadir != new_datadir:
                 self.load_data()
                 self.scene.refresh(self.data)
+                self.hole_detector.update_overlay()
+                self.light_mapper.update_overlay()
         else:
             self.close_world()
 
@@ -2493,6 +4282,60 @@ class GUI(QtWidgets.QMainWindow):
         # Re-focus the main window
         self.activateWindow()
 
+    def action_find_tiles(self):
+        """
+        Opens our Find Tiles dialog (or brings it to the front, if it's
+        already open)
+        """
+        if self.find_tiles_dialog is None:
+            self.find_tiles_dialog = FindTilesDialog(self)
+            self.find_tiles_dialog.finished.connect(self.find_tiles_closed)
+        self.find_tiles_dialog.show()
+        self.find_tiles_dialog.raise_()
+        self.find_tiles_dialog.activateWindow()
+
+    def find_tiles_closed(self):
+        """
+        Called when our Find Tiles dialog is closed
+        """
+        self.find_tiles_dialog = None
+
+    def action_find_holes(self):
+        """
+        Opens our Find Holes dialog (or brings it to the front, if it's
+        already open)
+        """
+        if self.find_holes_dialog is None:
+            self.find_holes_dialog = FindHolesDialog(self)
+            self.find_holes_dialog.finished.connect(self.find_holes_closed)
+        self.find_holes_dialog.show()
+        self.find_holes_dialog.raise_()
+        self.find_holes_dialog.activateWindow()
+
+    def find_holes_closed(self):
+        """
+        Called when our Find Holes dialog is closed
+        """
+        self.find_holes_dialog = None
+
+    def action_find_items(self):
+        """
+        Opens our Find Items dialog (or brings it to the front, if it's
+        already open)
+        """
+        if self.find_items_dialog is None:
+            self.find_items_dialog = FindItemsDialog(self)
+            self.find_items_dialog.finished.connect(self.find_items_closed)
+        self.find_items_dialog.show()
+        self.find_items_dialog.raise_()
+        self.find_items_dialog.activateWindow()
+
+    def find_items_closed(self):
+        """
+        Called when our Find Items dialog is closed
+        """
+        self.find_items_dialog = None
+
     def action_to_spawn(self):
         """
         Center the map on the spawn point
@@ -2513,22 +4356,30 @@ class GUI(QtWidgets.QMainWindow):
         if self.config.starbound_data_dir:
             self.openfile_menu.setEnabled(True)
             self.openname_menu.setEnabled(True)
+            self.find_items_menu.setEnabled(True)
             if self.world:
                 self.worldinfo_menu.setEnabled(True)
                 self.goto_menu.setEnabled(True)
+                self.find_tiles_menu.setEnabled(True)
+                self.find_holes_menu.setEnabled(True)
                 self.to_spawn_menu.setEnabled(True)
                 self.to_spawn_menu.setText('Go to Spawn Point ({:d}, {:d})'.format(
                     *map(int, self.world.metadata['playerStart'])))
             else:
                 self.worldinfo_menu.setEnabled(False)
                 self.goto_menu.setEnabled(False)
+                self.find_tiles_menu.setEnabled(False)
+                self.find_holes_menu.setEnabled(False)
                 self.to_spawn_menu.setEnabled(False)
                 self.to_spawn_menu.setText('Go to Spawn Point')
         else:
             self.openfile_menu.setEnabled(False)
             self.openname_menu.setEnabled(False)
+            self.find_items_menu.setEnabled(False)
             self.worldinfo_menu.setEnabled(False)
             self.goto_menu.setEnabled(False)
+            self.find_tiles_menu.setEnabled(False)
+            self.find_holes_menu.setEnabled(False)
             self.to_spawn_menu.setEnabled(False)
             self.to_spawn_menu.setText('Go to Spawn Point')
 
@@ -2543,6 +4394,7 @@ class GUI(QtWidgets.QMainWindow):
                 self.data.close()
 
             # Actually load the data
+            self.container_indexer.clear()
             self.data = StarboundData(self.config)
             self.scene.data = self.data
 
@@ -2556,6 +4408,10 @@ class GUI(QtWidgets.QMainWindow):
         if self.world:
             self.world = None
             self.scene.clear()
+            self.minimap.clear()
+            self.tile_indexer.clear()
+            self.hole_detector.clear()
+            self.light_mapper.clear()
         if self.worlddf:
             self.worlddf.close()
             self.worlddf = None
@@ -2624,6 +4480,9 @@ class GUI(QtWidgets.QMainWindow):
                 self.data_table.set_world_type('Unknown')
                 self.data_table.set_world_extra('')
             self.scene.load_map(self.world)
+            self.minimap.load_world(filename, self.data)
+            self.tile_indexer.load_world(filename)
+            self.light_mapper.load_world(filename)
 
             # Jump to a Mech Beacon, if we have it
             if self.world.get_entity_uuid_coords('mechbeacon') != None:
@@ -2674,8 +4533,15 @@ def main():
             nargs='?',
             metavar='filename',
             help='Filename to load')
+    parser.add_argument('--trace',
+            type=str,
+            metavar='TRACE_FILE',
+            help='Record a Chrome/Perfetto trace of map loading and drawing to TRACE_FILE')
     args = parser.parse_args()
 
+    if args.trace:
+        tracer.enable(args.trace)
+
     gui = Application(args.filename)
     sys.exit(gui.exec_())
 
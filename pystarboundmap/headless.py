@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Python Starbound Mapper (pystarboundmap)
+# Copyright (C) 2018 CJ Kucera 
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the development team nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CJ KUCERA BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import sys
+import zlib
+import struct
+import argparse
+import concurrent.futures
+import numpy as np
+from .config import Config
+from .data import StarboundData
+from .trace import tracer, span
+from .render import Layer, RegionCompositor, read_region_tiles, flatten, downsample, REGION_TILES, REGION_PIXELS
+
+# Zoom levels we support; the same ones the GUI has
+ZOOM_LEVELS = (0.125, 0.25, 0.5, 1, 2, 3, 4)
+
+class PNGWriter(object):
+    """
+    Writes out an RGB PNG a band of rows at a time, so that we never need
+    to have the whole image in memory (which PIL would need)
+    """
+
+    def __init__(self, filename, width, height):
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self.df = open(filename, 'wb')
+        self.compressor = zlib.compressobj(6)
+        self.df.write(b'\x89PNG\r\n\x1a\n')
+        # 8 bits per channel, color type 2 (RGB), default compression,
+        # filtering and interlacing
+        self.write_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+
+    def write_chunk(self, chunk_type, data):
+        """
+        Writes a single PNG chunk
+        """
+        self.df.write(struct.pack('>I', len(data)))
+        self.df.write(chunk_type)
+        self.df.write(data)
+        self.df.write(struct.pack('>I', zlib.crc32(chunk_type + data) & 0xFFFFFFFF))
+
+    def write_rows(self, image):
+        """
+        Writes out the rows in the RGB(A) `image`, which must be our full
+        width
+        """
+        (height, width) = image.shape[:2]
+        if width != self.width:
+            raise ValueError('Expected rows {} pixels wide, got {}'.format(self.width, width))
+        rows = np.zeros((height, width*3+1), dtype=np.uint8)
+        rows[:, 1:] = image[..., :3].reshape(height, width*3)
+        data = self.compressor.compress(rows.tobytes())
+        if data:
+            self.write_chunk(b'IDAT', data)
+        self.rows_written += height
+
+    def close(self):
+        """
+        Finishes off the image
+        """
+        if self.rows_written != self.height:
+            raise ValueError('Expected {} rows, only wrote {}'.format(self.height, self.rows_written))
+        self.write_chunk(b'IDAT', self.compressor.flush())
+        self.write_chunk(b'IEND', b'')
+        self.df.close()
+
+def scale_image(image, zoom):
+    """
+    Scales the given region-sized `image` by `zoom` (one of our
+    `ZOOM_LEVELS`)
+    """
+    if zoom < 1:
+        return downsample(image, int(round(1/zoom)))
+    elif zoom > 1:
+        return image.repeat(zoom, axis=0).repeat(zoom, axis=1)
+    return image
+
+def render_region(compositor, world, rx, ry, visible, zoom):
+    """
+    Returns a flattened image of region (`rx`, `ry`) at `zoom`, or `None`
+    if the region doesn't exist
+    """
+    try:
+        tiles = read_region_tiles(world, rx, ry)
+    except KeyError:
+        return None
+    return scale_image(flatten(compositor.get_layers(world, rx, ry, tiles), visible), zoom)
+
+def render_to_png(data, world, output, min_x, min_y, max_x, max_y,
+        zoom=1, visible=tuple(Layer.select()), workers=None, progress_callback=None):
+    """
+    Renders the area from tile (`min_x`, `min_y`) up to (but not including)
+    tile (`max_x`, `max_y`) of `world` to a PNG at `output`.  The map is
+    rendered one row of regions at a time, and each row is written out
+    before the next one is started, so memory use doesn't depend on the
+    size of the area.  Missing regions are drawn in black.
+
+    If passed, `progress_callback` will be called with the number of region
+    rows done and the total after each row.
+    """
+    compositor = RegionCompositor(data)
+    per_tile = int(8*zoom)
+    region_size = int(REGION_PIXELS*zoom)
+    min_rx = min_x//REGION_TILES
+    max_rx = (max_x-1)//REGION_TILES
+    min_ry = min_y//REGION_TILES
+    max_ry = (max_y-1)//REGION_TILES
+    region_xs = range(min_rx, max_rx+1)
+
+    # Pixel columns of each band which fall inside our area
+    left = (min_x - min_rx*REGION_TILES)*per_tile
+    right = (max_x - min_rx*REGION_TILES)*per_tile
+
+    writer = PNGWriter(output, right-left, (max_y-min_y)*per_tile)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for idx, ry in enumerate(range(max_ry, min_ry-1, -1)):
+            band = np.zeros((region_size, len(region_xs)*region_size, 4), dtype=np.uint8)
+            band[..., 3] = 255
+            images = executor.map(
+                    lambda rx: render_region(compositor, world, rx, ry, visible, zoom),
+                    region_xs)
+            for col, image in enumerate(images):
+                if image is not None:
+                    band[:, col*region_size:(col+1)*region_size] = image
+
+            # Band rows go from the top of the region down
+            band_top = (ry+1)*REGION_TILES
+            top = max(0, band_top - max_y)*per_tile
+            bottom = min(REGION_TILES, band_top - min_y)*per_tile
+            with span('png.write_rows', 'io', ry=ry):
+                writer.write_rows(band[top:bottom, left:right])
+            if progress_callback:
+                progress_callback(idx+1, max_ry-min_ry+1)
+    writer.close()
+
+def add_layer_arguments(parser):
+    """
+    Adds our layer toggle arguments (and a couple of other things our
+    headless commands have in common) to the argparse `parser`
+    """
+    for name, label in [
+            ('foreground', 'foreground (or its mods)'),
+            ('foreground-mod', 'foreground mods'),
+            ('background', 'background (or its mods)'),
+            ('background-mod', 'background mods'),
+            ('liquids', 'liquids'),
+            ]:
+        parser.add_argument('--no-{}'.format(name),
+                action='store_true',
+                help="Don't draw {}".format(label))
+    parser.add_argument('-m', '--back-mid',
+            action='store_true',
+            help='Draw the background brighter')
+    parser.add_argument('-d', '--data-dir',
+            type=str,
+            help='Starbound install directory (default is the one from the GUI config)')
+
+def layers_from_args(args):
+    """
+    Returns the tuple of visible layers requested by the arguments added
+    in `add_layer_arguments`.  As in the GUI, mods are only drawn when
+    the layer they sit on is.
+    """
+    return Layer.select(
+            foreground=not args.no_foreground,
+            foreground_mod=not (args.no_foreground or args.no_foreground_mod),
+            background=not args.no_background,
+            background_mod=not (args.no_background or args.no_background_mod),
+            liquids=not args.no_liquids,
+            back_mid=args.back_mid,
+            )
+
+def load_config(data_dir=None):
+    """
+    Returns our `Config`, with the Starbound install directory overridden
+    by `data_dir`, if passed.  Exits if we don't have an install directory.
+    """
+    config = Config()
+    if data_dir:
+        config.starbound_data_dir = data_dir
+    if not config.starbound_data_dir:
+        print('No Starbound install directory found; specify one with --data-dir', file=sys.stderr)
+        sys.exit(1)
+    return config
+
+def main():
+    """
+    CLI Launcher
+    """
+
+    parser = argparse.ArgumentParser(
+            description='Render a Starbound world (or part of one) to a PNG, without the GUI',
+            epilog="""Coordinates are in-game tile coordinates, with y going up.  Only tile
+                layers are rendered; objects and plants are not.""",
+            )
+    parser.add_argument('filename',
+            type=str,
+            help='World file to render')
+    parser.add_argument('output',
+            type=str,
+            help='PNG file to write')
+    area = parser.add_mutually_exclusive_group()
+    area.add_argument('-r', '--rect',
+            type=int,
+            nargs=4,
+            metavar=('X1', 'Y1', 'X2', 'Y2'),
+            help='Tile rectangle to render (default is the whole world)')
+    area.add_argument('-R', '--regions',
+            type=int,
+            nargs=4,
+            metavar=('RX1', 'RY1', 'RX2', 'RY2'),
+            help='Inclusive range of regions to render')
+    parser.add_argument('-z', '--zoom',
+            type=float,
+            default=1,
+            choices=ZOOM_LEVELS,
+            help='Zoom level, where 1 is 8 pixels per tile (default: %(default)s)')
+    add_layer_arguments(parser)
+    parser.add_argument('-w', '--workers',
+            type=int,
+            help='Number of threads to render with')
+    parser.add_argument('--no-cache',
+            action='store_true',
+            help="Don't read or write the on-disk region cache")
+    parser.add_argument('-v', '--verbose',
+            action='store_true',
+            help='Report progress')
+    parser.add_argument('--trace',
+            type=str,
+            metavar='TRACE_FILE',
+            help='Record a Chrome/Perfetto trace of the render to TRACE_FILE')
+    args = parser.parse_args()
+
+    if args.trace:
+        tracer.enable(args.trace)
+
+    data = StarboundData(load_config(args.data_dir))
+    if args.no_cache and data.region_cache:
+        data.region_cache.close()
+        data.region_cache = None
+
+    (world, worldmm) = StarboundData.open_world(args.filename)
+    try:
+        (width, height) = world.info.size
+        if args.rect:
+            (min_x, min_y, max_x, max_y) = args.rect
+        elif args.regions:
+            (min_x, min_y, max_x, max_y) = [coord*REGION_TILES for coord in args.regions]
+            max_x += REGION_TILES
+            max_y += REGION_TILES
+        else:
+            (min_x, min_y, max_x, max_y) = (0, 0, width, height)
+        (min_x, max_x) = (max(0, min(min_x, max_x)), min(width, max(min_x, max_x)))
+        (min_y, max_y) = (max(0, min(min_y, max_y)), min(height, max(min_y, max_y)))
+        if min_x >= max_x or min_y >= max_y:
+            print('Nothing to render inside the world bounds', file=sys.stderr)
+            sys.exit(1)
+
+        visible = layers_from_args(args)
+        zoom = args.zoom if args.zoom < 1 else int(args.zoom)
+
+        def report(done, total):
+            if args.verbose:
+                print('Rendered region row {}/{}'.format(done, total), file=sys.stderr)
+
+        render_to_png(data, world, args.output, min_x, min_y, max_x, max_y,
+                zoom=zoom, visible=visible, workers=args.workers,
+                progress_callback=report)
+    finally:
+        worldmm.close()
+        data.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Python Starbound Mapper (pystarboundmap)
+# Copyright (C) 2018 CJ Kucera 
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the development team nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CJ KUCERA BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import numpy as np
+from collections import namedtuple
+from .render import REGION_TILES
+from .scan import RegionScan
+
+# Holes bigger than this many tiles probably aren't holes at all (just
+# a big enclosed space which was never meant to have a background), so
+# we don't report them by default.
+DEFAULT_MAX_SIZE = 256
+
+# Color used to mark holes on the map
+OVERLAY_COLOR = (255, 0, 255, 192)
+
+# A single hole.  (`x`, `y`) is one of the tiles in the hole, and the
+# `min`/`max` values give its bounding box (all in in-game coordinates).
+Hole = namedtuple('Hole', [
+    'x',
+    'y',
+    'size',
+    'min_x',
+    'min_y',
+    'max_x',
+    'max_y',
+    ])
+
+def label_components(mask, wrap=False):
+    """
+    Finds the 4-connected components of the boolean 2D array `mask`.  If
+    `wrap` is `True`, the first and last columns are considered to be next
+    to each other (as with a whole Starbound world).  Returns a tuple of an
+    int32 array the same shape as `mask`, with each component numbered
+    from 1 (and 0 everywhere outside `mask`), and the number of components.
+
+    This is a union-find done on the whole array at once: every tile
+    starts out as its own tree, then on each pass every edge between two
+    different trees hooks the larger root onto the smaller one, and pointer
+    jumping flattens the trees back out.  That only takes a handful of
+    passes, even for very large or twisty components.
+    """
+    labels = np.zeros(mask.shape, dtype=np.int32)
+    tiles = np.flatnonzero(mask)
+    if not len(tiles):
+        return (labels, 0)
+
+    # Number each tile in the mask, and find the edges between neighbors
+    index = np.full(mask.shape, -1, dtype=np.int32)
+    index.ravel()[tiles] = np.arange(len(tiles), dtype=np.int32)
+    horizontal = mask[:, :-1] & mask[:, 1:]
+    vertical = mask[:-1] & mask[1:]
+    starts = [index[:, :-1][horizontal], index[:-1][vertical]]
+    ends = [index[:, 1:][horizontal], index[1:][vertical]]
+    if wrap and mask.shape[1] > 2:
+        seam = mask[:, -1] & mask[:, 0]
+        starts.append(index[:, -1][seam])
+        ends.append(index[:, 0][seam])
+    starts = np.concatenate(starts)
+    ends = np.concatenate(ends)
+
+    # Join everything up.  Roots always point at themselves, and every
+    # other tile points at a lower-numbered one, so this can't loop.
+    parent = np.arange(len(tiles), dtype=np.int32)
+    while True:
+        start_roots = parent[starts]
+        end_roots = parent[ends]
+        joining = start_roots != end_roots
+        if not joining.any():
+            break
+        # Edges inside a single tree will stay that way, so we can drop them
+        starts = starts[joining]
+        ends = ends[joining]
+        start_roots = start_roots[joining]
+        end_roots = end_roots[joining]
+        np.minimum.at(parent,
+                np.maximum(start_roots, end_roots),
+                np.minimum(start_roots, end_roots))
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+
+    (_, component) = np.unique(parent, return_inverse=True)
+    labels.ravel()[tiles] = component + 1
+    return (labels, int(component.max()) + 1)
+
+def find_holes(foreground, background, max_size=DEFAULT_MAX_SIZE, wrap=False):
+    """
+    Finds holes in the background, given 2D arrays of `foreground` and
+    `background` material IDs.  A hole is an area of open air (neither
+    foreground nor background material) which is completely enclosed,
+    so doesn't touch the edge of the arrays, and is no bigger than
+    `max_size` tiles.  If `wrap` is `True`, the arrays are taken to span
+    the whole width of the world, so only the top and bottom count as
+    edges.
+
+    Returns a tuple of a boolean array marking all the hole tiles, the
+    array of component labels from `label_components`, and an array of
+    the labels which are holes.
+    """
+    (labels, count) = label_components((foreground < 0) & (background < 0), wrap=wrap)
+    sizes = np.bincount(labels.ravel(), minlength=count+1)
+    enclosed = (sizes > 0) & (sizes <= max_size)
+    enclosed[0] = False
+    edges = [labels[0], labels[-1]]
+    if not wrap:
+        edges.extend([labels[:, 0], labels[:, -1]])
+    enclosed[np.concatenate(edges)] = False
+    return (enclosed[labels], labels, np.flatnonzero(enclosed))
+
+def describe_holes(labels, hole_labels, origin_x, origin_y):
+    """
+    Returns a list of `Hole` tuples for each of `hole_labels` in the
+    component `labels` array, whose bottom-left tile is at in-game
+    coordinates (`origin_x`, `origin_y`).  Sorted biggest-first.
+    """
+    if not len(hole_labels):
+        return []
+    is_hole = np.zeros(labels.max()+1, dtype=bool)
+    is_hole[hole_labels] = True
+    (ys, xs) = np.nonzero(is_hole[labels])
+    hole_tiles = labels[ys, xs]
+    (found, first, sizes) = np.unique(hole_tiles, return_index=True, return_counts=True)
+    slot = np.searchsorted(found, hole_tiles)
+    min_x = np.full(len(found), labels.shape[1])
+    max_x = np.zeros(len(found), dtype=np.int64)
+    min_y = np.full(len(found), labels.shape[0])
+    max_y = np.zeros(len(found), dtype=np.int64)
+    np.minimum.at(min_x, slot, xs)
+    np.maximum.at(max_x, slot, xs)
+    np.minimum.at(min_y, slot, ys)
+    np.maximum.at(max_y, slot, ys)
+    holes = []
+    for idx in range(len(found)):
+        holes.append(Hole(
+            int(xs[first[idx]]) + origin_x,
+            int(ys[first[idx]]) + origin_y,
+            int(sizes[idx]),
+            int(min_x[idx]) + origin_x,
+            int(min_y[idx]) + origin_y,
+            int(max_x[idx]) + origin_x,
+            int(max_y[idx]) + origin_y,
+            ))
+    return sorted(holes, key=lambda h: (-h.size, h.x, h.y))
+
+class HoleScan(object):
+    """
+    Results of a hole scan.  `mask` is a boolean array marking every hole
+    tile, indexed as `[y][x]` with the first row at the bottom, and whose
+    bottom-left tile is at in-game coordinates (`x`, `y`).  `holes` is a
+    list of `Hole` tuples.
+    """
+
+    def __init__(self, x, y, mask, holes):
+        self.x = x
+        self.y = y
+        self.mask = mask
+        self.holes = holes
+
+def overlay_image(mask, color=OVERLAY_COLOR):
+    """
+    Returns an RGBA image (in image orientation, so the first row is the
+    *top*) with every tile in the boolean hole `mask` set to `color`, and
+    everything else transparent
+    """
+    image = np.zeros(mask.shape + (4,), dtype=np.uint8)
+    image[mask[::-1]] = color
+    return image
+
+def scan_world(filename, area=None, max_size=DEFAULT_MAX_SIZE, progress_callback=None, update_every=64):
+    """
+    Looks for holes in the background of the world at `filename`, returning
+    a `HoleScan`.  If `area` is given, as a tuple of in-game
+    `(min_x, min_y, max_x, max_y)` coordinates (inclusive), only that part
+    of the world is scanned; otherwise the whole world is.  Regions which
+    don't exist are treated as open air.  Progress reporting and
+    cancellation are as described in `scan.RegionScan`; if cancelled,
+    we'll return `None`.
+    """
+    with RegionScan(filename, progress_callback, update_every) as scan:
+        world = scan.world
+        (width, height) = world.info.size
+        if area is None:
+            area = (0, 0, width-1, height-1)
+            wrap = True
+        else:
+            wrap = False
+        min_x = max(0, area[0])
+        min_y = max(0, area[1])
+        max_x = min(width-1, area[2])
+        max_y = min(height-1, area[3])
+        if max_x < min_x or max_y < min_y:
+            return HoleScan(min_x, min_y, np.zeros((0, 0), dtype=bool), [])
+
+        # Read in all the regions which overlap our area
+        min_rx = min_x//REGION_TILES
+        min_ry = min_y//REGION_TILES
+        regions_w = max_x//REGION_TILES - min_rx + 1
+        regions_h = max_y//REGION_TILES - min_ry + 1
+        foreground = np.full((regions_h*REGION_TILES, regions_w*REGION_TILES), -1, dtype=np.int16)
+        background = foreground.copy()
+        available = set(world.get_all_regions_with_tiles())
+        regions = [(rx, ry)
+                for ry in range(min_ry, min_ry+regions_h)
+                for rx in range(min_rx, min_rx+regions_w)
+                if (rx, ry) in available]
+        for (rx, ry, tiles) in scan.region_tiles(regions):
+            row = (ry-min_ry)*REGION_TILES
+            col = (rx-min_rx)*REGION_TILES
+            foreground[row:row+REGION_TILES, col:col+REGION_TILES] = tiles.foreground_material
+            background[row:row+REGION_TILES, col:col+REGION_TILES] = tiles.background_material
+    if scan.cancelled:
+        return None
+
+    # Crop down to the area we were actually asked for
+    row = min_y - min_ry*REGION_TILES
+    col = min_x - min_rx*REGION_TILES
+    crop = (slice(row, row+max_y-min_y+1), slice(col, col+max_x-min_x+1))
+    (mask, labels, hole_labels) = find_holes(foreground[crop], background[crop],
+            max_size=max_size, wrap=wrap)
+    return HoleScan(min_x, min_y, mask, describe_holes(labels, hole_labels, min_x, min_y))
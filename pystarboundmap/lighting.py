@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Python Starbound Mapper (pystarboundmap)
+# Copyright (C) 2018 CJ Kucera 
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the development team nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CJ KUCERA BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import hashlib
+import numpy as np
+from .data import ColorPalettes
+from .render import REGION_TILES
+from .scan import RegionScan
+
+# Our light coverage is worked out on a coarse grid, where each cell is
+# this many tiles on a side
+CELL_TILES = 4
+CELLS_PER_REGION = REGION_TILES//CELL_TILES
+
+# How far (in tiles) the light from a full-brightness light source reaches.
+# Dimmer lights reach proportionally less far.  This isn't how Starbound
+# itself spreads light around, but it's close enough to show which areas
+# have been lit up.
+MAX_LIGHT_RADIUS = 24
+
+# How many light sources we spread out at once, to keep memory use down
+SOURCE_BATCH = 4096
+
+# Color used to mark lit areas on the map, and its alpha at full coverage
+OVERLAY_COLOR = (255, 220, 100)
+OVERLAY_ALPHA = 144
+
+# Bump this if the format of our cached light maps changes
+LIGHT_CACHE_VER = 1
+
+def light_intensity(color):
+    """
+    Returns the brightness (from 0 to 1) of the light color `color`, as
+    found in `lightColor` or `radiantLight` attributes
+    """
+    if not color:
+        return 0
+    return min(max(color[:3])/255, 1)
+
+def object_light(info):
+    """
+    Returns the brightness (from 0 to 1) of the light given off by an
+    object, given its `info` dict (or its `parameters`, which can override
+    the object's own light).  Objects with more than one light color (in
+    `lightColors`) are given the brightest of them.
+    """
+    if 'lightColor' in info:
+        return light_intensity(info['lightColor'])
+    if 'lightColors' in info and info['lightColors']:
+        return max(light_intensity(color) for color in info['lightColors'].values())
+    return 0
+
+class LightSources(object):
+    """
+    Brightness of everything which gives off light, gathered from the
+    objects, materials, matmods and liquids in a `StarboundData`.  The
+    tile tables are numpy arrays indexed in the same way as our
+    `ColorPalettes`, so a whole region's tiles can be looked up at once.
+    """
+
+    def __init__(self, data):
+        self.objects = {}
+        for (name, obj) in data.objects.items():
+            brightness = object_light(obj.info)
+            if brightness > 0:
+                self.objects[name] = brightness
+        self.materials = self.id_table(data.materials, 65536)
+        self.matmods = self.id_table(data.matmods, 65536)
+        self.liquids = self.id_table(data.liquids, 256)
+
+    @staticmethod
+    def id_table(lookup, size):
+        """
+        Returns an array of the `radiantLight` brightness of everything in
+        `lookup` (a dict of materials, matmods or liquids, keyed by ID)
+        """
+        table = np.zeros(size, dtype=np.float32)
+        for (item_id, item) in lookup.items():
+            if 0 <= item_id < size:
+                table[item_id] = light_intensity(item.info.get('radiantLight'))
+        return table
+
+    def entity_light(self, entity):
+        """
+        Returns the brightness of the light given off by the region `entity`
+        """
+        if entity.name != 'ObjectEntity':
+            return 0
+        parameters = entity.data.get('parameters') or {}
+        brightness = object_light(parameters)
+        if brightness > 0:
+            return brightness
+        return self.objects.get(entity.data.get('name'), 0)
+
+    def tile_light(self, tiles):
+        """
+        Returns a (32, 32) array of the brightness of the light given off by
+        each of the record array of region `tiles`
+        """
+        light = np.maximum(
+                self.materials[ColorPalettes.index(tiles.foreground_material)],
+                self.matmods[ColorPalettes.index(tiles.foreground_mod)],
+                )
+        liquids = np.where(tiles.liquid_level > 0, self.liquids[tiles.liquid], 0)
+        return np.maximum(light, liquids)
+
+def grid_size(world):
+    """
+    Returns the (width, height) of our light grid for the given `world`,
+    in cells
+    """
+    (width, height) = world.info.size
+    return (-(-width//CELL_TILES), -(-height//CELL_TILES))
+
+def light_coverage(brightness, wrap=True):
+    """
+    Given a 2D array of the `brightness` of the light sources in each cell
+    of our grid, returns an array of how well lit each cell is, from 0 to
+    1.  Each light fades out linearly with distance, reaching as far as
+    its brightness times `MAX_LIGHT_RADIUS` tiles, and each cell takes the
+    brightest of the lights reaching it.  If `wrap` is `True`, light wraps
+    around horizontally, as worlds do.
+    """
+    (height, width) = brightness.shape
+    coverage = np.zeros(brightness.shape, dtype=np.float32)
+    (ys, xs) = np.nonzero(brightness)
+    radii = brightness[ys, xs]*MAX_LIGHT_RADIUS
+    reaches = np.ceil(radii/CELL_TILES).astype(np.int32)
+
+    # Sources are grouped by how many cells they reach, so that each group
+    # can spread its light through a single block of offsets
+    for reach in np.unique(reaches):
+        (offset_y, offset_x) = np.mgrid[-reach:reach+1, -reach:reach+1]
+        offset_y = offset_y.ravel()
+        offset_x = offset_x.ravel()
+        distances = np.hypot(offset_y, offset_x)*CELL_TILES
+        group = np.flatnonzero(reaches == reach)
+        for start in range(0, len(group), SOURCE_BATCH):
+            batch = group[start:start+SOURCE_BATCH]
+            values = 1 - distances[np.newaxis, :]/radii[batch, np.newaxis]
+            target_y = ys[batch, np.newaxis] + offset_y
+            target_x = xs[batch, np.newaxis] + offset_x
+            valid = (values > 0) & (target_y >= 0) & (target_y < height)
+            if wrap:
+                target_x = target_x % width
+            else:
+                valid &= (target_x >= 0) & (target_x < width)
+            np.maximum.at(coverage, (target_y[valid], target_x[valid]), values[valid])
+    return coverage
+
+class LightMap(object):
+    """
+    How well lit each cell of our grid is across a whole world, as an
+    array indexed as `[y][x]` (with the first row at the bottom), where
+    0 is dark and 255 is fully lit.  `lights` is the number of cells with
+    a light source in them.
+    """
+
+    def __init__(self, coverage, lights):
+        self.coverage = coverage
+        self.lights = lights
+
+    def overlay_image(self):
+        """
+        Returns an RGBA image (in image orientation, so the first row is
+        the *top*) showing the lit areas
+        """
+        image = np.empty(self.coverage.shape + (4,), dtype=np.uint8)
+        image[..., :3] = OVERLAY_COLOR
+        image[..., 3] = (self.coverage[::-1].astype(np.uint16)*OVERLAY_ALPHA)//255
+        return image
+
+    def save(self, filename, mtime):
+        """
+        Saves ourself to `filename`, for the world as of `mtime`
+        """
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        np.savez_compressed(filename,
+                version=LIGHT_CACHE_VER,
+                mtime=mtime,
+                coverage=self.coverage,
+                lights=self.lights)
+
+    @staticmethod
+    def load(filename, mtime):
+        """
+        Loads a light map from `filename`, if it's there and matches
+        `mtime`.  Otherwise returns `None`.
+        """
+        if not os.path.exists(filename):
+            return None
+        try:
+            with np.load(filename) as df:
+                if int(df['version']) != LIGHT_CACHE_VER or float(df['mtime']) != mtime:
+                    return None
+                return LightMap(df['coverage'], int(df['lights']))
+        except (OSError, KeyError, ValueError):
+            return None
+
+def scan_world(filename, sources, progress_callback=None, update_every=32):
+    """
+    Builds a `LightMap` for the world at `filename`, using the
+    `LightSources` object `sources`, by reading the tiles and entities of
+    every region.  Progress reporting and cancellation are as described in
+    `scan.RegionScan`; if cancelled, we'll return `None`.
+    """
+    with RegionScan(filename, progress_callback, update_every) as scan:
+        (width, height) = grid_size(scan.world)
+        brightness = np.zeros((height, width), dtype=np.float32)
+        for (rx, ry, tiles) in scan.region_tiles():
+            row = ry*CELLS_PER_REGION
+            col = rx*CELLS_PER_REGION
+            if row >= height or col >= width:
+                continue
+
+            # Lit tiles.  World sizes aren't necessarily a multiple of the
+            # region size, so regions along the top and right edges may
+            # only partly fit in our grid.
+            cells = sources.tile_light(tiles).reshape(
+                    CELLS_PER_REGION, CELL_TILES,
+                    CELLS_PER_REGION, CELL_TILES,
+                    ).max(axis=(1, 3))
+            target = brightness[row:row+CELLS_PER_REGION, col:col+CELLS_PER_REGION]
+            np.maximum(target, cells[:target.shape[0], :target.shape[1]], out=target)
+
+            # Light-emitting objects
+            for entity in scan.entities(rx, ry):
+                light = sources.entity_light(entity)
+                if light > 0 and 'tilePosition' in entity.data:
+                    (x, y) = entity.data['tilePosition']
+                    (cell_x, cell_y) = (x//CELL_TILES, y//CELL_TILES)
+                    if 0 <= cell_x < width and 0 <= cell_y < height:
+                        brightness[cell_y, cell_x] = max(brightness[cell_y, cell_x], light)
+    if scan.cancelled:
+        return None
+
+    coverage = light_coverage(brightness)
+    return LightMap((coverage*255).round().astype(np.uint8), int(np.count_nonzero(brightness)))
+
+def cache_filename(cache_dir, filename):
+    """
+    Returns the filename we'd use to cache the light map for the world at
+    `filename`
+    """
+    key = hashlib.sha1(os.path.abspath(filename).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, 'lighting', '{}.npz'.format(key))
+
+def load_cached(cache_dir, filename, mtime):
+    """
+    Returns the cached `LightMap` for the world at `filename`, if we have
+    one which matches `mtime`.  Otherwise returns `None`.
+    """
+    return LightMap.load(cache_filename(cache_dir, filename), mtime)
+
+def save_cached(cache_dir, filename, mtime, light_map):
+    """
+    Saves the `LightMap` for the world at `filename` to our cache
+    """
+    light_map.save(cache_filename(cache_dir, filename), mtime)
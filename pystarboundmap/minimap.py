@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Python Starbound Mapper (pystarboundmap)
+# Copyright (C) 2018 CJ Kucera 
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the development team nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CJ KUCERA BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import hashlib
+import numpy as np
+from .data import ColorPalettes
+from .render import RegionCompositor, REGION_TILES
+from .scan import RegionScan
+
+# How many minimap pixels we use for each side of a region.  Each pixel
+# is the average of an 8x8 block of tiles.
+PIXELS_PER_REGION = 4
+TILES_PER_PIXEL = REGION_TILES//PIXELS_PER_REGION
+
+# Bump this if the format of our cached minimap files changes
+MINIMAP_CACHE_VER = 2
+
+class TileColors(object):
+    """
+    Floating-point versions of our data's `ColorPalettes`, for blending
+    tile colors together.
+    """
+
+    # How much to darken background materials, to match the main map
+    background_darken = 0.25
+
+    def __init__(self, data):
+        self.materials = data.palettes.materials.astype(np.float32)/255
+        self.liquids = data.palettes.liquids.astype(np.float32)/255
+
+    def material_colors(self, ids):
+        """
+        Returns an array of RGBA colors (floats from 0 to 1) for the given
+        array of material `ids`.  Unknown materials are fully transparent.
+        """
+        return self.materials[ColorPalettes.index(ids)]
+
+    def region_colors(self, tiles):
+        """
+        Returns a (32, 32, 3) float array of the colors of each tile in the
+        given record array of region `tiles` (in image orientation, so the
+        first row is the *top* of the region).
+        """
+        flipped = tiles[::-1]
+
+        background = self.material_colors(flipped.background_material)
+        colors = background[..., :3]*background[..., 3:4]*(1-self.background_darken)
+
+        liquids = self.liquids[flipped.liquid]
+        coverage = liquids[..., 3:4]*(RegionCompositor.liquid_heights(flipped)/8)[..., np.newaxis]
+        colors = colors*(1-coverage) + liquids[..., :3]*coverage
+
+        foreground = self.material_colors(flipped.foreground_material)
+        colors = colors*(1-foreground[..., 3:4]) + foreground[..., :3]*foreground[..., 3:4]
+        return colors
+
+def summarize_region(tiles, colors):
+    """
+    Reduces the record array of region `tiles` to a tiny
+    (`PIXELS_PER_REGION` square) RGBA image, using the `TileColors` object
+    `colors`.
+    """
+    tile_colors = colors.region_colors(tiles)
+    blocks = tile_colors.reshape(
+            PIXELS_PER_REGION, TILES_PER_PIXEL,
+            PIXELS_PER_REGION, TILES_PER_PIXEL,
+            3)
+    image = np.empty((PIXELS_PER_REGION, PIXELS_PER_REGION, 4), dtype=np.uint8)
+    image[..., :3] = (blocks.mean(axis=(1, 3))*255).round()
+    image[..., 3] = 255
+    return image
+
+def minimap_size(world):
+    """
+    Returns the (width, height) of the minimap for the given `world`, in
+    pixels.
+    """
+    (width, height) = world.info.size
+    return (
+            -(-width//REGION_TILES)*PIXELS_PER_REGION,
+            -(-height//REGION_TILES)*PIXELS_PER_REGION,
+            )
+
+def scan_world(filename, data, progress_callback=None, update_every=16):
+    """
+    Builds a minimap image for the world at `filename`, as an RGBA numpy
+    array where each region is `PIXELS_PER_REGION` pixels square and areas
+    without regions are transparent.  Progress reporting and cancellation
+    are as described in `scan.RegionScan`, except that `progress_callback`
+    is also passed the in-progress image as its first argument.  If
+    cancelled, we'll return `None`.
+    """
+    colors = TileColors(data)
+    if progress_callback:
+        callback = lambda done, total: progress_callback(image, done, total)
+    else:
+        callback = None
+    with RegionScan(filename, callback, update_every) as scan:
+        (width, height) = minimap_size(scan.world)
+        image = np.zeros((height, width, 4), dtype=np.uint8)
+        top = height//PIXELS_PER_REGION - 1
+        for (rx, ry, tiles) in scan.region_tiles():
+            row = (top-ry)*PIXELS_PER_REGION
+            col = rx*PIXELS_PER_REGION
+            if row < 0 or col+PIXELS_PER_REGION > width:
+                continue
+            image[row:row+PIXELS_PER_REGION, col:col+PIXELS_PER_REGION] = summarize_region(tiles, colors)
+    if scan.cancelled:
+        return None
+    return image
+
+def cache_filename(cache_dir, filename):
+    """
+    Returns the filename we'd use to cache the minimap for the world at
+    `filename`
+    """
+    key = hashlib.sha1(os.path.abspath(filename).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, 'minimap', '{}.npz'.format(key))
+
+def load_cached(cache_dir, filename, mtime):
+    """
+    Returns the cached minimap image for the world at `filename`, if we
+    have one which matches `mtime`.  Otherwise returns `None`.
+    """
+    cached = cache_filename(cache_dir, filename)
+    if not os.path.exists(cached):
+        return None
+    try:
+        with np.load(cached) as df:
+            if int(df['version']) == MINIMAP_CACHE_VER and float(df['mtime']) == mtime:
+                return df['image']
+    except (OSError, KeyError, ValueError):
+        pass
+    return None
+
+def save_cached(cache_dir, filename, mtime, image):
+    """
+    Saves the minimap `image` for the world at `filename` to our cache
+    """
+    cached = cache_filename(cache_dir, filename)
+    os.makedirs(os.path.dirname(cached), exist_ok=True)
+    np.savez_compressed(cached,
+            version=MINIMAP_CACHE_VER,
+            mtime=mtime,
+            image=image)
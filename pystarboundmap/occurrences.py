@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Python Starbound Mapper (pystarboundmap)
+# Copyright (C) 2018 CJ Kucera 
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the development team nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CJ KUCERA BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import hashlib
+import numpy as np
+from .render import REGION_TILES
+from .scan import RegionScan
+
+# Bump this if the format of our cached index files changes
+OCCURRENCE_CACHE_VER = 1
+
+# The kinds of things we keep track of: our key, the tile field it comes
+# from, and a label for the user.  Ores are matmods, so they show up as
+# foreground mods.
+KINDS = [
+        ('foreground', 'foreground_material', 'Foreground Materials'),
+        ('foreground_mod', 'foreground_mod', 'Foreground Mods'),
+        ('background', 'background_material', 'Background Materials'),
+        ('background_mod', 'background_mod', 'Background Mods'),
+        ('liquid', 'liquid', 'Liquids'),
+        ]
+
+def tile_ids(tiles, kind):
+    """
+    Returns a flat array of the IDs of `kind` in the record array of
+    region `tiles`, leaving out empty tiles (negative materials and mods,
+    or liquid 0)
+    """
+    field = dict((k[0], k[1]) for k in KINDS)[kind]
+    ids = tiles[field].ravel().astype(np.int32)
+    if kind == 'liquid':
+        return ids[ids > 0]
+    return ids[ids >= 0]
+
+def count_region(tiles):
+    """
+    Counts everything in the record array of region `tiles`.  Returns a
+    dict mapping each kind to a tuple of arrays: the IDs found, and how
+    many of each.
+    """
+    counts = {}
+    for (kind, _, _) in KINDS:
+        kind_counts = np.bincount(tile_ids(tiles, kind))
+        ids = np.flatnonzero(kind_counts)
+        counts[kind] = (ids, kind_counts[ids])
+    return counts
+
+def matching_tiles(tiles, kind, item_id):
+    """
+    Returns an array of the (x, y) positions (relative to the region
+    origin) of every tile in the record array of region `tiles` which
+    contains `item_id` of `kind`
+    """
+    field = dict((k[0], k[1]) for k in KINDS)[kind]
+    (ys, xs) = np.nonzero(tiles[field] == item_id)
+    return np.stack([xs, ys], axis=1)
+
+class OccurrenceIndex(object):
+    """
+    How many of every material, matmod and liquid each region of a world
+    contains.  For each kind, we store parallel arrays of region indexes,
+    IDs and counts (ie: a sparse region-by-ID matrix), so even large
+    worlds only take up a little memory.
+    """
+
+    def __init__(self, regions, entries):
+        """
+        `regions` is an (N, 2) array of region coordinates, and `entries`
+        is a dict mapping each kind to a tuple of `(region_indexes, ids,
+        counts)` arrays.
+        """
+        self.regions = regions
+        self.entries = entries
+
+    @staticmethod
+    def build(region_counts):
+        """
+        Builds an index from a list of `((rx, ry), counts)` tuples, where
+        `counts` is as returned by `count_region`
+        """
+        regions = np.array([coords for (coords, _) in region_counts], dtype=np.int32).reshape(-1, 2)
+        entries = {}
+        for (kind, _, _) in KINDS:
+            region_indexes = []
+            ids = []
+            counts = []
+            for (idx, (_, region)) in enumerate(region_counts):
+                (kind_ids, kind_counts) = region[kind]
+                region_indexes.append(np.full(len(kind_ids), idx, dtype=np.int32))
+                ids.append(kind_ids.astype(np.int32))
+                counts.append(kind_counts.astype(np.int32))
+            if region_indexes:
+                entries[kind] = (np.concatenate(region_indexes), np.concatenate(ids), np.concatenate(counts))
+            else:
+                empty = np.zeros(0, dtype=np.int32)
+                entries[kind] = (empty, empty, empty)
+        return OccurrenceIndex(regions, entries)
+
+    def totals(self, kind):
+        """
+        Returns a dict mapping each ID of `kind` in the world to a tuple of
+        its total count and the number of regions it's found in
+        """
+        (_, ids, counts) = self.entries[kind]
+        if not len(ids):
+            return {}
+        total_counts = np.bincount(ids, weights=counts).astype(np.int64)
+        total_regions = np.bincount(ids)
+        found = np.flatnonzero(total_regions)
+        return {int(item_id): (int(total_counts[item_id]), int(total_regions[item_id])) for item_id in found}
+
+    def regions_with(self, kind, item_id):
+        """
+        Returns a tuple of an (M, 2) array of the coordinates of all regions
+        containing `item_id` of `kind`, and an array of how many each one
+        has
+        """
+        (region_indexes, ids, counts) = self.entries[kind]
+        found = ids == item_id
+        return (self.regions[region_indexes[found]], counts[found])
+
+    def by_distance(self, kind, item_id, x, y, wrap_width=None):
+        """
+        Returns a list of the coordinates of all regions containing
+        `item_id` of `kind`, sorted by their distance from tile (`x`, `y`).
+        Starbound worlds wrap around horizontally, so if `wrap_width` (in
+        tiles) is given, we take that into account.
+        """
+        (coords, _) = self.regions_with(kind, item_id)
+        if not len(coords):
+            return []
+        centers = (coords + 0.5)*REGION_TILES
+        dx = np.abs(centers[:, 0] - x)
+        if wrap_width:
+            dx = np.minimum(dx, wrap_width - dx)
+        dy = centers[:, 1] - y
+        order = np.argsort(dx*dx + dy*dy, kind='stable')
+        return [tuple(coord) for coord in coords[order].tolist()]
+
+    def save(self, filename, mtime):
+        """
+        Saves ourself to `filename`, for the world as of `mtime`
+        """
+        arrays = {}
+        for (kind, (region_indexes, ids, counts)) in self.entries.items():
+            arrays['{}_regions'.format(kind)] = region_indexes
+            arrays['{}_ids'.format(kind)] = ids
+            arrays['{}_counts'.format(kind)] = counts
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        np.savez_compressed(filename,
+                version=OCCURRENCE_CACHE_VER,
+                mtime=mtime,
+                regions=self.regions,
+                **arrays)
+
+    @staticmethod
+    def load(filename, mtime):
+        """
+        Loads an index from `filename`, if it's there and matches `mtime`.
+        Otherwise returns `None`.
+        """
+        if not os.path.exists(filename):
+            return None
+        try:
+            with np.load(filename) as df:
+                if int(df['version']) != OCCURRENCE_CACHE_VER or float(df['mtime']) != mtime:
+                    return None
+                entries = {}
+                for (kind, _, _) in KINDS:
+                    entries[kind] = (
+                            df['{}_regions'.format(kind)],
+                            df['{}_ids'.format(kind)],
+                            df['{}_counts'.format(kind)],
+                            )
+                return OccurrenceIndex(df['regions'], entries)
+        except (OSError, KeyError, ValueError):
+            return None
+
+def scan_world(filename, progress_callback=None, update_every=64):
+    """
+    Builds an `OccurrenceIndex` for the world at `filename`, reading each
+    region once.  Progress reporting and cancellation are as described in
+    `scan.RegionScan`; if cancelled, we'll return `None`.
+    """
+    region_counts = []
+    with RegionScan(filename, progress_callback, update_every) as scan:
+        for (rx, ry, tiles) in scan.region_tiles():
+            region_counts.append(((rx, ry), count_region(tiles)))
+    if scan.cancelled:
+        return None
+    return OccurrenceIndex.build(region_counts)
+
+def cache_filename(cache_dir, filename):
+    """
+    Returns the filename we'd use to cache the index for the world at
+    `filename`
+    """
+    key = hashlib.sha1(os.path.abspath(filename).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, 'occurrences', '{}.npz'.format(key))
+
+def load_cached(cache_dir, filename, mtime):
+    """
+    Returns the cached `OccurrenceIndex` for the world at `filename`, if we
+    have one which matches `mtime`.  Otherwise returns `None`.
+    """
+    return OccurrenceIndex.load(cache_filename(cache_dir, filename), mtime)
+
+def save_cached(cache_dir, filename, mtime, index):
+    """
+    Saves the `OccurrenceIndex` for the world at `filename` to our cache
+    """
+    index.save(cache_filename(cache_dir, filename), mtime)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Python Starbound Mapper (pystarboundmap)
+# Copyright (C) 2018 CJ Kucera 
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the development team nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CJ KUCERA BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import math
+import time
+
+class PrefetchPlanner(object):
+    """
+    Keeps track of how fast (and in which direction) the map is being
+    scrolled, and uses that to figure out which regions are likely to come
+    into view soon, so they can be loaded before they're actually needed.
+    Faster scrolling looks farther ahead.
+
+    Also keeps some counters on how well it's doing: `issued` is the number
+    of regions we've asked to have prefetched, `hits` is how many of those
+    later came into view, and `wasted` is how many were unloaded again
+    without ever having been in view.
+
+    Positions and velocities are in regions (and regions per second).
+    """
+
+    # How far ahead (in seconds of travel) to prefetch
+    lookahead = 0.75
+
+    # Maximum number of regions to look ahead, no matter how fast we're going
+    max_regions_ahead = 4
+
+    # How much weight new velocity samples get, vs. the running average
+    smoothing = 0.5
+
+    # If we haven't moved for this long (in seconds), assume we've stopped
+    idle_time = 0.3
+
+    def __init__(self):
+        self.reset()
+        self.issued = 0
+        self.hits = 0
+        self.wasted = 0
+
+    def reset(self):
+        """
+        Forget about our current motion (when loading a new world, etc).
+        Our counters are kept.
+        """
+        self.last_pos = None
+        self.last_time = None
+        self.velocity = (0, 0)
+        self.prefetched = set()
+
+    def record(self, x, y, now=None):
+        """
+        Records that the center of the view is now at in-game tile
+        coordinates (`x`, `y`)
+        """
+        if now is None:
+            now = time.monotonic()
+        pos = (x/32, y/32)
+        if self.last_pos is not None:
+            elapsed = now - self.last_time
+            if elapsed > self.idle_time:
+                self.velocity = (0, 0)
+            elif elapsed > 0:
+                instant = (
+                        (pos[0] - self.last_pos[0])/elapsed,
+                        (pos[1] - self.last_pos[1])/elapsed,
+                        )
+                self.velocity = tuple(
+                        self.smoothing*i + (1-self.smoothing)*v
+                        for (i, v) in zip(instant, self.velocity))
+            else:
+                return
+        self.last_pos = pos
+        self.last_time = now
+
+    def get_velocity(self, now=None):
+        """
+        Returns our current (x, y) velocity, in regions per second
+        """
+        if now is None:
+            now = time.monotonic()
+        if self.last_time is None or now - self.last_time > self.idle_time:
+            return (0, 0)
+        return self.velocity
+
+    def plan(self, min_rx, max_rx, min_ry, max_ry, now=None):
+        """
+        Given the range of regions which are currently going to be loaded,
+        returns a list of extra (rx, ry) regions which we should prefetch,
+        in priority order.  Regions which are closer along our path (and
+        closer to the center of the view, at that point) come first.
+        """
+        (vx, vy) = self.get_velocity(now)
+        distance = min(math.hypot(vx, vy)*self.lookahead, self.max_regions_ahead)
+        steps = int(math.ceil(distance))
+        if steps == 0:
+            return []
+        (dir_x, dir_y) = (vx*self.lookahead, vy*self.lookahead)
+        scale = distance/math.hypot(dir_x, dir_y)
+        (dir_x, dir_y) = (dir_x*scale, dir_y*scale)
+
+        seen = set()
+        planned = []
+        for step in range(1, steps+1):
+            shift_x = int(round(dir_x*step/steps))
+            shift_y = int(round(dir_y*step/steps))
+            ctr_x = (min_rx + max_rx)/2 + shift_x
+            ctr_y = (min_ry + max_ry)/2 + shift_y
+            ahead = []
+            for rx in range(min_rx+shift_x, max_rx+shift_x+1):
+                for ry in range(min_ry+shift_y, max_ry+shift_y+1):
+                    if min_rx <= rx <= max_rx and min_ry <= ry <= max_ry:
+                        continue
+                    if (rx, ry) in seen:
+                        continue
+                    seen.add((rx, ry))
+                    ahead.append(((rx-ctr_x)**2 + (ry-ctr_y)**2, (rx, ry)))
+            planned.extend(region for (_, region) in sorted(ahead))
+        return planned
+
+    def issue(self, region):
+        """
+        Records that `region` has been prefetched
+        """
+        self.prefetched.add(region)
+        self.issued += 1
+
+    def observe_visible(self, regions):
+        """
+        Records that the given `regions` are now in view (or close enough
+        to have been loaded regardless of prefetching)
+        """
+        hits = self.prefetched & regions
+        self.hits += len(hits)
+        self.prefetched -= hits
+
+    def observe_unloaded(self, region):
+        """
+        Records that `region` has been unloaded
+        """
+        if region in self.prefetched:
+            self.prefetched.remove(region)
+            self.wasted += 1
+
+    def stats(self):
+        """
+        Returns a dict of our counters
+        """
+        return {
+                'issued': self.issued,
+                'hits': self.hits,
+                'wasted': self.wasted,
+                'pending': len(self.prefetched),
+                }
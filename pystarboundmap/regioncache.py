@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Python Starbound Mapper (pystarboundmap)
+# Copyright (C) 2018 CJ Kucera 
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the development team nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CJ KUCERA BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import io
+import os
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+
+class RegionCache(object):
+    """
+    On-disk cache of composited region layers (as returned by
+    `render.RegionCompositor.composite`), so that looking at a world again
+    later doesn't have to decode and composite every region from scratch.
+
+    Everything lives in a single SQLite database.  Regions are keyed on the
+    world's path and the region coordinates, and each entry stores a hash
+    of the region's raw tile data, so regions which haven't changed since
+    we cached them are still valid even after the world has been saved
+    again.  The whole cache is thrown away if the game assets (or our
+    compositing) change.  Once the cache grows past `max_bytes`, the least
+    recently used entries are pruned.
+
+    Safe to use from worker threads.
+    """
+
+    # Bump this whenever compositing changes in a way which would make
+    # previously-cached layers wrong
+    cache_ver = 1
+
+    max_bytes = 512*1024*1024
+
+    # When pruning, go this far below `max_bytes`, so we're not pruning on
+    # every single write
+    prune_to = 0.9
+
+    def __init__(self, filename, assets, max_bytes=None):
+        """
+        `assets` is something which identifies the game assets we're
+        rendering with (the pakfile path, mtime and size, for instance);
+        if it doesn't match what the cache was built with, the cache is
+        cleared.
+        """
+        if max_bytes is not None:
+            self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(filename, check_same_thread=False)
+        self.db.execute('pragma journal_mode=wal')
+        self.db.execute('pragma synchronous=normal')
+        self.db.execute("""create table if not exists meta (
+            key text primary key,
+            value text
+            )""")
+        self.db.execute("""create table if not exists regions (
+            world text,
+            rx integer,
+            ry integer,
+            hash blob,
+            layers blob,
+            size integer,
+            atime real,
+            primary key (world, rx, ry)
+            )""")
+        self.db.execute('create index if not exists regions_atime on regions (atime)')
+        signature = repr((self.cache_ver, assets))
+        row = self.db.execute("select value from meta where key='signature'").fetchone()
+        if row is None or row[0] != signature:
+            self.db.execute('delete from regions')
+            self.db.execute("insert or replace into meta (key, value) values ('signature', ?)", (signature,))
+        self.db.commit()
+        self.total_bytes = self.db.execute('select coalesce(sum(size), 0) from regions').fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def tile_hash(tiles):
+        """
+        Returns the hash we use to tell if the region data in `tiles` (as
+        returned by `render.read_region_tiles`) has changed
+        """
+        return hashlib.sha1(tiles.tobytes()).digest()
+
+    @staticmethod
+    def pack(layers):
+        """
+        Packs a dict of layer images into a compressed blob
+        """
+        df = io.BytesIO()
+        np.savez(df, **{str(layer): image for layer, image in layers.items()})
+        return zlib.compress(df.getvalue(), 1)
+
+    @staticmethod
+    def unpack(blob):
+        """
+        Unpacks a blob created by `pack` back into a dict of layer images
+        """
+        with np.load(io.BytesIO(zlib.decompress(blob))) as df:
+            return {int(layer): df[layer] for layer in df.files}
+
+    def get(self, world, rx, ry, tile_hash):
+        """
+        Returns the cached layers for region (`rx`, `ry`) of `world` (a
+        filename), if we have them and they match `tile_hash`.  Otherwise
+        returns `None`.
+        """
+        with self.lock:
+            if self.db is None:
+                return None
+            row = self.db.execute('select hash, layers from regions where world=? and rx=? and ry=?',
+                    (world, rx, ry)).fetchone()
+            if row is None or row[0] != tile_hash:
+                self.misses += 1
+                return None
+            self.db.execute('update regions set atime=? where world=? and rx=? and ry=?',
+                    (time.time(), world, rx, ry))
+            self.db.commit()
+            self.hits += 1
+        try:
+            return self.unpack(row[1])
+        except (OSError, ValueError, zlib.error):
+            return None
+
+    def put(self, world, rx, ry, tile_hash, layers):
+        """
+        Stores the `layers` for region (`rx`, `ry`) of `world` (a filename)
+        """
+        blob = self.pack(layers)
+        with self.lock:
+            if self.db is None:
+                return
+            row = self.db.execute('select size from regions where world=? and rx=? and ry=?',
+                    (world, rx, ry)).fetchone()
+            if row:
+                self.total_bytes -= row[0]
+            self.db.execute('insert or replace into regions values (?, ?, ?, ?, ?, ?, ?)',
+                    (world, rx, ry, tile_hash, blob, len(blob), time.time()))
+            self.total_bytes += len(blob)
+            if self.total_bytes > self.max_bytes:
+                self.prune()
+            self.db.commit()
+
+    def prune(self):
+        """
+        Removes the least recently used entries until we're comfortably
+        under our size cap.  Must be called with our lock held.
+        """
+        target = self.max_bytes*self.prune_to
+        doomed = []
+        for (rowid, size) in self.db.execute('select rowid, size from regions order by atime'):
+            if self.total_bytes <= target:
+                break
+            doomed.append((rowid,))
+            self.total_bytes -= size
+        self.db.executemany('delete from regions where rowid=?', doomed)
+
+    def close(self):
+        """
+        Closes our database.  Any further `get` or `put` calls (from
+        renders which were already in progress, say) are ignored.
+        """
+        with self.lock:
+            if self.db is not None:
+                self.db.commit()
+                self.db.close()
+                self.db = None
@@ -0,0 +1,511 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Python Starbound Mapper (pystarboundmap)
+# Copyright (C) 2018 CJ Kucera 
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the development team nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CJ KUCERA BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import starbound
+import threading
+import numpy as np
+from collections import namedtuple, OrderedDict
+from .rendertemplate import neighbor_masks
+from .trace import span
+
+class Layer(object):
+    """
+    Identifiers for the per-region layer images generated by
+    `RegionCompositor`.  The "mid" variants are the brighter versions of
+    the background layers.
+    """
+
+    (BACKGROUND,
+        BACKGROUND_MID,
+        BACKGROUND_MOD,
+        BACKGROUND_MOD_MID,
+        FOREGROUND,
+        FOREGROUND_MOD,
+        LIQUIDS,
+        ) = range(7)
+    all = range(7)
+
+    @staticmethod
+    def select(foreground=True, foreground_mod=True, background=True,
+            background_mod=True, liquids=True, back_mid=False):
+        """
+        Returns a tuple of the layer IDs to show for the given set of
+        toggles.  `back_mid` picks the brighter background variants.
+        """
+        visible = []
+        if background:
+            visible.append(Layer.BACKGROUND_MID if back_mid else Layer.BACKGROUND)
+        if background_mod:
+            visible.append(Layer.BACKGROUND_MOD_MID if back_mid else Layer.BACKGROUND_MOD)
+        if foreground:
+            visible.append(Layer.FOREGROUND)
+        if foreground_mod:
+            visible.append(Layer.FOREGROUND_MOD)
+        if liquids:
+            visible.append(Layer.LIQUIDS)
+        return tuple(sorted(visible))
+
+    # Layers whose images have a margin around them, since their sprites
+    # (or material edges) spill out into neighboring tiles.
+    with_margin = set([
+        BACKGROUND,
+        BACKGROUND_MID,
+        BACKGROUND_MOD,
+        BACKGROUND_MOD_MID,
+        FOREGROUND,
+        FOREGROUND_MOD,
+        ])
+
+# numpy equivalent of the struct format used by py-starbound's
+# `World.read_tile`, so that we can read a whole region's worth of tiles
+# in one go.
+TILE_DTYPE = np.dtype([
+    ('foreground_material', '>i2'),
+    ('foreground_hue_shift', 'u1'),
+    ('foreground_variant', 'u1'),
+    ('foreground_mod', '>i2'),
+    ('foreground_mod_hue_shift', 'u1'),
+    ('background_material', '>i2'),
+    ('background_hue_shift', 'u1'),
+    ('background_variant', 'u1'),
+    ('background_mod', '>i2'),
+    ('background_mod_hue_shift', 'u1'),
+    ('liquid', 'u1'),
+    ('liquid_level', '>f4'),
+    ('liquid_pressure', '>f4'),
+    ('liquid_infinite', 'u1'),
+    ('collision', 'u1'),
+    ('dungeon_id', '>u2'),
+    ('biome', 'u1'),
+    ('biome_2', 'u1'),
+    ('indestructible', '?'),
+    ('padding', 'V1'),
+    ])
+
+# Size of a region, in tiles and in pixels
+REGION_TILES = 32
+REGION_PIXELS = REGION_TILES*8
+
+# Margin (in pixels) around the layers listed in `Layer.with_margin`
+MOD_MARGIN = 4
+
+# Everything a GUI needs to put a region on-screen, as returned by
+# `RegionCompositor.render_region`.  `tiles` is the record array returned
+# by `read_region_tiles`, `layers` is a dict mapping `Layer` IDs to RGBA
+# arrays, and `entities` is the list of region entities.
+RegionRender = namedtuple('RegionRender', [
+    'rx',
+    'ry',
+    'tiles',
+    'layers',
+    'entities',
+    ])
+
+def read_region_tiles(world, rx, ry):
+    """
+    Reads the tiles for region (`rx`, `ry`) out of `world`, as a 32x32 numpy
+    record array of `TILE_DTYPE`.  The array is indexed as `[y][x]`, relative
+    to the region origin, so the first row is the *bottom* row of the region.
+    Raises `KeyError` if the region isn't found.
+    """
+    data = world.get(1, rx, ry)
+    with span('tiles.decode', 'render', rx=rx, ry=ry):
+        # The first three bytes are the same unknown bytes that py-starbound skips
+        tiles = np.frombuffer(data, dtype=TILE_DTYPE, count=REGION_TILES*REGION_TILES, offset=3)
+        return tiles.reshape(REGION_TILES, REGION_TILES).view(np.recarray)
+
+def tile_from_record(record):
+    """
+    Converts a single record from `read_region_tiles` into a py-starbound
+    `Tile` namedtuple, with regular Python types.
+    """
+    return starbound.Tile(*record.item()[:len(starbound.Tile._fields)])
+
+def alpha_composite(dst, src):
+    """
+    Composites the RGBA image `src` over the RGBA image `dst`, in-place.
+    Both should be uint8 arrays of the same shape.  Returns `dst`.
+    """
+    if not src[..., 3].any():
+        return dst
+    if dst[..., 3].min() == 255:
+        # Opaque destination (as when flattening); integer math will do
+        src_a = src[..., 3:4].astype(np.uint16)
+        dst[..., :3] = (src[..., :3]*src_a + dst[..., :3]*(255-src_a) + 127)//255
+        return dst
+
+    # Wherever the source is opaque or the destination is empty, it's a
+    # straight copy; only actually blend the pixels which need it.
+    copy = (src[..., 3] == 255) | (dst[..., 3] == 0)
+    np.copyto(dst, src, where=copy[..., np.newaxis])
+    blend = ~copy & (src[..., 3] > 0)
+    if not blend.any():
+        return dst
+    src_px = src[blend]
+    dst_px = dst[blend]
+    src_a = src_px[:, 3:4].astype(np.float32)/255
+    dst_a = dst_px[:, 3:4].astype(np.float32)/255
+    out_a = src_a + dst_a*(1-src_a)
+    out_rgb = (src_px[:, :3]*src_a + dst_px[:, :3]*dst_a*(1-src_a))/out_a
+    dst_px[:, :3] = out_rgb.round().astype(np.uint8)
+    dst_px[:, 3:4] = (out_a*255).round().astype(np.uint8)
+    dst[blend] = dst_px
+    return dst
+
+def darken(image, alpha):
+    """
+    Returns a copy of the RGBA `image` with black painted over it at the
+    given `alpha` (0-255), leaving transparency alone.  This is the numpy
+    equivalent of `StarboundData.highlight_pixmap` with a black highlight.
+    """
+    darkened = image.copy()
+    darkened[..., :3] = (image[..., :3]*((255-alpha)/255)).round().astype(np.uint8)
+    return darkened
+
+def downsample(image, factor):
+    """
+    Shrinks the RGBA `image` by an integer `factor` in each direction,
+    averaging each `factor`x`factor` block of pixels.
+    """
+    (height, width, channels) = image.shape
+    blocks = image.reshape(height//factor, factor, width//factor, factor, channels)
+    return blocks.mean(axis=(1, 3)).round().astype(np.uint8)
+
+def flatten(layers, visible):
+    """
+    Flattens the `layers` dict (as returned by `RegionCompositor.composite`)
+    into a single opaque region-sized RGBA image over black, using only the
+    layer IDs in `visible`.  Margins on mod layers are cropped off.
+    """
+    image = np.zeros((REGION_PIXELS, REGION_PIXELS, 4), dtype=np.uint8)
+    image[..., 3] = 255
+    for layer in sorted(visible):
+        if layer in layers:
+            src = layers[layer]
+            if layer in Layer.with_margin:
+                src = src[MOD_MARGIN:-MOD_MARGIN, MOD_MARGIN:-MOD_MARGIN]
+            alpha_composite(image, src)
+    return image
+
+def is_empty(image):
+    """
+    Returns `True` if the given RGBA `image` is fully transparent
+    """
+    return not image[..., 3].any()
+
+class RegionCompositor(object):
+    """
+    Composites each layer of a region into a single image, rather than
+    having to draw every tile individually.  This only uses numpy and the
+    numpy-based sprite data from our `StarboundData` object (no Qt), so it's
+    safe to use from worker threads.
+    """
+
+    # How much to darken our background layers, for normal and "mid"
+    # brightness, respectively
+    background_alpha = (192, 96)
+    background_mod_alpha = (90, 45)
+
+    def __init__(self, data):
+        self.data = data
+        self.liquid_colors = data.palettes.liquids
+        self.cache = data.region_cache
+
+    def render_region(self, world, rx, ry):
+        """
+        Reads region (`rx`, `ry`) from `world` and composites its layers,
+        returning a `RegionRender` tuple.  Raises `KeyError` if the region
+        can't be found.
+        """
+        with span('region.render', 'render', rx=rx, ry=ry):
+            tiles = read_region_tiles(world, rx, ry)
+            with span('region.read_entities', 'render', rx=rx, ry=ry):
+                try:
+                    entities = world.get_entities(rx, ry)
+                except KeyError:
+                    entities = []
+            return RegionRender(rx, ry, tiles, self.get_layers(world, rx, ry, tiles), entities)
+
+    def get_layers(self, world, rx, ry, tiles):
+        """
+        Returns the composited layers for region (`rx`, `ry`) of `world`,
+        whose `tiles` have already been read.  Uses our on-disk cache, if
+        we have one and the region hasn't changed since it was cached.
+        """
+        if self.cache is None:
+            with span('region.composite', 'render', rx=rx, ry=ry):
+                return self.composite(tiles)
+        with span('cache.get', 'cache', rx=rx, ry=ry):
+            tile_hash = self.cache.tile_hash(tiles)
+            layers = self.cache.get(world.filename, rx, ry, tile_hash)
+        if layers is None:
+            with span('region.composite', 'render', rx=rx, ry=ry):
+                layers = self.composite(tiles)
+            with span('cache.put', 'cache', rx=rx, ry=ry):
+                self.cache.put(world.filename, rx, ry, tile_hash, layers)
+        return layers
+
+    def composite(self, tiles):
+        """
+        Given a record array of `tiles` (as returned by `read_region_tiles`),
+        returns a dict whose keys are `Layer` IDs and whose values are RGBA
+        uint8 arrays.  Layers which would be completely empty are left out.
+        Layers in `Layer.with_margin` are `MOD_MARGIN` pixels larger than the
+        region on each side.
+        """
+        matmods = self.data.matmods
+
+        # Image rows go from top to bottom, whereas region rows go bottom
+        # to top.
+        flipped = tiles[::-1]
+
+        layers = {}
+        background = self.stamp_materials(flipped.background_material, 'background')
+        if not is_empty(background):
+            layers[Layer.BACKGROUND] = darken(background, self.background_alpha[0])
+            layers[Layer.BACKGROUND_MID] = darken(background, self.background_alpha[1])
+        background_mod = self.stamp_sprites(flipped.background_mod, matmods)
+        if not is_empty(background_mod):
+            layers[Layer.BACKGROUND_MOD] = darken(background_mod, self.background_mod_alpha[0])
+            layers[Layer.BACKGROUND_MOD_MID] = darken(background_mod, self.background_mod_alpha[1])
+        foreground = self.stamp_materials(flipped.foreground_material, 'foreground')
+        if not is_empty(foreground):
+            layers[Layer.FOREGROUND] = foreground
+        foreground_mod = self.stamp_sprites(flipped.foreground_mod, matmods)
+        if not is_empty(foreground_mod):
+            layers[Layer.FOREGROUND_MOD] = foreground_mod
+        liquids = self.composite_liquids(flipped)
+        if not is_empty(liquids):
+            layers[Layer.LIQUIDS] = liquids
+        return layers
+
+    def stamp_sprites(self, ids, lookup):
+        """
+        Given a 32x32 array of `ids` (in image orientation) and a dict
+        `lookup` whose values have an `rgba` sprite attribute, returns an
+        RGBA image with the sprite for each tile drawn in place.  8x8 sprites
+        produce an image the size of the region; larger sprites (matmods are
+        16x16) are centered on their tile and produce an image with a margin
+        around it.
+        """
+
+        # Build up an "atlas" of just the sprites used in this region, with
+        # index 0 being a transparent sprite.
+        known = [i for i in np.unique(ids).tolist() if i in lookup]
+        if not known:
+            return np.zeros((REGION_PIXELS, REGION_PIXELS, 4), dtype=np.uint8)
+        sprites = [lookup[i].rgba for i in known]
+        size = sprites[0].shape[0]
+        atlas = np.zeros((len(known)+1, size, size, 4), dtype=np.uint8)
+        for idx, sprite in enumerate(sprites):
+            atlas[idx+1] = sprite
+        keys = np.array(known)
+        positions = np.searchsorted(keys, ids).clip(0, len(keys)-1)
+        indexes = np.where(keys[positions] == ids, positions+1, 0)
+        return self.place_sprites(atlas, indexes)
+
+    def stamp_materials(self, ids, layer):
+        """
+        Like `stamp_sprites`, but for the materials in `layer` (`foreground`
+        or `background`), drawn with their edges using the precompiled
+        lookup tables from their render templates.  Always produces an
+        image with a `MOD_MARGIN` margin, since edges spill out into
+        neighboring tiles.
+        """
+        materials = self.data.materials
+        known = [i for i in np.unique(ids).tolist() if i in materials]
+        size = 8 + MOD_MARGIN*2
+        if not known:
+            return np.zeros((REGION_PIXELS+MOD_MARGIN*2, REGION_PIXELS+MOD_MARGIN*2, 4), dtype=np.uint8)
+
+        # Our atlas here is of each (material, case) combination actually
+        # used in the region
+        masks = neighbor_masks(ids)
+        indexes = np.zeros(ids.shape, dtype=np.intp)
+        parts = [np.zeros((1, size, size, 4), dtype=np.uint8)]
+        offset = 1
+        for material_id in known:
+            (table, sprites) = materials[material_id].edge_sprites(layer, MOD_MARGIN)
+            tiles = ids == material_id
+            (used, inverse) = np.unique(table[masks[tiles]], return_inverse=True)
+            parts.append(sprites[used])
+            indexes[tiles] = inverse.reshape(-1) + offset
+            offset += len(used)
+        return self.place_sprites(np.concatenate(parts), indexes)
+
+    def place_sprites(self, atlas, indexes):
+        """
+        Given an `atlas` of square RGBA sprites (with shape (n, size, size,
+        4)) and a 32x32 array of `indexes` into it, returns an image with
+        each tile's sprite drawn in place.  8x8 sprites produce an image
+        the size of the region; larger sprites are centered on their tile
+        and produce an image with a margin around it.
+        """
+        size = atlas.shape[1]
+
+        # If the sprites overlap their neighbors, we do this in four passes
+        # (based on row/column parity) so that none of the sprites in any
+        # one pass overlap each other.
+        if size == 8:
+            return self.tile_blocks(atlas[indexes])
+        margin = (size-8)//2
+        image = np.zeros((REGION_PIXELS+margin*2, REGION_PIXELS+margin*2, 4), dtype=np.uint8)
+        half = REGION_TILES//2
+        for row_parity in (0, 1):
+            for col_parity in (0, 1):
+                blocks = atlas[indexes[row_parity::2, col_parity::2]]
+                top = row_parity*8
+                left = col_parity*8
+                alpha_composite(
+                        image[top:top+half*size, left:left+half*size],
+                        self.tile_blocks(blocks),
+                        )
+        return image
+
+    def tile_blocks(self, blocks):
+        """
+        Given an array of per-tile sprites with shape (rows, cols, h, w, 4),
+        returns them laid out edge-to-edge as a single RGBA image.
+        """
+        (rows, cols, height, width, _) = blocks.shape
+        return blocks.transpose(0, 2, 1, 3, 4).reshape(rows*height, cols*width, 4)
+
+    @staticmethod
+    def liquid_heights(flipped):
+        """
+        Returns a 32x32 array of how many pixels (0 to 8) of each tile should
+        be filled with liquid, given a record array of tiles in image
+        orientation.  Any nonzero liquid level gets at least one pixel, and
+        levels at or above 1 (liquid under pressure) fill the whole tile.
+        """
+        levels = np.nan_to_num(flipped.liquid_level.astype(np.float32)).clip(0, 1)
+        heights = np.ceil(levels*8).astype(np.int8)
+        heights[flipped.liquid == 0] = 0
+        return heights
+
+    def composite_liquids(self, flipped):
+        """
+        Composites the liquid layer, given a record array of tiles in image
+        orientation.  Each liquid type present in the region gets a single
+        masked fill, and partially-filled tiles are only filled from the
+        bottom up to their liquid level.
+        """
+        image = np.zeros((REGION_TILES, 8, REGION_TILES, 8, 4), dtype=np.uint8)
+        heights = self.liquid_heights(flipped)
+        if not heights.any():
+            return image.reshape(REGION_PIXELS, REGION_PIXELS, 4)
+
+        # `filled` is indexed as [tile row][pixel row][tile col][pixel col]
+        pixel_rows = np.arange(8).reshape(1, 8, 1, 1)
+        filled = pixel_rows >= (8-heights)[:, np.newaxis, :, np.newaxis]
+        filled = np.broadcast_to(filled, image.shape[:4])
+        liquids = flipped.liquid[:, np.newaxis, :, np.newaxis]
+        for liquid_id in np.unique(flipped.liquid[heights > 0]).tolist():
+            image[filled & (liquids == liquid_id)] = self.liquid_colors[liquid_id]
+        return image.reshape(REGION_PIXELS, REGION_PIXELS, 4)
+
+class RegionPyramid(object):
+    """
+    Generates downsampled, flattened images of regions, for our zoomed-out
+    levels of detail.  Each region is rendered once at full size and then
+    shrunk by half for each of our `scales`; the results are kept in an LRU
+    cache (keyed on the visible layers, too) so that moving between levels
+    or scrolling back over an area doesn't have to re-read the world.
+
+    At each scale, regions are drawn in square groups (see `group_size`)
+    such that every group image is the same size, so the GUI can use a
+    single item per group.  Safe to use from worker threads.
+    """
+
+    scales = (0.5, 0.25, 0.125)
+
+    def __init__(self, compositor, max_regions=768):
+        self.compositor = compositor
+        self.max_regions = max_regions
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def group_size(scale):
+        """
+        Returns how many regions wide/tall a single group is, at `scale`
+        """
+        return max(1, int(round(0.5/scale)))
+
+    def get_region(self, world, rx, ry, visible):
+        """
+        Returns a dict mapping each of our `scales` to a downsampled image
+        of region (`rx`, `ry`), containing the layers in `visible` (a tuple
+        of `Layer` IDs).  Raises `KeyError` if the region isn't found.
+        """
+        key = (rx, ry, visible)
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+
+        tiles = read_region_tiles(world, rx, ry)
+        layers = self.compositor.get_layers(world, rx, ry, tiles)
+        with span('region.downsample', 'render', rx=rx, ry=ry):
+            image = flatten(layers, visible)
+            levels = {}
+            for scale in self.scales:
+                image = downsample(image, 2)
+                levels[scale] = image
+
+        with self.lock:
+            self.cache[key] = levels
+            while len(self.cache) > self.max_regions:
+                self.cache.popitem(last=False)
+        return levels
+
+    def render_group(self, world, scale, gx, gy, regions, visible):
+        """
+        Returns an RGBA image of the region group (`gx`, `gy`) at `scale`.
+        `regions` is the list of (rx, ry) tuples in the group which actually
+        exist in the world; the rest of the image is left transparent.
+        """
+        group = self.group_size(scale)
+        size = int(REGION_PIXELS*scale)
+        image = np.zeros((group*size, group*size, 4), dtype=np.uint8)
+        for (rx, ry) in regions:
+            try:
+                levels = self.get_region(world, rx, ry, visible)
+            except KeyError:
+                continue
+            col = rx - gx*group
+            row = group - 1 - (ry - gy*group)
+            image[row*size:(row+1)*size, col*size:(col+1)*size] = levels[scale]
+        return image
+
+    def clear(self):
+        """
+        Clears out our cache
+        """
+        with self.lock:
+            self.cache.clear()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Python Starbound Mapper (pystarboundmap)
+# Copyright (C) 2018 CJ Kucera 
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the development team nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CJ KUCERA BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import threading
+import numpy as np
+
+# The eight neighbors of a tile which make up our neighbor masks, as
+# (dx, dy) offsets using Starbound's coordinates (ie: y goes *up*).  Bit
+# `i` of a mask is set if neighbor `i` "connects" to the tile (ie: has any
+# material in it at all), and bit `i+8` is set if the neighbor is the same
+# material as the tile itself.
+NEIGHBORS = (
+        (-1, 1), (0, 1), (1, 1),
+        (-1, 0), (1, 0),
+        (-1, -1), (0, -1), (1, -1),
+        )
+EQUALS_SHIFT = 8
+NUM_MASKS = 1 << (len(NEIGHBORS)*2)
+
+# Special material IDs (as signed 16-bit values) which don't count as
+# anything being there
+EMPTY_MATERIAL = -1
+NULL_MATERIAL = -2
+
+def neighbor_masks(ids):
+    """
+    Given a 2D array of material `ids` in image orientation (ie: the first
+    row is the *top* row), returns a same-shaped uint16 array of neighbor
+    masks suitable for looking up in `RenderTemplate.compile` tables.  We
+    don't have the neighboring regions' tiles, so tiles along the edges of
+    the array are treated as if they continue on past it.
+    """
+    (height, width) = ids.shape
+    padded = np.pad(ids, 1, mode='edge')
+    connects = (padded != EMPTY_MATERIAL) & (padded != NULL_MATERIAL)
+    masks = np.zeros(ids.shape, dtype=np.uint16)
+    for bit, (dx, dy) in enumerate(NEIGHBORS):
+        # Image rows go down, so "up" is the previous row
+        rows = slice(1-dy, 1-dy+height)
+        cols = slice(1+dx, 1+dx+width)
+        masks |= connects[rows, cols].astype(np.uint16) << bit
+        masks |= (padded[rows, cols] == ids).astype(np.uint16) << (bit+EQUALS_SHIFT)
+    return masks
+
+class TemplatePiece(object):
+    """
+    A single named piece of a render template: a rectangle inside the
+    material's texture
+    """
+
+    def __init__(self, name, info):
+        self.name = name
+        (self.x, self.y) = info['texturePosition']
+        (self.width, self.height) = info['textureSize']
+
+    def crop(self, texture):
+        """
+        Returns this piece out of the RGBA `texture` array (possibly
+        smaller than expected, if the texture isn't big enough)
+        """
+        return texture[self.y:self.y+self.height, self.x:self.x+self.width]
+
+class TemplateRule(object):
+    """
+    A named rule which gets checked against a tile's neighbor.  Only the
+    rule entry types which we can answer from our neighbor masks are
+    supported ("Connects" and "EqualsSelf", with "Shadows" treated as
+    "Connects"); anything else never matches.
+    """
+
+    def __init__(self, info):
+        self.join_any = info.get('join', 'all').lower() == 'any'
+        self.entries = []
+        for entry in info.get('entries', []):
+            self.entries.append((entry.get('type'), entry.get('inverse', False)))
+
+    def evaluate(self, masks, point):
+        """
+        Returns a boolean array with the result of this rule for every
+        entry in `masks`, when checked against the neighbor at `point`
+        """
+        results = []
+        for (entry_type, inverse) in self.entries:
+            if entry_type in ('Connects', 'Shadows'):
+                result = RenderTemplate.neighbor_bit(masks, point, 0)
+            elif entry_type == 'EqualsSelf':
+                result = RenderTemplate.neighbor_bit(masks, point, EQUALS_SHIFT)
+            else:
+                result = np.zeros(masks.shape, dtype=bool)
+            results.append(~result if inverse else result)
+        if not results:
+            return np.ones(masks.shape, dtype=bool)
+        if self.join_any:
+            return np.logical_or.reduce(results)
+        return np.logical_and.reduce(results)
+
+class TemplateMatch(object):
+    """
+    One entry in a template's list of matches: if all (and any) of its
+    points match their rules, its pieces get drawn and its sub-matches
+    get checked
+    """
+
+    def __init__(self, info, rules, pieces):
+        self.all_points = self.read_points(info.get('matchAllPoints', []), rules)
+        self.any_points = self.read_points(info.get('matchAnyPoints', []), rules)
+        self.required_layer = info.get('requiredLayer')
+        self.halt_on_match = info.get('haltOnMatch', False)
+        self.halt_on_sub_match = info.get('haltOnSubMatch', False)
+        self.pieces = []
+        for (name, offset) in info.get('pieces', []):
+            if name in pieces:
+                self.pieces.append((pieces[name], int(offset[0]), int(offset[1])))
+        self.sub_matches = [TemplateMatch(sub, rules, pieces) for sub in info.get('subMatches', [])]
+
+    @staticmethod
+    def read_points(points, rules):
+        """
+        Reads a list of `[[x, y], rule_name]` points.  Points referring to
+        unknown rules will never match.
+        """
+        return [((int(point[0]), int(point[1])), rules.get(rule_name)) for (point, rule_name) in points]
+
+    def evaluate(self, masks, layer):
+        """
+        Returns a boolean array saying whether we match, for every entry in
+        `masks`
+        """
+        if self.required_layer is not None and self.required_layer != layer:
+            return np.zeros(masks.shape, dtype=bool)
+        matched = np.ones(masks.shape, dtype=bool)
+        for (point, rule) in self.all_points:
+            if rule is None:
+                return np.zeros(masks.shape, dtype=bool)
+            matched &= rule.evaluate(masks, point)
+        if self.any_points:
+            any_matched = np.zeros(masks.shape, dtype=bool)
+            for (point, rule) in self.any_points:
+                if rule is not None:
+                    any_matched |= rule.evaluate(masks, point)
+            matched &= any_matched
+        return matched
+
+class RenderTemplate(object):
+    """
+    A material render template (`/tiles/*template.config`), which describes
+    how to draw a material tile (including its edges, and how platforms,
+    pipes and the like join up) based on what's around it.
+
+    Rather than evaluating the template's rules for every tile we draw, we
+    `compile` them ahead of time into a lookup table indexed by the
+    neighbor masks returned by `neighbor_masks`.  Each entry in the table
+    is an index into a list of "cases", each of which is the list of pieces
+    to draw for that arrangement of neighbors.  Every combination of the
+    eight neighbors is covered, so drawing a tile is just a table lookup.
+
+    Our masks only cover the immediately-adjacent tiles, so any rule
+    points farther out than that are checked against the nearest neighbor
+    in the same direction instead.
+    """
+
+    def __init__(self, info):
+        self.pieces = {name: TemplatePiece(name, piece) for name, piece in info['pieces'].items()}
+        rules = {name: TemplateRule(rule) for name, rule in info.get('rules', {}).items()}
+        self.match_sets = []
+        for (_, matches) in info['matches']:
+            self.match_sets.append([TemplateMatch(match, rules, self.pieces) for match in matches])
+        self.representative = self.pieces.get(info.get('representativePiece'))
+        self.compiled = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def neighbor_bit(masks, point, shift):
+        """
+        Returns a boolean array of whether the neighbor at `point` has the
+        given bit set in each of `masks`.  The tile itself always both
+        connects and equals itself.
+        """
+        (dx, dy) = (max(-1, min(1, point[0])), max(-1, min(1, point[1])))
+        if (dx, dy) == (0, 0):
+            return np.ones(masks.shape, dtype=bool)
+        bit = NEIGHBORS.index((dx, dy)) + shift
+        return (masks >> bit) & 1 == 1
+
+    def compile(self, layer):
+        """
+        Compiles this template for the given `layer` (`foreground` or
+        `background`), returning a tuple of `(table, cases)`.  `table` is
+        a numpy array mapping every possible neighbor mask to an index in
+        `cases`, and each case is a list of `(piece, x, y)` tuples, where
+        `x` and `y` are the piece's pixel offset from the bottom-left of
+        the tile.  The results are cached.
+        """
+        with self.lock:
+            if layer not in self.compiled:
+                self.compiled[layer] = self._compile(layer)
+            return self.compiled[layer]
+
+    def _compile(self, layer):
+        """
+        Does the actual work for `compile`, evaluating every match for
+        every mask at once.  Each match which gets drawn adds a row to a
+        boolean "drawn" matrix, whose unique columns are our cases.
+        """
+        masks = np.arange(NUM_MASKS, dtype=np.uint32)
+        drawn = []
+
+        def process(matches, active):
+            halted = np.zeros(masks.shape, dtype=bool)
+            for match in matches:
+                matched = active & ~halted & match.evaluate(masks, layer)
+                if not matched.any():
+                    continue
+                for piece in match.pieces:
+                    drawn.append((piece, matched))
+                sub_halted = process(match.sub_matches, matched)
+                if match.halt_on_match:
+                    halted |= matched
+                elif match.halt_on_sub_match:
+                    halted |= sub_halted
+            return halted
+
+        for matches in self.match_sets:
+            process(matches, np.ones(masks.shape, dtype=bool))
+
+        if not drawn:
+            return (np.zeros(NUM_MASKS, dtype=np.uint16), [[]])
+        matrix = np.array([matched for (_, matched) in drawn])
+        (columns, table) = np.unique(matrix.T, axis=0, return_inverse=True)
+        cases = [[drawn[idx][0] for idx in np.flatnonzero(column)] for column in columns]
+        return (table.reshape(-1).astype(np.uint16), cases)
+
+    @staticmethod
+    def draw_case(texture, case, margin):
+        """
+        Draws the pieces in `case` out of the RGBA `texture` array, returning
+        a square tile sprite with `margin` extra pixels on each side, for
+        pieces which spill out into neighboring tiles
+        """
+        size = 8 + margin*2
+        sprite = np.zeros((size, size, 4), dtype=np.uint8)
+        for (piece, x, y) in case:
+            image = piece.crop(texture)
+            (height, width) = image.shape[:2]
+            # Offsets are from the bottom-left, with y going up
+            left = margin + x
+            top = margin + 8 - y - height
+            (src_left, src_top) = (max(0, -left), max(0, -top))
+            (left, top) = (max(0, left), max(0, top))
+            width = min(width - src_left, size - left)
+            height = min(height - src_top, size - top)
+            if width <= 0 or height <= 0:
+                continue
+            src = image[src_top:src_top+height, src_left:src_left+width]
+            dst = sprite[top:top+height, left:left+width]
+            opaque = src[..., 3] == 255
+            blend = (src[..., 3] > 0) & ~opaque
+            dst[opaque] = src[opaque]
+            if blend.any():
+                src_a = src[blend][:, 3:4].astype(np.float32)/255
+                dst[blend, :3] = (src[blend][:, :3]*src_a + dst[blend][:, :3]*(1-src_a)).round().astype(np.uint8)
+                dst[blend, 3] = np.maximum(dst[blend, 3], src[blend][:, 3])
+        return sprite
+
+    @staticmethod
+    def load(config):
+        """
+        Returns a `RenderTemplate` from the parsed template `config`, or
+        `None` if it doesn't look like something we can use
+        """
+        try:
+            template = RenderTemplate(config)
+        except (KeyError, TypeError, ValueError):
+            return None
+        if not template.pieces or not template.match_sets:
+            return None
+        return template
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Python Starbound Mapper (pystarboundmap)
+# Copyright (C) 2018 CJ Kucera 
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the development team nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CJ KUCERA BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from .data import StarboundData
+from .render import read_region_tiles
+
+class RegionScan(object):
+    """
+    Reads through the regions of a world, for our various whole-world
+    scans (the minimap, the tile index, the light map and so on).  The
+    world is opened separately from any world the GUI has open, so this
+    is safe to use from a worker thread.  Used as a context manager, which
+    closes the world again once we're through:
+
+        with RegionScan(filename, progress_callback) as scan:
+            for (rx, ry, tiles) in scan.region_tiles():
+                ...
+        if scan.cancelled:
+            return None
+
+    If `progress_callback` is passed in, it will be called every
+    `update_every` regions (and once all the regions are done) with the
+    number of regions done and total.  If it returns `True`, the scan is
+    cancelled: we stop yielding regions, and `cancelled` gets set.
+    """
+
+    def __init__(self, filename, progress_callback=None, update_every=64):
+        self.filename = filename
+        self.progress_callback = progress_callback
+        self.update_every = update_every
+        self.world = None
+        self.worldmm = None
+        self.cancelled = False
+
+    def __enter__(self):
+        (self.world, self.worldmm) = StarboundData.open_world(self.filename)
+        # py-starbound only reads the BTree header on our first `get`
+        self.world.read_header()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.worldmm.close()
+        return False
+
+    def progress(self, done, total):
+        """
+        Reports our progress, returning `True` if we've been cancelled
+        """
+        if self.progress_callback and self.progress_callback(done, total):
+            self.cancelled = True
+        return self.cancelled
+
+    def regions(self, regions=None):
+        """
+        Yields the `(rx, ry)` coordinates of each of `regions` (or of every
+        region with tiles, if that's not given), reporting progress as we go
+        """
+        if regions is None:
+            regions = list(self.world.get_all_regions_with_tiles())
+        for idx, region in enumerate(regions):
+            if idx % self.update_every == 0 and self.progress(idx, len(regions)):
+                return
+            yield region
+        self.progress(len(regions), len(regions))
+
+    def region_tiles(self, regions=None):
+        """
+        As with `regions`, but yields `(rx, ry, tiles)` tuples, where
+        `tiles` is the record array from `read_region_tiles`.  Regions
+        which can't be found are skipped.
+        """
+        for (rx, ry) in self.regions(regions):
+            try:
+                tiles = read_region_tiles(self.world, rx, ry)
+            except KeyError:
+                continue
+            yield (rx, ry, tiles)
+
+    def entities(self, rx, ry):
+        """
+        Returns the entities in region (`rx`, `ry`), or an empty list if
+        there aren't any
+        """
+        try:
+            return self.world.get_entities(rx, ry)
+        except KeyError:
+            return []
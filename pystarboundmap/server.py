@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Python Starbound Mapper (pystarboundmap)
+# Copyright (C) 2018 CJ Kucera 
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the development team nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CJ KUCERA BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import io
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+import threading
+import http.server
+from collections import OrderedDict
+import numpy as np
+from PIL import Image
+from .data import StarboundData
+from .headless import add_layer_arguments, layers_from_args, load_config
+from .render import RegionCompositor, RegionPyramid, read_region_tiles, tile_from_record, flatten, REGION_TILES
+from .tiles import TILE_SIZE, max_zoom, combine_children
+
+class WorldSnapshot(object):
+    """
+    A world as it was when we opened it, along with what we've worked out
+    about it.  Each request takes a single snapshot and uses it throughout,
+    so if the world gets re-saved partway through a request, the request
+    keeps reading from the world it started with.  We never close the
+    world's mmap ourselves; it's closed once the last request using the
+    snapshot is through with it and the snapshot gets garbage collected.
+    """
+
+    def __init__(self, filename, mtime, compositor):
+        (self.world, self.worldmm) = StarboundData.open_world(filename)
+        self.mtime = mtime
+        (self.width, self.height) = self.world.info.size
+        self.width_regions = -(-self.width//REGION_TILES)
+        self.height_regions = -(-self.height//REGION_TILES)
+        self.max_zoom = max_zoom(self.width_regions, self.height_regions)
+        self.regions = set(self.world.get_all_regions_with_tiles())
+        self.pyramid = RegionPyramid(compositor)
+
+class TileServer(object):
+    """
+    Renders slippy-map tiles (using the same z/x/y layout as
+    `tiles.export_tiles`) and tile info on demand, for `TileHandler`.
+    Tiles at the highest zoom level are composited regions; the next few
+    levels down come from `RegionPyramid`'s downsampled regions, and
+    anything below that is built from the level above.  Recently-used
+    tiles are kept in memory, and composited regions go through the
+    on-disk region cache as usual.
+
+    If the world file changes on disk, we reopen it (as a new
+    `WorldSnapshot`) and forget everything we've got in memory.  Safe to
+    use from multiple threads.
+    """
+
+    def __init__(self, data, filename, visible, max_tiles=1024):
+        self.data = data
+        self.filename = filename
+        self.visible = visible
+        self.max_tiles = max_tiles
+        self.compositor = RegionCompositor(data)
+        self.tiles = OrderedDict()
+        self.lock = threading.Lock()
+        self.snapshot = WorldSnapshot(filename, os.path.getmtime(filename), self.compositor)
+
+    def check_world(self):
+        """
+        (Re)opens our world if it's changed on disk since we last looked.
+        Returns the current `WorldSnapshot`, which the caller should use
+        for everything it does from here on.  While Starbound is saving
+        the world, the file may be missing or only partly written; if we
+        can't reopen it, we keep on using the snapshot we've got (and will
+        try again on the next request).  Returns `None` if we don't have
+        one at all.
+        """
+        with self.lock:
+            try:
+                mtime = os.path.getmtime(self.filename)
+                if self.snapshot is None or mtime != self.snapshot.mtime:
+                    self.snapshot = WorldSnapshot(self.filename, mtime, self.compositor)
+                    self.tiles.clear()
+            except Exception as e:
+                print('Unable to reopen {}: {}'.format(self.filename, e), file=sys.stderr)
+            return self.snapshot
+
+    def etag(self, snapshot, *key):
+        """
+        Returns an ETag for something identified by `key`, for the world as
+        of `snapshot`
+        """
+        tag = repr((self.filename, snapshot.mtime, self.visible) + key)
+        return '"{}"'.format(hashlib.sha1(tag.encode('utf-8')).hexdigest())
+
+    def metadata(self, snapshot):
+        """
+        Returns a dict describing our tile layout
+        """
+        try:
+            name = StarboundData.strip_colors(snapshot.world.info.name)
+        except (AttributeError, KeyError, TypeError):
+            # Shipworlds and the like don't have names
+            name = None
+        return {
+                'name': name,
+                'world_size': [snapshot.width, snapshot.height],
+                'tile_size': TILE_SIZE,
+                'min_zoom': 0,
+                'max_zoom': snapshot.max_zoom,
+                }
+
+    def get_tile(self, snapshot, zoom, x, y):
+        """
+        Returns a tuple of the PNG data and RGBA image for the tile at
+        `zoom`/`x`/`y` in `snapshot`, or `None` if there's nothing there.
+        Tiles rendered from a snapshot which has since been replaced don't
+        get cached.
+        """
+        key = (zoom, x, y)
+        with self.lock:
+            if snapshot is self.snapshot and key in self.tiles:
+                self.tiles.move_to_end(key)
+                return self.tiles[key]
+
+        image = self.render_tile(snapshot, zoom, x, y)
+        if image is None:
+            result = None
+        else:
+            df = io.BytesIO()
+            Image.fromarray(image, 'RGBA').save(df, format='png')
+            result = (df.getvalue(), image)
+
+        with self.lock:
+            if snapshot is self.snapshot:
+                self.tiles[key] = result
+                while len(self.tiles) > self.max_tiles:
+                    self.tiles.popitem(last=False)
+        return result
+
+    def render_tile(self, snapshot, zoom, x, y):
+        """
+        Renders the tile at `zoom`/`x`/`y` in `snapshot` as an RGBA image,
+        or returns `None` if there's nothing there
+        """
+        if zoom < 0 or zoom > snapshot.max_zoom or x < 0 or y < 0:
+            return None
+        span = 2**(snapshot.max_zoom - zoom)
+        scale = 1/span
+        if span > 1 and scale not in RegionPyramid.scales:
+            children = {}
+            for dy in (0, 1):
+                for dx in (0, 1):
+                    child = self.get_tile(snapshot, zoom+1, x*2+dx, y*2+dy)
+                    children[(dx, dy)] = child[1] if child else None
+            return combine_children(children)
+
+        world = snapshot.world
+        size = TILE_SIZE//span
+        image = np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+        found = False
+        for row in range(span):
+            for col in range(span):
+                (rx, ry) = (x*span + col, snapshot.height_regions-1 - (y*span + row))
+                if (rx, ry) not in snapshot.regions:
+                    continue
+                try:
+                    if span == 1:
+                        tiles = read_region_tiles(world, rx, ry)
+                        region = flatten(self.compositor.get_layers(world, rx, ry, tiles), self.visible)
+                    else:
+                        region = snapshot.pyramid.get_region(world, rx, ry, self.visible)[scale]
+                except KeyError:
+                    continue
+                image[row*size:(row+1)*size, col*size:(col+1)*size] = region
+                found = True
+        return image if found else None
+
+    def tile_info(self, snapshot, x, y):
+        """
+        Returns a dict describing in-game tile (`x`, `y`) in `snapshot`, or
+        `None` if it doesn't exist
+        """
+        world = snapshot.world
+        (rx, ry) = (x//REGION_TILES, y//REGION_TILES)
+        try:
+            tiles = read_region_tiles(world, rx, ry)
+        except KeyError:
+            return None
+        tile = tile_from_record(tiles[y % REGION_TILES, x % REGION_TILES])
+        data = self.data
+
+        def lookup(item_id, table, nothing=-1):
+            if item_id == nothing:
+                return None
+            elif item_id in table:
+                return table[item_id].name
+            return 'Unknown ({})'.format(item_id)
+
+        info = {
+                'region': [rx, ry],
+                'coordinates': [x, y],
+                'foreground_material': lookup(tile.foreground_material, data.materials),
+                'foreground_mod': lookup(tile.foreground_mod, data.matmods),
+                'background_material': lookup(tile.background_material, data.materials),
+                'background_mod': lookup(tile.background_mod, data.matmods),
+                'liquid': lookup(tile.liquid, data.liquids, nothing=0),
+                'liquid_level': tile.liquid_level,
+                'objects': [],
+                'plants': [],
+                }
+        try:
+            entities = world.get_entities(rx, ry)
+        except KeyError:
+            entities = []
+        for e in entities:
+            if tuple(e.data.get('tilePosition', ())) != (x, y):
+                continue
+            if e.name == 'ObjectEntity':
+                obj_name = e.data['name']
+                obj = {'name': obj_name, 'description': data.items.get(obj_name)}
+                if 'items' in e.data:
+                    obj['items'] = [
+                            {'name': item['content']['name'], 'count': item['content']['count']}
+                            for item in e.data['items'] if item and 'content' in item]
+                info['objects'].append(obj)
+            elif e.name == 'PlantEntity':
+                info['plants'].append(e.data['descriptions']['description'])
+        return info
+
+    def close(self):
+        """
+        Lets go of our world.  Any requests still in flight keep their own
+        snapshot, so the world's mmap is closed once they're done with it.
+        """
+        with self.lock:
+            self.snapshot = None
+            self.tiles.clear()
+
+class TileHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves up our tiles and tile info.  The available URLs are:
+
+        /tiles.json              Tile layout and world info
+        /tiles/<z>/<x>/<y>.png   A map tile
+        /info/<x>/<y>.json       Info about the in-game tile at (x, y)
+
+    Responses carry an ETag based on the world's mtime, so browsers can
+    revalidate without us having to send the data again.
+    """
+
+    tile_re = re.compile(r'^/tiles/(\d+)/(\d+)/(\d+)\.png$')
+    info_re = re.compile(r'^/info/(-?\d+)/(-?\d+)\.json$')
+
+    def do_GET(self):
+        tileserver = self.server.tileserver
+        snapshot = tileserver.check_world()
+        if snapshot is None:
+            self.send_error(503, 'World is unavailable')
+            return
+        path = self.path.split('?')[0]
+
+        if path in ('/', '/tiles.json'):
+            self.send_json(tileserver.etag(snapshot, 'metadata'), lambda: tileserver.metadata(snapshot))
+            return
+
+        match = self.tile_re.match(path)
+        if match:
+            key = tuple(int(v) for v in match.groups())
+            etag = tileserver.etag(snapshot, 'tile', *key)
+            if self.not_modified(etag):
+                return
+            tile = tileserver.get_tile(snapshot, *key)
+            if tile is None:
+                self.send_error(404)
+            else:
+                self.send_data(etag, 'image/png', tile[0])
+            return
+
+        match = self.info_re.match(path)
+        if match:
+            (x, y) = (int(v) for v in match.groups())
+            self.send_json(tileserver.etag(snapshot, 'info', x, y), lambda: tileserver.tile_info(snapshot, x, y))
+            return
+
+        self.send_error(404)
+
+    def not_modified(self, etag):
+        """
+        Sends a 304 response and returns `True` if the client already has
+        the version of the resource identified by `etag`
+        """
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return True
+        return False
+
+    def send_json(self, etag, func):
+        """
+        Sends the result of `func` as JSON (or a 404 if it's `None`),
+        unless the client already has it
+        """
+        if self.not_modified(etag):
+            return
+        result = func()
+        if result is None:
+            self.send_error(404)
+        else:
+            self.send_data(etag, 'application/json', json.dumps(result).encode('utf-8'))
+
+    def send_data(self, etag, content_type, data):
+        """
+        Sends a 200 response with the given data
+        """
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+def main():
+    """
+    CLI Launcher
+    """
+
+    parser = argparse.ArgumentParser(
+            description='Serve map tiles of a Starbound world over HTTP',
+            epilog="""Tiles use the same z/x/y layout as pystarboundmap-tiles, and are
+                rendered on demand.  Tile info is available at /info/<x>/<y>.json, and
+                the tile layout at /tiles.json.""",
+            )
+    parser.add_argument('filename',
+            type=str,
+            help='World file to serve')
+    parser.add_argument('-p', '--port',
+            type=int,
+            default=8000,
+            help='Port to listen on (default: %(default)s)')
+    parser.add_argument('-b', '--bind',
+            type=str,
+            default='127.0.0.1',
+            help='Address to listen on (default: %(default)s)')
+    parser.add_argument('-t', '--max-tiles',
+            type=int,
+            default=1024,
+            help='Number of rendered tiles to keep in memory (default: %(default)s)')
+    add_layer_arguments(parser)
+    parser.add_argument('-v', '--verbose',
+            action='store_true',
+            help='Log requests')
+    args = parser.parse_args()
+
+    data = StarboundData(load_config(args.data_dir))
+    tileserver = TileServer(data, args.filename, layers_from_args(args), max_tiles=args.max_tiles)
+    httpd = http.server.ThreadingHTTPServer((args.bind, args.port), TileHandler)
+    httpd.daemon_threads = True
+    httpd.tileserver = tileserver
+    httpd.verbose = args.verbose
+    print('Serving {} at http://{}:{}/'.format(args.filename, args.bind, args.port), file=sys.stderr)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        tileserver.close()
+        data.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,543 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Python Starbound Mapper (pystarboundmap)
+# Copyright (C) 2018 CJ Kucera 
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the development team nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CJ KUCERA BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Generates synthetic Starbound installs: a tiny asset pak with just enough
+# in it to draw with, and worlds of whatever size and makeup we like.  The
+# worlds are perfectly valid `BTreeDB5`/`World4` files, so they can be read
+# by py-starbound (and thus us) just like the real thing.  This is mostly
+# useful for benchmarking, since it gives us reproducible worlds without
+# having to ship anyone's savegames around.
+
+import io
+import os
+import json
+import zlib
+import struct
+import argparse
+import numpy as np
+from PIL import Image
+from starbound import sbon
+from .render import TILE_DTYPE, REGION_TILES
+
+# Size of each block in the BTree files we write.  Starbound itself uses
+# 2048, but smaller blocks give us a deeper tree, which is closer to what
+# a real (much larger) world looks like.
+BTREE_BLOCK_SIZE = 512
+BTREE_HEADER_SIZE = 512
+
+# How many keys go into each of our BTree leaves
+BTREE_LEAF_KEYS = 8
+
+# World BTree keys are a layer byte followed by the region X and Y
+WORLD_KEY = struct.Struct('>BHH')
+LAYER_METADATA = 0
+LAYER_TILES = 1
+LAYER_ENTITIES = 2
+LAYER_UUIDS = 4
+
+# IDs in our synthetic asset pak
+MATERIAL_DIRT = 1
+MATERIAL_STONE = 2
+MATERIAL_BRICK = 3
+MATMOD_ORE = 1
+LIQUID_WATER = 1
+
+# How far below the surface dirt turns to stone
+STONE_DEPTH = 12
+
+class BTreeWriter(object):
+    """
+    Writes out a `BTreeDB5` file from a collection of key/value pairs.  The
+    whole tree is built in one go, so this is only useful for files that
+    are written once and then only ever read (which is all we need).
+    """
+
+    def __init__(self, name, key_size, block_size=BTREE_BLOCK_SIZE):
+        self.name = name
+        self.key_size = key_size
+        self.block_size = block_size
+        self.blocks = []
+
+    def add_block(self, data):
+        """
+        Adds a block containing `data`, and returns its index
+        """
+        self.blocks.append(data.ljust(self.block_size, b'\0'))
+        return len(self.blocks) - 1
+
+    def add_leaf(self, data):
+        """
+        Adds a leaf containing `data`, chained across as many blocks as it
+        needs.  Returns the index of the first block.
+        """
+        capacity = self.block_size - 6
+        chunks = [data[i:i+capacity] for i in range(0, len(data), capacity)] or [b'']
+        first = len(self.blocks)
+        for (idx, chunk) in enumerate(chunks):
+            if idx == len(chunks) - 1:
+                next_block = -1
+            else:
+                next_block = first + idx + 1
+            self.add_block(b'LL' + chunk.ljust(capacity, b'\0') + struct.pack('>i', next_block))
+        return first
+
+    def write(self, filename, items):
+        """
+        Writes the `items` (a dict or iterable of `(key, value)` tuples) to
+        `filename`
+        """
+        if isinstance(items, dict):
+            items = items.items()
+        items = sorted(items)
+        self.blocks = []
+
+        # Leaves first
+        nodes = []
+        for start in range(0, len(items), BTREE_LEAF_KEYS):
+            group = items[start:start+BTREE_LEAF_KEYS]
+            stream = io.BytesIO()
+            stream.write(struct.pack('>i', len(group)))
+            for (key, value) in group:
+                if len(key) != self.key_size:
+                    raise ValueError('Invalid key length: {}'.format(len(key)))
+                stream.write(key)
+                sbon.write_varint(stream, len(value))
+                stream.write(value)
+            nodes.append((group[0][0], self.add_leaf(stream.getvalue())))
+        if not nodes:
+            nodes.append((b'\0'*self.key_size, self.add_leaf(struct.pack('>i', 0))))
+
+        # Then index blocks on top of them until we're down to a single root
+        level = 0
+        capacity = (self.block_size - 11) // (self.key_size + 4)
+        while len(nodes) > 1:
+            parents = []
+            for start in range(0, len(nodes), capacity+1):
+                group = nodes[start:start+capacity+1]
+                stream = io.BytesIO()
+                stream.write(b'II')
+                stream.write(struct.pack('>Bii', level, len(group)-1, group[0][1]))
+                for (key, block) in group[1:]:
+                    stream.write(key)
+                    stream.write(struct.pack('>i', block))
+                parents.append((group[0][0], self.add_block(stream.getvalue())))
+            nodes = parents
+            level += 1
+        root = nodes[0][1]
+
+        # The header has two copies of the root info; we just write the
+        # same thing to both.
+        header = struct.pack('>8si16si?ixxxxii?ixxxxii?',
+                b'BTreeDB5', self.block_size, self.name.encode('utf-8'), self.key_size,
+                False, -1,
+                -1, root, level == 0,
+                -1,
+                -1, root, level == 0)
+        with open(filename, 'wb') as df:
+            df.write(header.ljust(BTREE_HEADER_SIZE, b'\0'))
+            for block in self.blocks:
+                df.write(block)
+
+def versioned_json(name, version, data):
+    """
+    Returns `data` serialized as Starbound's versioned JSON
+    """
+    stream = io.BytesIO()
+    sbon.write_string(stream, name)
+    stream.write(struct.pack('>bi', 1, version))
+    sbon.write_dynamic(stream, data)
+    return stream.getvalue()
+
+def surface_heights(width, height, seed):
+    """
+    Returns an array with the height of the surface in each of the `width`
+    columns of a world: some rolling hills about two-thirds of the way up.
+    """
+    rng = np.random.default_rng([seed, width, height])
+    x = np.arange(width)
+    heights = np.full(width, height*0.65)
+    for (wavelength, amplitude) in ((400, 20), (90, 8), (25, 3)):
+        heights += amplitude*np.sin(x*2*np.pi/wavelength + rng.uniform(0, 2*np.pi))
+    return np.clip(heights.astype(np.int32), 1, height-1)
+
+def generate_tiles(rx, ry, surface, seed, density=0.85, liquid=0.3):
+    """
+    Generates the tiles for region (`rx`, `ry`), as an array of `TILE_DTYPE`.
+    Everything below `surface` is ground: `density` is the fraction of it
+    which is solid, and `liquid` is the fraction of the open space within
+    it (ie: caves) which is flooded.  There are a few holes in the
+    background walls, too.
+    """
+    rng = np.random.default_rng([seed, rx, ry])
+    shape = (REGION_TILES, REGION_TILES)
+    y = ry*REGION_TILES + np.arange(REGION_TILES)[:, np.newaxis]
+    heights = surface[rx*REGION_TILES:(rx+1)*REGION_TILES][np.newaxis, :]
+    ground = y < heights
+    solid = ground & (rng.random(shape) < density)
+    deep = y < heights - STONE_DEPTH
+    flooded = ground & ~solid & (rng.random(shape) < liquid)
+
+    tiles = np.zeros(shape, dtype=TILE_DTYPE)
+    tiles['foreground_material'] = np.where(solid,
+            np.where(deep, MATERIAL_STONE, MATERIAL_DIRT), -1)
+    tiles['foreground_mod'] = np.where(solid & deep & (rng.random(shape) < 0.05), MATMOD_ORE, -1)
+    tiles['background_material'] = np.where(ground & (rng.random(shape) >= 0.02),
+            np.where(deep, MATERIAL_BRICK, MATERIAL_DIRT), -1)
+    tiles['background_mod'] = -1
+    tiles['liquid'] = np.where(flooded, LIQUID_WATER, 0)
+    tiles['liquid_level'] = np.where(flooded, rng.uniform(0.2, 1, shape), 0)
+    return tiles
+
+def generate_entities(rx, ry, surface, seed, objects=2, plants=1):
+    """
+    Generates the entities for region (`rx`, `ry`): `objects` objects
+    (alternating between chests full of stuff and lamps) scattered around
+    at random, and up to `plants` trees on the surface (if the surface
+    passes through this region).  Returns a tuple of the list of entities
+    (as versioned JSON) and the list of unique IDs to index.
+    """
+    rng = np.random.default_rng([seed, rx, ry, 1])
+    entities = []
+    uuids = []
+    base_x = rx*REGION_TILES
+    base_y = ry*REGION_TILES
+    for idx in range(objects):
+        x = base_x + int(rng.integers(REGION_TILES))
+        y = base_y + int(rng.integers(REGION_TILES))
+        if idx % 2 == 0:
+            uuid = 'synthchest-{}-{}-{}'.format(rx, ry, idx)
+            items = []
+            for _ in range(int(rng.integers(1, 8))):
+                items.append({'content': {
+                    'name': 'synthore' if rng.random() < 0.5 else 'synthbar',
+                    'count': int(rng.integers(1, 1000)),
+                    'parameters': {},
+                    }})
+            items.extend([None]*4)
+            data = {
+                    'name': 'synthchest',
+                    'orientationIndex': 0,
+                    'tilePosition': [x, y],
+                    'uniqueId': uuid,
+                    'items': items,
+                    }
+            uuids.append(uuid)
+        else:
+            data = {
+                    'name': 'synthlamp',
+                    'orientationIndex': 0,
+                    'tilePosition': [x, y],
+                    }
+        entities.append(versioned_json('ObjectEntity', 1, data))
+    for _ in range(plants):
+        x = base_x + int(rng.integers(REGION_TILES))
+        y = int(surface[x])
+        if base_y <= y < base_y + REGION_TILES:
+            entities.append(versioned_json('PlantEntity', 1, {
+                'descriptions': {'description': 'Synthetic Tree'},
+                'tilePosition': [x, y],
+                'pieces': [
+                    {'image': '/plants/synthtree/trunk.png?hueshift=0', 'offset': [0, 0]},
+                    {'image': '/plants/synthtree/crown.png?hueshift=0', 'offset': [-1, 4]},
+                    ],
+                }))
+    return (entities, uuids)
+
+def make_world(filename, width=16, height=12, density=0.85, liquid=0.3,
+        objects=2, plants=1, seed=0, name='Synthetic Planet'):
+    """
+    Writes out a synthetic world to `filename`, `width` by `height` regions
+    in size.  See `generate_tiles` and `generate_entities` for what the
+    other parameters mean.
+    """
+    world_width = width*REGION_TILES
+    world_height = height*REGION_TILES
+    surface = surface_heights(world_width, world_height, seed)
+    items = {}
+
+    metadata = {
+            'playerStart': [world_width/2, float(surface[world_width//2])],
+            'worldTemplate': {
+                'size': [world_width, world_height],
+                'celestialParameters': {
+                    'name': name,
+                    'parameters': {
+                        'description': 'Synthetic world',
+                        'terrestrialType': ['synthetic'],
+                        },
+                    'coordinate': {'location': [0, 0, 0], 'planet': 1, 'satellite': 0},
+                    },
+                'worldParameters': {},
+                },
+            }
+    stream = io.BytesIO()
+    stream.write(struct.pack('>ii', world_width, world_height))
+    stream.write(versioned_json('WorldMetadata', 1, metadata))
+    items[WORLD_KEY.pack(LAYER_METADATA, 0, 0)] = zlib.compress(stream.getvalue())
+
+    for rx in range(width):
+        for ry in range(height):
+            tiles = generate_tiles(rx, ry, surface, seed, density, liquid)
+            items[WORLD_KEY.pack(LAYER_TILES, rx, ry)] = zlib.compress(b'\0\0\0' + tiles.tobytes())
+
+            (entities, uuids) = generate_entities(rx, ry, surface, seed, objects, plants)
+            stream = io.BytesIO()
+            sbon.write_varint(stream, len(entities))
+            for entity in entities:
+                stream.write(entity)
+            items[WORLD_KEY.pack(LAYER_ENTITIES, rx, ry)] = zlib.compress(stream.getvalue())
+
+            if uuids:
+                stream = io.BytesIO()
+                sbon.write_varint(stream, len(uuids))
+                for uuid in uuids:
+                    sbon.write_string(stream, uuid)
+                items[WORLD_KEY.pack(LAYER_UUIDS, rx, ry)] = zlib.compress(stream.getvalue())
+
+    BTreeWriter('World4', WORLD_KEY.size).write(filename, items)
+
+def png_data(image):
+    """
+    Returns the PIL `image` as PNG data
+    """
+    stream = io.BytesIO()
+    image.save(stream, format='png')
+    return stream.getvalue()
+
+def material_texture(color):
+    """
+    Returns a texture for a material of the given `color`, laid out to suit
+    the render template in our asset pak
+    """
+    image = Image.new('RGBA', (16, 24), (0, 0, 0, 0))
+    (r, g, b) = color
+    dark = (r//2, g//2, b//2, 255)
+    image.paste((r, g, b, 255), (4, 12, 12, 20))
+    image.paste(dark, (4, 0, 12, 4))
+    image.paste(dark, (4, 4, 12, 8))
+    image.paste(dark, (0, 12, 4, 20))
+    image.paste(dark, (12, 12, 16, 20))
+    return png_data(image)
+
+# A simplified version of the base game's classic material template: the
+# base tile, plus an edge on any side which doesn't connect to anything.
+MATERIAL_TEMPLATE = {
+        'pieces': {
+            'base': {'textureSize': [8, 8], 'texturePosition': [4, 12]},
+            'top': {'textureSize': [8, 4], 'texturePosition': [4, 0]},
+            'bottom': {'textureSize': [8, 4], 'texturePosition': [4, 4]},
+            'left': {'textureSize': [4, 8], 'texturePosition': [0, 12]},
+            'right': {'textureSize': [4, 8], 'texturePosition': [12, 12]},
+            },
+        'representativePiece': 'base',
+        'rules': {
+            'Connects': {'entries': [{'type': 'Connects'}]},
+            'NotConnects': {'entries': [{'type': 'Connects', 'inverse': True}]},
+            },
+        'matches': [
+            ['main', [
+                {'matchAllPoints': [[[0, 0], 'Connects']], 'pieces': [['base', [0, 0]]]},
+                {'matchAllPoints': [[[0, 1], 'NotConnects']], 'pieces': [['top', [0, 8]]]},
+                {'matchAllPoints': [[[0, -1], 'NotConnects']], 'pieces': [['bottom', [0, -4]]]},
+                {'matchAllPoints': [[[-1, 0], 'NotConnects']], 'pieces': [['left', [-4, 0]]]},
+                {'matchAllPoints': [[[1, 0], 'NotConnects']], 'pieces': [['right', [8, 0]]]},
+                ]],
+            ],
+        }
+
+def make_pak(filename):
+    """
+    Writes out a minimal `SBAsset6` asset pak to `filename`, containing the
+    materials, mods, liquids, objects, plants and items which our synthetic
+    worlds use
+    """
+    template = '/tiles/classicmaterialtemplate.config'
+    files = {}
+    files[template] = json.dumps(MATERIAL_TEMPLATE)
+    for (mat_id, mat_name, color, extra) in (
+            (MATERIAL_DIRT, 'synthdirt', (120, 80, 40), {}),
+            (MATERIAL_STONE, 'synthstone', (110, 110, 120), {}),
+            (MATERIAL_BRICK, 'synthbrick', (150, 60, 50), {'radiantLight': [60, 30, 10]}),
+            ):
+        info = {
+                'materialId': mat_id,
+                'materialName': mat_name,
+                'shortdescription': mat_name.title(),
+                'renderTemplate': template,
+                'renderParameters': {'texture': '{}.png'.format(mat_name)},
+                }
+        info.update(extra)
+        files['/tiles/materials/{}.material'.format(mat_name)] = json.dumps(info)
+        files['/tiles/materials/{}.png'.format(mat_name)] = material_texture(color)
+    files['/tiles/mods/synthore.matmod'] = json.dumps({
+        'modId': MATMOD_ORE,
+        'modName': 'synthore',
+        'renderTemplate': template,
+        'renderParameters': {'texture': 'synthore.png'},
+        })
+    files['/tiles/mods/synthore.png'] = png_data(Image.new('RGBA', (16, 24), (230, 200, 60, 160)))
+    files['/liquids/synthwater.liquid'] = json.dumps({
+        'liquidId': LIQUID_WATER,
+        'name': 'synthwater',
+        'color': [40, 80, 220, 160],
+        })
+    for (obj_name, description, size, color, extra) in (
+            ('synthchest', 'Synthetic Chest', (16, 16), (100, 70, 30, 255), {}),
+            ('synthlamp', 'Synthetic Lamp', (8, 16), (250, 230, 120, 255), {'lightColor': [220, 200, 120]}),
+            ):
+        info = {
+                'objectName': obj_name,
+                'shortdescription': description,
+                'orientations': [{
+                    'image': '{}.png:default'.format(obj_name),
+                    'imagePosition': [0, 0],
+                    }],
+                }
+        info.update(extra)
+        files['/objects/synthetic/{0}/{0}.object'.format(obj_name)] = json.dumps(info)
+        files['/objects/synthetic/{0}/{0}.png'.format(obj_name)] = png_data(Image.new('RGBA', size, color))
+        files['/objects/synthetic/{0}/{0}.frames'.format(obj_name)] = json.dumps({'frameGrid': {'size': list(size)}})
+    files['/plants/synthtree/trunk.png'] = png_data(Image.new('RGBA', (8, 32), (90, 60, 30, 255)))
+    files['/plants/synthtree/crown.png'] = png_data(Image.new('RGBA', (24, 24), (40, 150, 40, 255)))
+    for (item_name, description) in (('synthore', 'Synthetic Ore'), ('synthbar', 'Synthetic Bar')):
+        files['/items/generic/{}.item'.format(item_name)] = json.dumps({
+            'itemName': item_name,
+            'shortdescription': description,
+            })
+
+    with open(filename, 'wb') as df:
+        df.write(b'SBAsset6')
+        df.write(struct.pack('>Q', 0))
+        index = []
+        for (path, data) in files.items():
+            if isinstance(data, str):
+                data = data.encode('utf-8')
+            index.append((path, df.tell(), len(data)))
+            df.write(data)
+        index_offset = df.tell()
+        df.write(b'INDEX')
+        sbon.write_map(df, {})
+        sbon.write_varint(df, len(index))
+        for (path, offset, length) in index:
+            sbon.write_string(df, path)
+            df.write(struct.pack('>QQ', offset, length))
+        df.seek(8)
+        df.write(struct.pack('>Q', index_offset))
+
+def make_install(base_dir, worlds=1, **world_args):
+    """
+    Creates a synthetic Starbound install in `base_dir`: an asset pak, and
+    `worlds` worlds in the universe directory, generated with `world_args`
+    (see `make_world`).  Each world gets a different seed.  Returns the
+    list of world filenames.
+    """
+    os.makedirs(os.path.join(base_dir, 'assets'), exist_ok=True)
+    os.makedirs(os.path.join(base_dir, 'storage', 'universe'), exist_ok=True)
+    os.makedirs(os.path.join(base_dir, 'storage', 'player'), exist_ok=True)
+    make_pak(os.path.join(base_dir, 'assets', 'packed.pak'))
+    seed = world_args.pop('seed', 0)
+    filenames = []
+    for idx in range(worlds):
+        filename = os.path.join(base_dir, 'storage', 'universe', '0_0_0_{}.world'.format(idx+1))
+        make_world(filename, seed=seed+idx, **world_args)
+        filenames.append(filename)
+    return filenames
+
+def add_world_arguments(parser):
+    """
+    Adds arguments to `parser` for the world generation parameters, so
+    that other tools can generate worlds the same way we do
+    """
+    parser.add_argument('-W', '--width',
+            type=int,
+            default=16,
+            help='Width of the world, in regions (default: %(default)s)')
+    parser.add_argument('-H', '--height',
+            type=int,
+            default=12,
+            help='Height of the world, in regions (default: %(default)s)')
+    parser.add_argument('--density',
+            type=float,
+            default=0.85,
+            help='Fraction of underground tiles which are solid (default: %(default)s)')
+    parser.add_argument('--liquid',
+            type=float,
+            default=0.3,
+            help='Fraction of open underground tiles which are flooded (default: %(default)s)')
+    parser.add_argument('--objects',
+            type=int,
+            default=2,
+            help='Objects per region (default: %(default)s)')
+    parser.add_argument('--plants',
+            type=int,
+            default=1,
+            help='Maximum plants per region (default: %(default)s)')
+    parser.add_argument('--seed',
+            type=int,
+            default=0,
+            help='Random seed (default: %(default)s)')
+
+def world_args_from_args(args):
+    """
+    Returns a dict of `make_world` arguments from the parsed `args`
+    """
+    return {
+            'width': args.width,
+            'height': args.height,
+            'density': args.density,
+            'liquid': args.liquid,
+            'objects': args.objects,
+            'plants': args.plants,
+            'seed': args.seed,
+            }
+
+def main():
+    """
+    CLI Launcher
+    """
+
+    parser = argparse.ArgumentParser(
+            description='Generate a synthetic Starbound install, for benchmarking',
+            epilog="""The install contains a minimal asset pak and one or more generated
+                worlds, and can be used as a Starbound install directory.""",
+            )
+    parser.add_argument('base_dir',
+            type=str,
+            help='Directory to create the install in')
+    add_world_arguments(parser)
+    parser.add_argument('-n', '--worlds',
+            type=int,
+            default=1,
+            help='Number of worlds to generate (default: %(default)s)')
+    args = parser.parse_args()
+
+    for filename in make_install(args.base_dir, worlds=args.worlds, **world_args_from_args(args)):
+        print(filename)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Python Starbound Mapper (pystarboundmap)
+# Copyright (C) 2018 CJ Kucera 
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the development team nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CJ KUCERA BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import sys
+import json
+import math
+import argparse
+import concurrent.futures
+import numpy as np
+from PIL import Image
+from .data import StarboundData
+from .regioncache import RegionCache
+from .headless import add_layer_arguments, layers_from_args, load_config
+from .render import RegionCompositor, read_region_tiles, flatten, downsample, REGION_PIXELS
+
+# Tiles are the same size as a region, at full detail, so the tiles at our
+# highest zoom level are just the regions themselves
+TILE_SIZE = REGION_PIXELS
+
+# How many base tiles wide/tall each unit of work handed to our process
+# pool is.  Each worker builds the levels above its base tiles itself,
+# until it gets to a single tile.
+BLOCK_SIZE = 8
+
+MANIFEST_NAME = 'tiles.json'
+MANIFEST_VER = 1
+
+# Per-process state for our worker processes; see `init_worker`
+worker_state = {}
+
+def max_zoom(width_regions, height_regions):
+    """
+    Returns the zoom level at which a tile is a region, for a world the
+    given number of regions wide and tall.  Zoom 0 is the whole world in
+    one tile.
+    """
+    return max(0, math.ceil(math.log2(max(width_regions, height_regions, 1))))
+
+def tile_path(output_dir, zoom, x, y):
+    """
+    Returns the filename for the tile at `zoom`/`x`/`y`
+    """
+    return os.path.join(output_dir, str(zoom), str(x), '{}.png'.format(y))
+
+def save_tile(output_dir, zoom, x, y, image):
+    """
+    Saves out the RGBA `image` as the tile at `zoom`/`x`/`y`
+    """
+    filename = tile_path(output_dir, zoom, x, y)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    Image.fromarray(image, 'RGBA').save(filename)
+
+def remove_tile(output_dir, zoom, x, y):
+    """
+    Removes the tile at `zoom`/`x`/`y`, if it exists
+    """
+    try:
+        os.remove(tile_path(output_dir, zoom, x, y))
+    except FileNotFoundError:
+        pass
+
+def load_tile(output_dir, zoom, x, y):
+    """
+    Loads the tile at `zoom`/`x`/`y` as an RGBA array, or returns `None`
+    if it doesn't exist
+    """
+    filename = tile_path(output_dir, zoom, x, y)
+    if not os.path.exists(filename):
+        return None
+    return np.asarray(Image.open(filename).convert('RGBA'))
+
+def combine_children(children):
+    """
+    Given a dict mapping (dx, dy) offsets (each 0 or 1) to child tile
+    images (or `None`), returns the parent tile, or `None` if there are
+    no children at all
+    """
+    if all(image is None for image in children.values()):
+        return None
+    combined = np.zeros((TILE_SIZE*2, TILE_SIZE*2, 4), dtype=np.uint8)
+    for (dx, dy), image in children.items():
+        if image is not None:
+            combined[dy*TILE_SIZE:(dy+1)*TILE_SIZE, dx*TILE_SIZE:(dx+1)*TILE_SIZE] = image
+    return downsample(combined, 2)
+
+def init_worker(data_dir, filename, output_dir, visible, zoom, height_regions):
+    """
+    Sets up a worker process with its own copy of our game data and the
+    world.  We don't use the on-disk region cache from the workers, since
+    our own hashes take care of skipping unchanged regions, and lots of
+    processes writing to the one database would just slow us down.
+    """
+    data = StarboundData(load_config(data_dir))
+    if data.region_cache:
+        data.region_cache.close()
+        data.region_cache = None
+    (world, worldmm) = StarboundData.open_world(filename)
+    worker_state.update(
+            data=data,
+            world=world,
+            worldmm=worldmm,
+            compositor=None,
+            output_dir=output_dir,
+            visible=visible,
+            zoom=zoom,
+            height_regions=height_regions,
+            )
+
+def render_block(bx, by, block_size, regions, old_hashes, removed=()):
+    """
+    Runs in a worker process.  Renders the base tiles in block (`bx`,
+    `by`) for any of `regions` (a set of (rx, ry) tuples) whose hashes
+    don't match `old_hashes` (or whose tiles are missing), and removes the
+    tiles for any of `removed` (regions which were exported last time but
+    aren't in the world anymore).  Then builds the block's tiles at each
+    level above that, up to a single tile.
+
+    Returns a tuple of the new region hashes and whether anything changed.
+    """
+    state = worker_state
+    if state['compositor'] is None:
+        state['compositor'] = RegionCompositor(state['data'])
+    world = state['world']
+    output_dir = state['output_dir']
+    zoom = state['zoom']
+
+    hashes = {}
+    images = {}
+    changed = False
+    for (rx, ry) in removed:
+        remove_tile(output_dir, zoom, rx, state['height_regions']-1-ry)
+        changed = True
+    for y in range(by*block_size, (by+1)*block_size):
+        for x in range(bx*block_size, (bx+1)*block_size):
+            (rx, ry) = (x, state['height_regions']-1-y)
+            if (rx, ry) not in regions:
+                continue
+            try:
+                tiles = read_region_tiles(world, rx, ry)
+            except KeyError:
+                remove_tile(output_dir, zoom, x, y)
+                changed = True
+                continue
+            key = '{},{}'.format(rx, ry)
+            hashes[key] = RegionCache.tile_hash(tiles).hex()
+            if hashes[key] == old_hashes.get(key) and os.path.exists(tile_path(output_dir, zoom, x, y)):
+                continue
+            image = flatten(state['compositor'].get_layers(world, rx, ry, tiles), state['visible'])
+            save_tile(output_dir, zoom, x, y, image)
+            images[(x, y)] = image
+            changed = True
+
+    # Now the levels above our base tiles.  Anything we didn't just render
+    # gets read back in from disk.
+    size = block_size
+    (x0, y0) = (bx*block_size, by*block_size)
+    while changed and size > 1:
+        size //= 2
+        zoom -= 1
+        (x0, y0) = (x0//2, y0//2)
+        parents = {}
+        for y in range(y0, y0+size):
+            for x in range(x0, x0+size):
+                children = {}
+                for dy in (0, 1):
+                    for dx in (0, 1):
+                        child = (x*2+dx, y*2+dy)
+                        if child in images:
+                            children[(dx, dy)] = images[child]
+                        else:
+                            children[(dx, dy)] = load_tile(output_dir, zoom+1, *child)
+                image = combine_children(children)
+                if image is not None:
+                    save_tile(output_dir, zoom, x, y, image)
+                    parents[(x, y)] = image
+                else:
+                    remove_tile(output_dir, zoom, x, y)
+        images = parents
+
+    return (hashes, changed)
+
+def export_tiles(data, filename, output_dir, visible, data_dir=None,
+        workers=None, force=False, progress_callback=None):
+    """
+    Exports the world at `filename` as a z/x/y tile pyramid of PNGs in
+    `output_dir`, drawing the layers in `visible`.  The base tiles are
+    rendered from regions (in blocks, across a pool of `workers`
+    processes), and each level above that is built by downsampling the
+    level below.  Tiles for empty areas aren't written at all.
+
+    A manifest of region hashes is written alongside the tiles, and
+    regions which haven't changed since the last export are skipped
+    (unless `force` is set).  The manifest's hashes are ignored if it was
+    written with different layers or assets.  Tiles for regions which were
+    in the manifest but aren't in the world anymore are removed, and the
+    levels above them rebuilt.
+
+    `progress_callback`, if passed, is called with the number of blocks
+    done and the total.  Returns the number of blocks which changed.
+    """
+    (world, worldmm) = StarboundData.open_world(filename)
+    try:
+        (width, height) = world.info.size
+        regions = set(world.get_all_regions_with_tiles())
+    finally:
+        worldmm.close()
+    width_regions = -(-width//(TILE_SIZE//8))
+    height_regions = -(-height//(TILE_SIZE//8))
+    zoom = max_zoom(width_regions, height_regions)
+    block_size = min(BLOCK_SIZE, 2**zoom)
+    block_zoom = zoom - int(math.log2(block_size))
+
+    # Read in our previous manifest, if it's still valid
+    signature = [RegionCache.cache_ver, list(data.asset_signature()), list(visible)]
+    manifest_file = os.path.join(output_dir, MANIFEST_NAME)
+    old_hashes = {}
+    old_regions = set()
+    if os.path.exists(manifest_file):
+        try:
+            with open(manifest_file) as df:
+                manifest = json.load(df)
+            if (manifest.get('version') == MANIFEST_VER
+                    and manifest.get('max_zoom') == zoom):
+                old_regions = set(tuple(int(c) for c in key.split(','))
+                        for key in manifest['regions'])
+                if not force and manifest.get('signature') == signature:
+                    old_hashes = manifest['regions']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    # Hand out the blocks which have any regions in them, or which have
+    # lost regions since last time
+    blocks = {}
+    removed = {}
+    for (rx, ry) in regions:
+        (x, y) = (rx, height_regions-1-ry)
+        blocks.setdefault((x//block_size, y//block_size), set()).add((rx, ry))
+    for (rx, ry) in old_regions - regions:
+        (x, y) = (rx, height_regions-1-ry)
+        block = (x//block_size, y//block_size)
+        blocks.setdefault(block, set())
+        removed.setdefault(block, []).append((rx, ry))
+    os.makedirs(output_dir, exist_ok=True)
+    hashes = {}
+    dirty = set()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+            initializer=init_worker,
+            initargs=(data_dir, filename, output_dir, visible, zoom, height_regions),
+            ) as executor:
+        futures = {}
+        for (bx, by), block_regions in blocks.items():
+            block_hashes = {}
+            for (rx, ry) in block_regions:
+                key = '{},{}'.format(rx, ry)
+                if key in old_hashes:
+                    block_hashes[key] = old_hashes[key]
+            future = executor.submit(render_block, bx, by, block_size, block_regions, block_hashes,
+                    removed.get((bx, by), []))
+            futures[future] = (bx, by)
+        for idx, future in enumerate(concurrent.futures.as_completed(futures)):
+            (block_hashes, changed) = future.result()
+            hashes.update(block_hashes)
+            if changed:
+                dirty.add(futures[future])
+            if progress_callback:
+                progress_callback(idx+1, len(futures))
+
+    changed_blocks = len(dirty)
+
+    # The levels above our blocks are few enough that we just build them
+    # here
+    for level in range(block_zoom-1, -1, -1):
+        parents = set((x//2, y//2) for (x, y) in dirty)
+        for (x, y) in parents:
+            children = {}
+            for dy in (0, 1):
+                for dx in (0, 1):
+                    children[(dx, dy)] = load_tile(output_dir, level+1, x*2+dx, y*2+dy)
+            image = combine_children(children)
+            if image is not None:
+                save_tile(output_dir, level, x, y, image)
+            else:
+                remove_tile(output_dir, level, x, y)
+        dirty = parents
+
+    with open(manifest_file, 'w') as df:
+        json.dump({
+            'version': MANIFEST_VER,
+            'signature': signature,
+            'max_zoom': zoom,
+            'tile_size': TILE_SIZE,
+            'world_size': [width, height],
+            'regions': hashes,
+            }, df)
+    return changed_blocks
+
+def main():
+    """
+    CLI Launcher
+    """
+
+    parser = argparse.ArgumentParser(
+            description='Export a Starbound world as a z/x/y tile pyramid of PNGs',
+            epilog="""Tiles are {0}x{0}; at the highest zoom level, each tile is one region.
+                Re-exporting to the same directory only re-renders regions which have
+                changed.""".format(TILE_SIZE),
+            )
+    parser.add_argument('filename',
+            type=str,
+            help='World file to export')
+    parser.add_argument('output_dir',
+            type=str,
+            help='Directory to write tiles to')
+    add_layer_arguments(parser)
+    parser.add_argument('-j', '--jobs',
+            type=int,
+            help='Number of processes to render with (default: one per CPU)')
+    parser.add_argument('-f', '--force',
+            action='store_true',
+            help='Re-render everything, even if it looks unchanged')
+    parser.add_argument('-v', '--verbose',
+            action='store_true',
+            help='Report progress')
+    args = parser.parse_args()
+
+    data = StarboundData(load_config(args.data_dir))
+    try:
+        def report(done, total):
+            if args.verbose:
+                print('Exported block {}/{}'.format(done, total), file=sys.stderr)
+
+        export_tiles(data, args.filename, args.output_dir, layers_from_args(args),
+                data_dir=args.data_dir, workers=args.jobs, force=args.force,
+                progress_callback=report)
+    finally:
+        data.close()
+
+if __name__ == '__main__':
+    main()
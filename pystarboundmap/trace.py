@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Python Starbound Mapper (pystarboundmap)
+# Copyright (C) 2018 CJ Kucera 
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the development team nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CJ KUCERA BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# An opt-in tracer, which records timed "spans" for the interesting bits
+# of loading and drawing a map (world reads, compositing, sprite decodes,
+# adding and removing scene items, painting, etc), and writes them out in
+# the Chrome trace event format.  The result can be loaded into Perfetto
+# (https://ui.perfetto.dev) or `chrome://tracing` to see what each thread
+# was up to, on a timeline.
+#
+# Tracing is off unless `enable` gets called (the GUI and headless
+# renderer do so with `--trace`), in which case the trace gets written
+# out when the app exits.  While off, `span` just hands back a shared
+# do-nothing context manager.
+
+import os
+import json
+import time
+import atexit
+import threading
+
+class NullSpan(object):
+    """
+    Context manager which doesn't do anything, used while we're disabled
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_SPAN = NullSpan()
+
+class Span(object):
+    """
+    A single timed span, recorded to its `Tracer` once it's finished
+    """
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.add(self.name, self.category, self.start, time.perf_counter(), self.args)
+        return False
+
+class Tracer(object):
+    """
+    Collects spans from any number of threads.  Each span is stored as a
+    Chrome "complete" (`X`) event, with its times in microseconds since
+    tracing was enabled.
+    """
+
+    # Stop recording after this many events, so a forgotten trace doesn't
+    # eat all our memory
+    max_events = 2000000
+
+    def __init__(self):
+        self.enabled = False
+        self.filename = None
+        self.events = []
+        self.dropped = 0
+        self.threads = {}
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.start = time.perf_counter()
+
+    def enable(self, filename=None):
+        """
+        Starts recording.  If `filename` is given, the trace will be saved
+        there when we exit.
+        """
+        with self.lock:
+            if not self.enabled:
+                self.start = time.perf_counter()
+                self.events = []
+                self.dropped = 0
+            self.enabled = True
+            if filename and not self.filename:
+                atexit.register(self.save)
+            self.filename = filename or self.filename
+
+    def disable(self):
+        """
+        Stops recording (but keeps what we've recorded so far)
+        """
+        self.enabled = False
+
+    def span(self, name, category='', **args):
+        """
+        Returns a context manager which records a span named `name`, with
+        `args` attached, for as long as it's active
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, category, args)
+
+    def add(self, name, category, start, end, args):
+        """
+        Records a span from `start` to `end` (as `time.perf_counter` values)
+        on the current thread
+        """
+        thread = threading.current_thread()
+        event = {
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': (start - self.start)*1000000,
+                'dur': (end - start)*1000000,
+                'pid': self.pid,
+                'tid': thread.ident,
+                }
+        if args:
+            event['args'] = args
+        with self.lock:
+            if len(self.events) >= self.max_events:
+                self.dropped += 1
+                return
+            self.events.append(event)
+            if thread.ident not in self.threads:
+                self.threads[thread.ident] = thread.name
+
+    def to_json(self):
+        """
+        Returns everything we've recorded, as a Chrome trace dict
+        """
+        with self.lock:
+            events = list(self.events)
+            threads = dict(self.threads)
+            dropped = self.dropped
+        metadata = [{
+                'name': 'process_name',
+                'ph': 'M',
+                'pid': self.pid,
+                'args': {'name': 'pystarboundmap'},
+                }]
+        for (tid, thread_name) in threads.items():
+            metadata.append({
+                'name': 'thread_name',
+                'ph': 'M',
+                'pid': self.pid,
+                'tid': tid,
+                'args': {'name': thread_name},
+                })
+        return {
+                'traceEvents': metadata + events,
+                'displayTimeUnit': 'ms',
+                'otherData': {'dropped_events': dropped},
+                }
+
+    def save(self, filename=None):
+        """
+        Writes the trace out to `filename` (or the filename we were enabled
+        with)
+        """
+        filename = filename or self.filename
+        if not filename:
+            return
+        with open(filename, 'w') as df:
+            json.dump(self.to_json(), df)
+
+# Our global tracer
+tracer = Tracer()
+
+def span(name, category='', **args):
+    """
+    Shortcut for `tracer.span`
+    """
+    return tracer.span(name, category, **args)
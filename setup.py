@@ -23,6 +23,7 @@ setup(
     install_requires=[
         'Pillow ~= 5.3',
         'PyQt5 ~= 5.11',
+        'numpy ~= 1.15',
         'appdirs ~= 1.4',
         'timeago ~= 1.0',
         'py-starbound ~= 1.0',
@@ -43,5 +44,10 @@ setup(
         'gui_scripts': [
             'pystarboundmap = pystarboundmap.gui:main',
             ],
+        'console_scripts': [
+            'pystarboundmap-render = pystarboundmap.headless:main',
+            'pystarboundmap-tiles = pystarboundmap.tiles:main',
+            'pystarboundmap-serve = pystarboundmap.server:main',
+            ],
         },
 )